@@ -0,0 +1,246 @@
+"""! @brief The AsyncRender package.
+"""
+
+##
+# @file AsyncRender.py
+#
+# @brief This package defines an asyncio interface to render songs and tones.
+#
+# @section description_asyncrender Description
+# This package lets an asyncio program render songs and tones without blocking its event loop. AsyncRender.AsyncRenderer runs the synthesis and the file writes on a pool of threads and awaits them, so the event loop keeps serving other requests while a song is rendered. A renderer (like the shared default renderer) can be used from several event loops, e.g., successive asyncio.run() calls.
+#
+# A song is rendered one block at a time (see Song.Song.stream_blocks()), and the next block is rendered while the previous one is written, so the file I/O overlaps with the synthesis. A render can be cancelled: the cancellation takes effect between two blocks, and a cancelled (or failed) render_song() removes its partial wave file. A semaphore limits the number of renders that run at once in an event loop; the others wait for their turn.
+#
+# ```python
+# renderer = AsyncRenderer(max_concurrent=4)
+# await renderer.render_song('songs/simple.txt', 'simple.wav')
+# async for block in renderer.stream_song('songs/simple.txt'):
+#     ...
+# ```
+#
+# The module functions render_song(), stream_song(), and render_tone() use a shared default renderer.
+#
+# @section libraries_asyncrender Libraries/Modules
+# - typing (from the standard library)
+#   - access to AsyncIterator and Type
+# - asyncio, concurrent.futures, and weakref (from the standard library)
+#   - access to Semaphore, get_running_loop, wrap_future, ThreadPoolExecutor, Future, and WeakKeyDictionary
+# - Wave
+#   - access to Wave.BaseWave and Wave.WaveWriter
+# - AudioProcessor
+#   - access to AudioProcessor.block_size
+# - DataStructure
+#   - access to DataStructure.TypedArray
+# - Song
+#   - access to Song.Song and Song.NoteCache
+#
+# @section notes_asyncrender Notes
+# - Comments should be Doxygen compatible.
+# - The synthesis runs on threads, which keeps the event loop responsive; it does not make several renders faster than rendering them one after another.
+#
+# Copyright (c) 2023 Bucknell University. All rights reserved.
+
+from typing import AsyncIterator, Type
+from asyncio import Semaphore, get_running_loop, wrap_future
+from concurrent.futures import ThreadPoolExecutor, Future
+from weakref import WeakKeyDictionary
+from Wave import BaseWave, WaveWriter
+from AudioProcessor import block_size
+from DataStructure import TypedArray
+from Song import Song, NoteCache
+
+class AsyncRenderer:
+    """! The AsyncRender.AsyncRenderer class.
+
+    It renders songs and tones on a pool of threads for asyncio programs. The songs it renders share one note cache, and at most **max_concurrent** renders run at once in each event loop.
+    """
+
+    def __init__(self, max_concurrent: int = 4, note_cache: NoteCache = None, executor: ThreadPoolExecutor = None) -> None:
+        """! The AsyncRenderer class initializer.
+
+        @param max_concurrent The number of renders that can run at once in an event loop. Default is 4.
+
+        @param note_cache The cache of rendered notes shared by the songs, or None for a new NoteCache. Default is None.
+
+        @param executor The threads that render and write the samples, or None for a new pool of two threads per concurrent render. Default is None.
+        """
+
+        ## The number of renders that can run at once in an event loop
+        self.max_concurrent = max_concurrent
+        ## The semaphore of each event loop that limits the number of renders running at once, created on first use since a semaphore is bound to the loop it is used in
+        self._semaphores = WeakKeyDictionary()
+        ## The cache of rendered notes shared by the songs
+        self.note_cache = NoteCache() if note_cache is None else note_cache
+        ## The threads that render and write the samples
+        self._executor = ThreadPoolExecutor(2 * max_concurrent) if executor is None else executor
+
+    def _semaphore(self) -> Semaphore:
+        """! The semaphore that limits the number of renders running at once in the running event loop.
+
+        @return The semaphore of the running event loop.
+        """
+
+        loop = get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = Semaphore(self.max_concurrent)
+        return semaphore
+
+    async def stream_song(self, song_file: str, block_frames: int = block_size, wavetable_size: int = None) -> AsyncIterator[TypedArray]:
+        """! Renders a song one block of stereo samples at a time.
+
+        Each block is rendered on a thread, and the next block is rendered while the caller handles the current one. The blocks are the same as those of Song.Song.stream_blocks(). Stopping the iteration (or cancelling the task) stops the render after the block being rendered.
+
+        @param song_file The input musicscore text file.
+
+        @param block_frames The number of stereo samples rendered per block. Default is AudioProcessor.block_size.
+
+        @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas. Default is None.
+
+        @return An asynchronous iterator of the blocks, each a TypedArray of interleaved (left, right) samples.
+        """
+
+        async with self._semaphore():
+            async for block in self._stream_blocks(song_file, block_frames, wavetable_size):
+                yield block
+
+    async def _stream_blocks(self, song_file: str, block_frames: int, wavetable_size: int) -> AsyncIterator[TypedArray]:
+        """! Renders a song one block at a time, as stream_song() does, without waiting for the semaphore (the caller holds it).
+
+        @param song_file The input musicscore text file.
+
+        @param block_frames The number of stereo samples rendered per block.
+
+        @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas.
+
+        @return An asynchronous iterator of the blocks.
+        """
+
+        blocks = Song.stream_blocks(song_file, block_frames, wavetable_size, self.note_cache)
+        pending = self._executor.submit(next, blocks, None)
+        try:
+            while True:
+                block = await wrap_future(pending)
+                if block is None:
+                    break
+                # render the next block while the caller handles this one
+                pending = self._executor.submit(next, blocks, None)
+                yield block
+        finally:
+            # a generator cannot be closed while a thread is running it
+            pending.add_done_callback(lambda _: blocks.close())
+
+    async def render_song(self, song_file: str, filename: str, block_frames: int = block_size, wavetable_size: int = None) -> None:
+        """! Renders a song to a wave file.
+
+        The blocks of stream_song() are written with a Wave.WaveWriter on a thread, each one while the next block is rendered. The wave file is identical to Song.Song(song_file).write_wave_file(filename). The wave file is only opened once the render has its turn (see the semaphore), and if the render is cancelled or fails, the partial wave file is removed.
+
+        @param song_file The input musicscore text file.
+
+        @param filename The output wave filename.
+
+        @param block_frames The number of stereo samples rendered per block. Default is AudioProcessor.block_size.
+
+        @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas. Default is None.
+        """
+
+        async with self._semaphore():
+            opening = self._executor.submit(WaveWriter, filename, 2)
+            writing = None
+            closing = None
+            blocks = self._stream_blocks(song_file, block_frames, wavetable_size)
+            try:
+                writer = await wrap_future(opening)
+                async for block in blocks:
+                    if writing is not None:
+                        await wrap_future(writing)
+                    writing = self._executor.submit(writer.write_frames, block)
+                if writing is not None:
+                    await wrap_future(writing)
+                closing = self._executor.submit(writer.close)
+                await wrap_future(closing)
+            except BaseException:
+                # stop the render, and discard the partial file once the close, the write, or the open in progress is finished
+                await blocks.aclose()
+                last = closing if closing is not None else writing if writing is not None else opening
+                last.add_done_callback(lambda _: self._discard(opening))
+                raise
+
+    @staticmethod
+    def _discard(opening: Future) -> None:
+        """! Discards a partial wave file, if it was opened (see Wave.WaveWriter.discard()).
+
+        @param opening The (finished) future of the Wave.WaveWriter of the wave file.
+        """
+
+        if opening.exception() is not None:
+            return
+        opening.result().discard()
+
+    async def render_tone(self, wave_class: Type[BaseWave], num_samples: int, freq: float, filename: str) -> None:
+        """! Renders a tone (e.g., Wave.SineWave) to a wave file.
+
+        The wave is synthesized and written on a thread.
+
+        @param wave_class The wave class, e.g., Wave.SineWave.
+
+        @param num_samples The number of samples.
+
+        @param freq The wave frequency.
+
+        @param filename The output wave filename.
+        """
+
+        async with self._semaphore():
+            wave = await wrap_future(self._executor.submit(wave_class, num_samples, freq))
+            await wrap_future(self._executor.submit(wave.write_wave_file, filename))
+
+    def shutdown(self) -> None:
+        """! Waits for the threads to finish their work and stops them."""
+
+        self._executor.shutdown()
+
+## The renderer used by the module functions
+default_renderer = AsyncRenderer()
+
+def stream_song(song_file: str, block_frames: int = block_size, wavetable_size: int = None) -> AsyncIterator[TypedArray]:
+    """! Renders a song one block of stereo samples at a time with the default renderer, see AsyncRenderer.stream_song().
+
+    @param song_file The input musicscore text file.
+
+    @param block_frames The number of stereo samples rendered per block. Default is AudioProcessor.block_size.
+
+    @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas. Default is None.
+
+    @return An asynchronous iterator of the blocks.
+    """
+
+    return default_renderer.stream_song(song_file, block_frames, wavetable_size)
+
+async def render_song(song_file: str, filename: str, block_frames: int = block_size, wavetable_size: int = None) -> None:
+    """! Renders a song to a wave file with the default renderer, see AsyncRenderer.render_song().
+
+    @param song_file The input musicscore text file.
+
+    @param filename The output wave filename.
+
+    @param block_frames The number of stereo samples rendered per block. Default is AudioProcessor.block_size.
+
+    @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas. Default is None.
+    """
+
+    await default_renderer.render_song(song_file, filename, block_frames, wavetable_size)
+
+async def render_tone(wave_class: Type[BaseWave], num_samples: int, freq: float, filename: str) -> None:
+    """! Renders a tone to a wave file with the default renderer, see AsyncRenderer.render_tone().
+
+    @param wave_class The wave class, e.g., Wave.SineWave.
+
+    @param num_samples The number of samples.
+
+    @param freq The wave frequency.
+
+    @param filename The output wave filename.
+    """
+
+    await default_renderer.render_tone(wave_class, num_samples, freq, filename)
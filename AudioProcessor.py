@@ -7,6 +7,14 @@
 #
 # @section description_audioprocessor Description
 # This package provides the following audio processing functions:
+# - AudioProcessor.audio_sine_samples()
+#   - It computes a block of sine wave samples at a given frequency and amplitude.
+# - AudioProcessor.audio_square_samples()
+#   - It computes a block of square wave samples at a given frequency and amplitude.
+# - AudioProcessor.audio_sawtooth_samples()
+#   - It computes a block of sawtooth wave samples at a given frequency and amplitude.
+# - AudioProcessor.audio_complex_samples()
+#   - It computes a block of complex wave samples before normalization.
 # - AudioProcessor.audio_generate_sine_wave()
 #   - It samples a sine wave sound at a given frequency and amplitude.
 # - AudioProcessor.audio_generate_square_wave()
@@ -17,12 +25,28 @@
 #   - It samples a complex wave sound at a given frequency and amplitude.
 # - AudioProcessor.audio_generate_string_wave()
 #   - It samples a string wave sound using the Karplus-Strong algorithm at a given frequency and amplitude.
+# - AudioProcessor.audio_wavetable()
+#   - It builds (once) and returns the single-cycle wavetable of a wave type.
+# - AudioProcessor.audio_wavetable_samples()
+#   - It computes a block of wave samples by interpolated wavetable lookup.
+# - AudioProcessor.audio_generate_wavetable_wave()
+#   - It samples a sine, square, sawtooth, or complex wave sound using its wavetable.
+# - AudioProcessor.audio_string_delay_line()
+#   - It gets an excited Karplus-Strong delay line, reusing released delay lines of the same pitch.
+# - AudioProcessor.audio_release_string_delay_line()
+#   - It gives a delay line back for reuse.
+# - AudioProcessor.audio_string_samples()
+#   - It computes the next block of string wave samples from a delay line, one delay line period at a time.
 # - AudioProcessor.audio_note_number_to_freq()
 #   - It converts the note number to the corresponding wave frequency.
 # - AudioProcessor.audio_stereo_gains()
 #   - It compute the left and right channel gains given a stereo pan angle.
 # - AudioProcessor.audio_multiply_gain()
 #   - It multiplies the input audio data by the input gain.
+# - AudioProcessor.audio_envelope_gains()
+#   - It returns the gain curve of an envelope from an LRU cache, building it on a miss.
+# - AudioProcessor.audio_apply_envelope()
+#   - It applies an envelope to the input audio data with a single block multiply.
 # - AudioProcessor.audio_rise_fall_envelope()
 #   - It applies the rise-fall envelope to the input audio data.
 # - AudioProcessor.audio_adsr_envelope()
@@ -32,14 +56,23 @@
 #
 # @section libraries_audioprocessor Libraries/Modules
 # - typing (from the standard library)
-#   - access to Tuple
+#   - access to Tuple, List, and Iterator
+# - functools (from the standard library)
+#   - access to lru_cache, used to memoize note frequencies, string excitations, wavetable peak phases, and envelope gain curves
+# - array (from the standard library)
+#   - access to array, used to store the envelope gain curves
 # - math (from the standard library)
-#   - access to sqrt, pi, sin, cos, exp, and floor
+#   - access to sqrt, pi, sin, cos, exp, floor, and ceil
+# - itertools and operator (from the standard library)
+#   - access to repeat, accumulate, add, mul, sub, mod, and truediv, used to compute blocks of samples
+# - threading (from the standard library)
+#   - access to Lock, which guards the string wave delay line pool shared by the note synthesis threads
 # - DataStructure
-#   - access to DataStructure.Array
+#   - access to DataStructure.Array and DataStructure.RingBuffer
 #
 # @section notes_audioprocessor Notes
 # - Comments should be Doxygen compatible.
+# - The block generators evaluate the wave formulas through C-level map() pipelines over the standard library math functions, which is the fastest form available without third-party packages. It still costs tens of nanoseconds per sample (about 8 to 26 ms for 44,100 sine or sawtooth samples, depending on the machine), so a per-second budget well under one millisecond is out of reach without a vectorized library such as NumPy, which this project does not depend on. AudioProcessor.audio_square_samples() avoids most of the per-sample work by filling constant runs, and the wavetable oscillators trade accuracy for a uniform cost per sample.
 #
 # @section todo_audioprocessor TODO
 # Your tasks are to implement the following functions: 
@@ -48,9 +81,25 @@
 # - AudioProcessor.audio_generate_sawtooth_wave()
 # - AudioProcessor.audio_generate_complex_wave()
 # - AudioProcessor.audio_generate_string_wave()
+# - AudioProcessor.audio_wavetable()
+#   - It builds (once) and returns the single-cycle wavetable of a wave type.
+# - AudioProcessor.audio_wavetable_samples()
+#   - It computes a block of wave samples by interpolated wavetable lookup.
+# - AudioProcessor.audio_generate_wavetable_wave()
+#   - It samples a sine, square, sawtooth, or complex wave sound using its wavetable.
+# - AudioProcessor.audio_string_delay_line()
+#   - It gets an excited Karplus-Strong delay line, reusing released delay lines of the same pitch.
+# - AudioProcessor.audio_release_string_delay_line()
+#   - It gives a delay line back for reuse.
+# - AudioProcessor.audio_string_samples()
+#   - It computes the next block of string wave samples from a delay line, one delay line period at a time.
 # - AudioProcessor.audio_note_number_to_freq()
 # - AudioProcessor.audio_stereo_gains()
 # - AudioProcessor.audio_multiply_gain()
+# - AudioProcessor.audio_envelope_gains()
+#   - It returns the gain curve of an envelope from an LRU cache, building it on a miss.
+# - AudioProcessor.audio_apply_envelope()
+#   - It applies an envelope to the input audio data with a single block multiply.
 # - AudioProcessor.audio_rise_fall_envelope()
 # - AudioProcessor.audio_adsr_envelope()
 # - AudioProcessor.audio_stereo_mix_in()
@@ -61,15 +110,115 @@
 #
 # Copyright (c) 2023 Bucknell University. All rights reserved.
 
-from typing import Tuple
-from math import sqrt, pi, sin, cos, exp, floor
-from DataStructure import Array
+from typing import Tuple, List, Iterator
+from functools import lru_cache
+from array import array
+from math import sqrt, pi, sin, cos, exp, floor, ceil
+from itertools import repeat, accumulate
+from operator import add, mul, sub, mod, truediv
+from threading import Lock
+from DataStructure import Array, RingBuffer
 ## The number of attack samples
 adsr_attack_samples = 882
 ## The number of decay samples
 adsr_decay_samples = 882
 ## The number of release samples
 adsr_release_samples = 882
+## The maximum number of envelope gain curves kept in the envelope cache
+envelope_cache_size = 64
+## The number of samples computed at once by the block generators
+block_size = 4096
+## The weights of the six harmonics of the complex wave, 1 / 2 ** (j - 1)
+complex_harmonic_weights = tuple(1 / 2 ** (j - 1) for j in range(1, 7))
+## The default number of samples in a single-cycle wavetable
+wavetable_size = 2048
+## The single-cycle wavetables built so far, keyed by (wave type, table size)
+_wavetables = {}
+## The maximum number of delay line sizes (i.e., string pitches) kept in the string wave delay line pool
+string_delay_line_pool_size = 128
+## The released string wave delay lines, keyed by their size, oldest size first
+_string_delay_lines = {}
+## The lock that guards _string_delay_lines
+_string_delay_lines_lock = Lock()
+
+def _sample_times(first: int, count: int, samples_per_sec: int) -> Iterator[float]:
+    """
+    Computes the time in seconds of a range of samples, i.e. i / samples_per_sec for i in [first, first + count).
+    """
+    return map(truediv, range(first, first + count), repeat(samples_per_sec))
+
+def audio_sine_samples(first: int, count: int, freq: float, amp: float, samples_per_sec: int) -> List[float]:
+    """
+    Computes a block of sine wave samples.
+
+    Parameters:
+    - first: Index of the first sample of the block within the wave.
+    - count: Number of samples in the block.
+    - freq: Frequency of the sine wave in Hz.
+    - amp: Amplitude of the sine wave.
+    - samples_per_sec: Sampling rate in samples per second.
+
+    Returns the samples first, ..., first + count - 1 of the sine wave, identical to the per-sample formula amp * sin(2 * pi * freq * t).
+    The cost is still one sin() call per sample (see the notes of this module).
+    """
+    thetas = map(mul, repeat(2 * pi * freq), _sample_times(first, count, samples_per_sec))
+    return list(map(mul, repeat(amp), map(sin, thetas)))
+
+def audio_square_samples(first: int, count: int, freq: float, amp: float, samples_per_sec: int) -> List[float]:
+    """
+    Computes a block of square wave samples.
+
+    Parameters:
+    - first: Index of the first sample of the block within the wave.
+    - count: Number of samples in the block.
+    - freq: Frequency of the square wave in Hz.
+    - amp: Amplitude of the square wave.
+    - samples_per_sec: Sampling rate in samples per second.
+
+    The wave is amp where sin(2 * pi * t * freq) >= 0 and -amp elsewhere, so it is constant between two zero crossings of the sine.
+    The block is built from runs of constant samples between the crossings, and sin() is only evaluated on the samples next to
+    each crossing, where rounding decides the sign.
+    """
+    stop = first + count
+    # The number of samples per half period, i.e., between two zero crossings
+    half_period = samples_per_sec / (2 * freq)
+    if half_period < 2:
+        # The crossings are too close to each other to form runs
+        return [amp if sin(2 * pi * t * freq) >= 0 else -amp for t in _sample_times(first, count, samples_per_sec)]
+
+    samples = []
+    half = floor(first / half_period)
+    crossings = [int(ceil(half * half_period))]
+    while len(samples) < count:
+        # The first sample at or after the next zero crossing
+        crossing = min(stop, max(first + len(samples), int(ceil((half + 1) * half_period))))
+        samples += [amp if half % 2 == 0 else -amp] * (crossing - first - len(samples))
+        crossings.append(crossing)
+        half += 1
+    # Decide the samples around each crossing with the same formula as the per-sample wave
+    for crossing in crossings:
+        for i in range(max(first, crossing - 1), min(stop, crossing + 1)):
+            samples[i - first] = amp if sin(2 * pi * (i / samples_per_sec) * freq) >= 0 else -amp
+    return samples
+
+def audio_sawtooth_samples(first: int, count: int, freq: float, amp: float, samples_per_sec: int) -> List[float]:
+    """
+    Computes a block of sawtooth wave samples.
+
+    Parameters:
+    - first: Index of the first sample of the block within the wave.
+    - count: Number of samples in the block.
+    - freq: Frequency of the sawtooth wave in Hz.
+    - amp: Amplitude of the sawtooth wave.
+    - samples_per_sec: Sampling rate in samples per second.
+
+    Returns the samples first, ..., first + count - 1 of the sawtooth wave, (2 * sample_pos - 1) * amp, where sample_pos is the position within the current cycle.
+    The cost is still a few arithmetic operations per sample (see the notes of this module).
+    """
+    num_cycles = map(mul, _sample_times(first, count, samples_per_sec), repeat(freq))
+    # Keep only the fractional part (exact for non-negative cycles, like cycles - int(cycles))
+    sample_pos = map(mod, num_cycles, repeat(1.0))
+    return list(map(mul, map(sub, map(mul, repeat(2), sample_pos), repeat(1)), repeat(amp)))
 
 def audio_generate_sine_wave(audio_data: Array, freq: float, amp: float, samples_per_sec: int):
     """
@@ -81,10 +230,7 @@ def audio_generate_sine_wave(audio_data: Array, freq: float, amp: float, samples
     - amp: Amplitude of the sine wave, where 1.0 is maximum amplitude.
     - samples_per_sec: Sampling rate in samples per second (should be 44100 for CD quality).
     """
-    for i in range(len(audio_data)):
-        t = i / samples_per_sec
-        theta = 2 * pi * freq * t
-        audio_data[i] = amp * sin(theta)
+    audio_data.copy_from(audio_sine_samples(0, len(audio_data), freq, amp, samples_per_sec))
 
 def audio_generate_square_wave(audio_data: Array, freq: float, amp: float, samples_per_sec: int):
     """
@@ -96,17 +242,7 @@ def audio_generate_square_wave(audio_data: Array, freq: float, amp: float, sampl
     - amp: The amplitude of the square wave. This value should oscillate between -amp and amp.
     - samples_per_sec: The sampling rate in samples per second.
     """
-    num_samples = len(audio_data)  # Determine the number of samples based on the audio_data array length
-
-    for i in range(num_samples):
-        # Calculate the time in seconds for the current sample
-        t = i / samples_per_sec
-
-        # Set the sample value to amp if sin(2pitf) >= 0 , else -amp
-        if sin(2*pi*t*freq) >= 0:
-            audio_data[i] = amp  # Positive half of the square wave
-        else:
-            audio_data[i] = -amp  # Negative half of the square wave
+    audio_data.copy_from(audio_square_samples(0, len(audio_data), freq, amp, samples_per_sec))
         
 def audio_generate_sawtooth_wave(audio_data: Array, freq: float, amp: float, samples_per_sec: int):
     """
@@ -120,48 +256,140 @@ def audio_generate_sawtooth_wave(audio_data: Array, freq: float, amp: float, sam
 
         The function modifies the audio_data array in place, filling it with the generated sawtooth wave samples.
         """
-    # Iterate through each sample to be generated
-    for i in range(len(audio_data)):
-        # Calculate the time in seconds for the current sample
-        t = i / samples_per_sec
-        # Determine how many complete cycles have occurred by this time
-        num_cycles = t * freq
-        # Calculate the position within the current cycle as a fraction between 0 and 1
-        sample_pos = num_cycles - int(num_cycles)  # Keep only the fractional part
-
-        # Calculate the sawtooth wave value for this position in the cycle
-        # The formula (2 * sample_pos - 1) maps the range [0,1] to [-1,1]
-        # Multiply by amplitude to scale the wave to the desired amplitude
-        audio_data[i] = (2 * sample_pos - 1) * amp
+    audio_data.copy_from(audio_sawtooth_samples(0, len(audio_data), freq, amp, samples_per_sec))
           
 def sinwave(theta):
     # Implementation of the sinwave function goes here.
     return sin(theta)
 
+def audio_complex_samples(first: int, count: int, freq: float, samples_per_sec: int) -> List[float]:
+    """
+    Computes a block of complex wave samples before normalization.
+
+    Parameters:
+    - first: Index of the first sample of the block within the wave.
+    - count: Number of samples in the block.
+    - freq: The frequency of the complex wave in Hz.
+    - samples_per_sec: The sampling rate in samples per second.
+
+    Each sample is the cube of the decaying harmonic stack sum(sin(2 * j * pi * t * freq) * exp(-0.0008 * pi * t * freq) / 2 ** (j - 1)) for j = 1, ..., 6.
+    Only sin and cos of the fundamental are evaluated: the higher harmonics follow from the recurrence
+    sin((j + 1) * theta) = 2 * cos(theta) * sin(j * theta) - sin((j - 1) * theta), and the decay is a geometric sequence.
+    """
+    thetas = list(map(mul, repeat(2 * pi * freq), _sample_times(first, count, samples_per_sec)))
+    cos2 = list(map(mul, repeat(2.0), map(cos, thetas)))
+    prev_harmonic, harmonic = [0.0] * count, list(map(sin, thetas))
+    harmonic_stack = harmonic
+    for weight in complex_harmonic_weights[1:]:
+        prev_harmonic, harmonic = harmonic, list(map(sub, map(mul, cos2, harmonic), prev_harmonic))
+        harmonic_stack = list(map(add, harmonic_stack, map(mul, harmonic, repeat(weight))))
+    decay_rate = 0.0008 * pi * freq / samples_per_sec
+    decay = accumulate(repeat(exp(-decay_rate), count - 1), mul, initial=exp(-decay_rate * first))
+    return list(map(pow, map(mul, harmonic_stack, decay), repeat(3)))
+
 def audio_generate_complex_wave(audio_data: Array, freq: float, amp: float, samples_per_sec: int):
-    # Calculate the number of samples needed
+    """
+    Generates a complex wave based on the specified frequency, amplitude, and sampling rate.
+
+    Parameters:
+    - audio_data: Array where the generated complex wave samples will be stored.
+    - freq: The frequency of the complex wave in Hz.
+    - amp: The amplitude of the complex wave.
+    - samples_per_sec: The sampling rate in samples per second.
+
+    The unnormalized samples are written block by block straight into audio_data while the peak is tracked,
+    then the whole array is normalized to amp with a single scale.
+    """
     num_samples = len(audio_data)
+    if num_samples == 0:
+        return
 
-    # Create a temporary array to store the complex wave before normalization
-    temp_wave = Array(num_samples)
+    max_sinwave = 0
+    for first in range(0, num_samples, block_size):
+        samples = audio_complex_samples(first, min(block_size, num_samples - first), freq, samples_per_sec)
+        max_sinwave = max(max_sinwave, max(map(abs, samples)))
+        audio_data.copy_from(samples, first)
 
-    # Calculate the sinwave values and store them in temp_wave
-    for i in range(num_samples):
-        t = i / samples_per_sec  # Calculate the time for the current sample
-        # Sum of sine waves for different harmonics with exponential decay
-        sinwave = sum(sin(2 * j * pi * t * freq) * exp(-0.0008 * pi * t * freq) / 2 ** (j - 1)
-                      for j in range(1, 7))
-        # Cube the sinwave value and store it in temp_wave
-        temp_wave[i] = sinwave ** 3
+    # Normalize by the maximum absolute value, scaling with the amplitude
+    audio_data.scale(amp / max_sinwave)
 
-    # Find the maximum absolute value in the temp_wave for normalization
-    max_sinwave = max(abs(sample) for sample in temp_wave)
+@lru_cache(maxsize=128)
+def _string_excitation(size: int, freq: float, samples_per_sec: int) -> Tuple[float, ...]:
+    """
+    Computes (and memoizes) the unit-amplitude excitation of a string delay line, a square wave at 100 times the note frequency.
+    Only the 128 most recent pitches are kept, which covers the MIDI note range of a song.
+    """
+    return tuple(audio_square_samples(0, size, freq * 100, 1.0, samples_per_sec))
 
-    # Normalize and store the values in the audio_data array, scaling with the amplitude
-    for i in range(num_samples):
-        audio_data[i] = (temp_wave[i] / max_sinwave) * amp
+def _string_average(prev_sample: float, cur_sample: float) -> float:
+    """
+    Computes the averaging filter of the Karplus-Strong algorithm.
+    """
+    return (prev_sample + cur_sample) / 2
 
-def audio_generate_string_wave(audio_data: Array, freq: float, amp: float, samples_per_sec: int):
+def audio_string_delay_line(freq: float, amp: float, samples_per_sec: int) -> RingBuffer:
+    """
+    Gets a Karplus-Strong delay line for a string wave, excited and ready to render the first sample of the note.
+
+    Parameters:
+    - freq: The frequency of the note to simulate.
+    - amp: The amplitude of the string wave.
+    - samples_per_sec: The sampling rate in samples per second.
+
+    Delay lines are reused across notes: the ring buffer is taken from a pool of released delay lines of the same
+    size (i.e., the same pitch) when possible, and should be given back with audio_release_string_delay_line().
+    The pool keeps at most string_delay_line_pool_size sizes, and it is safe to use from several threads.
+    """
+    # Calculate the size of the delay line, which is based on the desired frequency
+    size = int(samples_per_sec / freq)
+    if size < 1:
+        raise ValueError("String wave frequency must not exceed the sampling rate")
+    with _string_delay_lines_lock:
+        pooled = _string_delay_lines.get(size)
+        delay_line = pooled.pop() if pooled else None
+    if delay_line is None:
+        delay_line = RingBuffer(size)
+    delay_line.reset([amp * sample for sample in _string_excitation(size, freq, samples_per_sec)])
+    return delay_line
+
+def audio_release_string_delay_line(delay_line: RingBuffer):
+    """
+    Gives a delay line obtained from audio_string_delay_line() back to the pool, so that later notes of the same pitch can reuse it.
+    """
+    size = len(delay_line)
+    with _string_delay_lines_lock:
+        if size not in _string_delay_lines and len(_string_delay_lines) >= string_delay_line_pool_size:
+            # Forget the delay lines of the oldest pooled size
+            del _string_delay_lines[next(iter(_string_delay_lines))]
+        _string_delay_lines.setdefault(size, []).append(delay_line)
+
+def audio_string_samples(delay_line: RingBuffer, count: int) -> List[float]:
+    """
+    Computes the next block of string wave samples from a Karplus-Strong delay line.
+
+    Parameters:
+    - delay_line: The delay line of the string, which is advanced past the computed samples.
+    - count: Number of samples in the block.
+
+    Each sample is the average of the previous sample and the delay line sample one period earlier, and it replaces that
+    delay line sample. The block is processed one delay line period (or the part of it up to the end of the ring buffer)
+    at a time: the period is read in one block, filtered by a running average, and written back in one block.
+    The running average is a recurrence (each filtered sample depends on the previous filtered sample), so it cannot be
+    expressed as an element-wise map; accumulate() still calls _string_average() once per sample, and only the delay line
+    reads and writes are blocked.
+    """
+    size = len(delay_line)
+    samples = []
+    while len(samples) < count:
+        head = delay_line.head()
+        segment = delay_line.read(min(count - len(samples), size - head))
+        # The previous sample is the one stored just before the head
+        filtered = list(accumulate(segment, _string_average, initial=delay_line[(head - 1) % size]))[1:]
+        delay_line.write(filtered)
+        samples += filtered
+    return samples
+
+def audio_generate_string_wave(audio_data: Array, freq: float, amp: float, samples_per_sec: int, start: int = 0, count: int = None):
     """
         Generates a string wave using a modified version of the Karplus-Strong algorithm.
 
@@ -170,30 +398,104 @@ def audio_generate_string_wave(audio_data: Array, freq: float, amp: float, sampl
         - freq: The frequency of the note to simulate.
         - amp: The amplitude of the string wave.
         - samples_per_sec: The sampling rate in samples per second.
+        - start: The index in audio_data where the first sample is stored. Default is 0.
+        - count: The number of samples to generate. Default is None, i.e., up to the end of audio_data.
         """
-    # Calculate the size of wave_samples which is based on the desired frequency
-    size_wave_samples = int(samples_per_sec / freq)
-
-    # Initialize wave_samples using the audio_generate_square_wave function with an increased frequency
-    wave_samples = Array(size_wave_samples)
-    audio_generate_square_wave(wave_samples, freq * 100, amp, samples_per_sec)
-
-    # Initialize prev_idx to the last index of the wave_samples
-    prev_idx = size_wave_samples - 1
-    # Initialize cur_idx to 0
-    cur_idx = 0
-
-    # Loop through the audio_data array to fill it with the string wave samples
-    for i in range(len(audio_data)):
-        # Set the current audio sample to the average of the wave_samples at prev_idx and cur_idx
-        audio_data[i] = (wave_samples[prev_idx] + wave_samples[cur_idx]) / 2
-        # Set the wave_samples at cur_idx to the new audio_data[i]
-        wave_samples[cur_idx] = audio_data[i]
-        # Set prev_idx to cur_idx
-        prev_idx = cur_idx
-        # Advance cur_idx by 1 and wrap it using modulo to stay within the bounds of wave_samples
-        cur_idx = (cur_idx + 1) % size_wave_samples
+    count = len(audio_data) - start if count is None else count
+    delay_line = audio_string_delay_line(freq, amp, samples_per_sec)
+    try:
+        for first in range(0, count, block_size):
+            audio_data.copy_from(audio_string_samples(delay_line, min(block_size, count - first)), start + first)
+    finally:
+        audio_release_string_delay_line(delay_line)
+
+def audio_wavetable(wave_type: int, table_size: int = None) -> List[float]:
+    """
+    Returns the single-cycle wavetable of a wave type, building it on first use.
+
+    Parameters:
+    - wave_type: The wave type (1: sine, 2: square, 3: sawtooth, 4: complex).
+    - table_size: The number of samples in the cycle. Default is None, i.e., wavetable_size.
+      Larger tables are more accurate, smaller tables are faster to build and use less memory.
+
+    The table holds one cycle of the wave at unit amplitude, plus a copy of the first sample at the end so that
+    lookups can always interpolate with the next entry. The complex wave table holds the cubed harmonic stack
+    (without the decay), normalized to a peak of 1.
+    """
+    table_size = table_size or wavetable_size
+    key = (wave_type, table_size)
+    if key not in _wavetables:
+        phases = [k / table_size for k in range(table_size)]
+        if wave_type == 1:
+            table = [sin(2 * pi * x) for x in phases]
+        elif wave_type == 2:
+            table = [1.0 if x <= 0.5 else -1.0 for x in phases]
+        elif wave_type == 3:
+            table = [2 * x - 1 for x in phases]
+        elif wave_type == 4:
+            table = [sum(sin(2 * j * pi * x) / 2 ** (j - 1) for j in range(1, 7)) ** 3 for x in phases]
+            peak = max(map(abs, table))
+            table = [sample / peak for sample in table]
+        else:
+            raise ValueError("No wavetable for wave type " + str(wave_type))
+        table.append(table[0])
+        _wavetables[key] = table
+    return _wavetables[key]
+
+@lru_cache(maxsize=None)
+def _wavetable_peak_phase(wave_type: int, table_size: int) -> float:
+    """
+    Finds (and memoizes) the phase, as a fraction of a cycle, of the first peak of a wavetable.
+    """
+    table = audio_wavetable(wave_type, table_size)
+    return max(range(table_size), key=lambda k: abs(table[k])) / table_size
+
+def audio_wavetable_samples(first: int, count: int, wave_type: int, freq: float, amp: float, samples_per_sec: int, table_size: int = None) -> List[float]:
+    """
+    Computes a block of wave samples by looking them up in the wave's single-cycle wavetable.
+
+    Parameters:
+    - first: Index of the first sample of the block within the wave.
+    - count: Number of samples in the block.
+    - wave_type: The wave type (1: sine, 2: square, 3: sawtooth, 4: complex).
+    - freq: The frequency of the wave in Hz.
+    - amp: The amplitude of the wave.
+    - samples_per_sec: The sampling rate in samples per second.
+    - table_size: The number of samples in the wavetable. Default is None, i.e., wavetable_size.
+
+    The phase of each sample is located in the table and the two nearest entries are linearly interpolated,
+    so the cost per sample is the same for every wave type. For the complex wave, the exponential decay is applied
+    as a geometric sequence, and the result is normalized at the first peak of the cycle, as the formula does.
+    """
+    table = audio_wavetable(wave_type, table_size)
+    size = len(table) - 1
+    # The phase increment per sample, in table entries
+    step = freq * size / samples_per_sec
+    phases = map(mod, map(mul, range(first, first + count), repeat(step)), repeat(float(size)))
+    samples = [table[k] + (phase - k) * (table[k + 1] - table[k]) for phase in phases for k in (int(phase),)]
+    if wave_type == 4:
+        # The cubed decay exp(-0.0008 * pi * t * freq) ** 3, relative to its value at the first peak of the cycle
+        peak_phase = _wavetable_peak_phase(wave_type, size)
+        rate = 0.0024 * pi * freq / samples_per_sec
+        decay = accumulate(repeat(exp(-rate), count - 1), mul, initial=amp * exp(rate * (peak_phase * samples_per_sec / freq - first)))
+        return list(map(mul, decay, samples))
+    return list(map(mul, repeat(amp), samples))
+
+def audio_generate_wavetable_wave(audio_data: Array, wave_type: int, freq: float, amp: float, samples_per_sec: int, table_size: int = None):
+    """
+    Generates a sine, square, sawtooth, or complex wave by interpolated wavetable lookup.
 
+    Parameters:
+    - audio_data: Array where the generated wave samples will be stored.
+    - wave_type: The wave type (1: sine, 2: square, 3: sawtooth, 4: complex).
+    - freq: The frequency of the wave in Hz.
+    - amp: The amplitude of the wave.
+    - samples_per_sec: The sampling rate in samples per second.
+    - table_size: The number of samples in the wavetable. Default is None, i.e., wavetable_size.
+    """
+    audio_data.copy_from(audio_wavetable_samples(0, len(audio_data), wave_type, freq, amp, samples_per_sec, table_size))
+
+@lru_cache(maxsize=None)
 def audio_note_number_to_freq(note_number:int)->float:
     return 440 * (2 ** ((note_number - 69) / 12))
 
@@ -203,49 +505,92 @@ def audio_stereo_gains(angle: float) -> Tuple[float, float]:
     return left_gain, right_gain
 
 def audio_multiply_gain(audio_data: Array, gain: float):
-    for i in range(len(audio_data)):
-        audio_data[i] *= gain
+    audio_data.scale(gain)
 
-def audio_rise_fall_envelope(audio_data: Array):
-    middle_sample_index = len(audio_data) // 2  # Index of the middle sample
-    for i in range(len(audio_data)):
-        if i <= middle_sample_index:
-            gain = i / middle_sample_index
-        else:
-            gain = (len(audio_data) - 1 - i) / (len(audio_data) - 1 - middle_sample_index)
-        audio_data[i] *= gain
+def _envelope_gains(envelope_type: int, num_samples: int, attack: int, decay: int, release: int) -> memoryview:
+    """
+    Builds the gain curve of an envelope (see audio_envelope_gains()). This function is wrapped by an LRU cache below.
+    """
+    if envelope_type == 2 and num_samples >= attack + decay + release:
+        decay_end = attack + decay
+        release_start = num_samples - release
+        gains = [1.2 * i / attack for i in range(attack)]
+        gains += [1 + 0.2 * (decay_end - i) / decay for i in range(attack, decay_end)]
+        gains += [1] * (release_start - decay_end)
+        gains += [(num_samples - 1 - i) / release for i in range(release_start, num_samples)]
+    elif envelope_type == 1 or envelope_type == 2:
+        # The rise/fall envelope, also used by ADSR when the audio is too short for attack, decay, and release
+        middle_sample_index = num_samples // 2  # Index of the middle sample
+        # Rising gains up to (and including) the middle sample, then falling gains
+        gains = [i / middle_sample_index for i in range(min(middle_sample_index + 1, num_samples))]
+        gains += [(num_samples - 1 - i) / (num_samples - 1 - middle_sample_index) for i in range(middle_sample_index + 1, num_samples)]
+    elif envelope_type == 0:
+        gains = [1] * num_samples
+    else:
+        raise ValueError("Unknown envelope type")
+    return memoryview(array('d', gains)).toreadonly()
+
+## The LRU cache of envelope gain curves, built by _envelope_cache()
+_cached_envelope_gains = None
 
-def audio_adsr_envelope(audio_data: Array):
+def _envelope_cache():
+    """
+    Returns the LRU cache of envelope gain curves, (re)building it empty if envelope_cache_size has changed since it was built.
+    """
+    global _cached_envelope_gains
+    if _cached_envelope_gains is None or _cached_envelope_gains.cache_info().maxsize != envelope_cache_size:
+        _cached_envelope_gains = lru_cache(maxsize=envelope_cache_size)(_envelope_gains)
+    return _cached_envelope_gains
 
-    adsr_attack_samples = 882  # Example value for attack samples
-    adsr_decay_samples = 882  # Example value for decay samples
-    adsr_release_samples = 882  # Example value for release samples
-    gain = 1
+def audio_envelope_gains(envelope_type: int, num_samples: int, attack: int = None, decay: int = None, release: int = None) -> memoryview:
+    """
+    Returns the gain curve of an envelope, building it only if it is not in the envelope cache.
 
-    if len(audio_data) < adsr_attack_samples + adsr_decay_samples + adsr_release_samples:
-        audio_rise_fall_envelope(audio_data)
+    Parameters:
+    - envelope_type: The envelope type (0: no envelope, 1: rise/fall envelope, 2: ADSR envelope).
+    - num_samples: The number of samples of the audio data the envelope is applied to.
+    - attack: The number of ADSR attack samples. Default is None, i.e., adsr_attack_samples.
+    - decay: The number of ADSR decay samples. Default is None, i.e., adsr_decay_samples.
+    - release: The number of ADSR release samples. Default is None, i.e., adsr_release_samples.
+
+    The curves are cached by (envelope type, number of samples, attack, decay, release); the least recently used curve
+    is evicted once the cache holds envelope_cache_size curves (read on each call, so changing it resets the cache).
+    The returned curve is a read-only float64 buffer.
+    """
+    if envelope_type == 2:
+        key = (attack if attack is not None else adsr_attack_samples,
+               decay if decay is not None else adsr_decay_samples,
+               release if release is not None else adsr_release_samples)
+        if min(key) < 1:
+            raise ValueError("ADSR attack, decay, and release samples must be positive")
     else:
-        for i in range(len(audio_data)):
-            if i < adsr_attack_samples:
-                gain = 1.2 * i / adsr_attack_samples
-            elif adsr_attack_samples <= i < adsr_attack_samples + adsr_decay_samples:
-                gain = 1 + 0.2 * (adsr_attack_samples + adsr_decay_samples - i)/ adsr_decay_samples
-            elif adsr_attack_samples + adsr_decay_samples <= i < len(audio_data) - adsr_release_samples:
-                gain = 1
-            elif len(audio_data) - adsr_release_samples <= i < len(audio_data):
-                gain = (len(audio_data) - 1 - i) / adsr_release_samples
-            else:
-                print("Error")
-            audio_data[i] *= gain
+        # attack, decay, and release do not shape the other envelopes, so they do not take part in the cache key
+        key = (0, 0, 0)
+    return _envelope_cache()(envelope_type, num_samples, *key)
+
+def audio_apply_envelope(audio_data: Array, envelope_type: int, attack: int = None, decay: int = None, release: int = None):
+    """
+    Applies an envelope to the input audio data by multiplying it with the (cached) gain curve of the envelope.
+
+    Parameters:
+    - audio_data: Array holding the audio samples, modified in place.
+    - envelope_type: The envelope type (0: no envelope, 1: rise/fall envelope, 2: ADSR envelope).
+    - attack, decay, release: The number of ADSR attack, decay, and release samples. Default is None, i.e., the module defaults.
+    """
+    if envelope_type != 0:
+        audio_data.multiply(audio_envelope_gains(envelope_type, len(audio_data), attack, decay, release))
+
+def audio_rise_fall_envelope(audio_data: Array):
+    audio_apply_envelope(audio_data, 1)
+
+def audio_adsr_envelope(audio_data: Array, attack: int = None, decay: int = None, release: int = None):
+    audio_apply_envelope(audio_data, 2, attack, decay, release)
 
 def audio_stereo_mix_in(stereo_data: Array, channel_data: Array, which_channel: int):
     if len(stereo_data) != 2 * len(channel_data):
         raise ValueError("Number of stereo audio samples must be twice the number of input channel data")
+    if which_channel != 0 and which_channel != 1:
+        raise ValueError("Invalid channel number. Use 0 for left channel or 1 for right channel")
 
-    for i in range(len(channel_data)):
-        if which_channel == 0:  # Left channel
-            stereo_data[i * 2] += channel_data[i]
-        elif which_channel == 1:  # Right channel
-            stereo_data[i * 2 + 1] += channel_data[i]
-        else:
-            raise ValueError("Invalid channel number. Use 0 for left channel or 1 for right channel")
+    # Add the channel data to every other sample, starting at the left (0) or right (1) channel
+    stereo_data.channel(which_channel).add_scaled(channel_data)
@@ -9,9 +9,19 @@
 # @section description_datastructure Description
 # This package provides the data structure required for the audio processing project. i.e., the Array class. Note that you will use Array throughout the entire semester, so you need to practice using the Array data structure. The Array class has two attributes. _cap stores the array's capacity, i.e., the maximum number of items that can be stored in the array. _data is a Python list used as the container to store items in an array. Remark: noticing the difference between an array and a Python list is important. e.g., you cannot use [-1] to access the last item in an array. Instead, you need to use [len(array) - 1]. Furthermore, Array has no append, insert methods.
 #
+# Besides item access, Array provides block operations (get_block, fill, copy_from, add_scaled, multiply, and scale) that work on a whole range of items and check the range boundary once per call instead of once per item. Array.view() and Array.channel() return a DataStructure.ArrayView, a zero-copy (and possibly strided) view of a range of an array that supports the same operations.
+#
+# DataStructure.RingBuffer is a TypedArray with a head position, used as a circular buffer (e.g., the delay line of a string wave). Its read() and write() methods access items starting at the head and wrap around the end of the buffer.
+#
+# The package also provides DataStructure.TypedArray, an Array whose items are stored in a contiguous typed buffer (float64 by default, or float32) instead of a Python list of boxed floats. It keeps the same indexing and length contract as Array, so it can be used wherever an Array of samples is expected, while using roughly a quarter of the memory. Its buffer can be exposed through a memoryview (and therefore viewed by NumPy) without copying, and TypedArray.from_buffer() lets it work in place on an existing buffer such as a memory-mapped file.
+#
 # @section libraries_datastructure Libraries/Modules
 # - typing (from the standard library)
 #   - Access to Any.
+# - array (from the standard library)
+#   - Access to array, the typed container used by TypedArray.
+# - itertools and operator (from the standard library)
+#   - Access to repeat, add, and mul, used by the block operations.
 #
 # @section notes_datastructure Notes
 # - Comments should be Doxygen compatible.
@@ -25,7 +35,10 @@
 #
 # Copyright (c) 2023 Bucknell University. All rights reserved.
 
-from typing import Any
+from typing import Any, Iterator
+from array import array
+from itertools import repeat
+from operator import add, mul
 
 class Array:
     """! The DataStructure.Array class.
@@ -95,3 +108,444 @@ class Array:
         
         self._boundary_check(index)
         self._data[index] = value
+        
+    def _range_check(self, start: int, stop: int) -> None:
+        """! Check if a range [start, stop) is in bound, raise an error if not.
+        
+        @param start The first index of the range.
+        
+        @param stop The index one past the last index of the range.
+        """
+        
+        if start < 0 or stop > self._cap or start > stop:
+            raise IndexError
+        
+    def _span(self, start: int, stop: int, step: int = 1) -> slice:
+        """! Map the range [start, stop) with the given step to a slice of **_data**.
+        
+        @param start The first index of the range.
+        
+        @param stop The index one past the last index of the range.
+        
+        @param step The step between two consecutive indices. Default is 1.
+        
+        @return The slice of **_data** that holds the items of the range.
+        """
+        
+        self._range_check(start, stop)
+        return slice(start, stop, step)
+        
+    def _pack(self, values) -> Any:
+        """! Convert a sequence of values to a container that can be assigned to a slice of **_data**.
+        
+        @param values The input values.
+        
+        @return The values stored in a container of the same type as **_data**.
+        """
+        
+        return list(values)
+        
+    def _block_values(self, src, count: int = None) -> Any:
+        """! Get the values of a block source, which is either an Array or a sequence of values.
+        
+        @param src The block source.
+        
+        @param count The number of values expected from the source. Default is None, i.e., the length of the source.
+        
+        @return A sequence holding the values of the source.
+        """
+        
+        values = src.get_block() if isinstance(src, Array) else src
+        if count is not None and len(values) != count:
+            raise ValueError("Block sizes do not match")
+        return values
+        
+    def view(self, start: int = 0, stop: int = None, step: int = 1) -> 'ArrayView':
+        """! Get a zero-copy view of a range of the array.
+        
+        The view shares the storage of this array, so writing to the view writes to this array.
+        
+        @param start The first index of the range. Default is 0.
+        
+        @param stop The index one past the last index of the range. Default is None, i.e., the length of the array.
+        
+        @param step The step between two consecutive indices in the view. Default is 1.
+        
+        @return An ArrayView of the range.
+        """
+        
+        return ArrayView(self, start, self._cap if stop is None else stop, step)
+        
+    def channel(self, which_channel: int, num_channels: int = 2) -> 'ArrayView':
+        """! Get a zero-copy strided view of one channel of interleaved audio data.
+        
+        @param which_channel The channel index, e.g., 0 for left and 1 for right.
+        
+        @param num_channels The number of interleaved channels. Default is 2.
+        
+        @return An ArrayView of the channel.
+        """
+        
+        if which_channel < 0 or which_channel >= num_channels:
+            raise IndexError
+        return self.view(which_channel, self._cap, num_channels)
+        
+    def get_block(self, start: int = 0, stop: int = None) -> Any:
+        """! Get the items in the range [start, stop).
+        
+        The items are copied, except for a TypedArray created by TypedArray.from_buffer(), whose items are stored in a memoryview: its block is a memoryview slice that shares memory with the buffer, so it changes when the array changes and must be released (or dropped) before the buffer is closed.
+        
+        @param start The first index of the range. Default is 0.
+        
+        @param stop The index one past the last index of the range. Default is None, i.e., the length of the array.
+        
+        @return The items of the range, stored in a container of the same type as **_data** (a copy, or a view of a memoryview).
+        """
+        
+        return self._data[self._span(start, self._cap if stop is None else stop)]
+        
+    def fill(self, value: Any, start: int = 0, stop: int = None) -> None:
+        """! Store the input value at every index of the range [start, stop).
+        
+        @param value The input value.
+        
+        @param start The first index of the range. Default is 0.
+        
+        @param stop The index one past the last index of the range. Default is None, i.e., the length of the array.
+        """
+        
+        stop = self._cap if stop is None else stop
+        span = self._span(start, stop)
+        self._data[span] = self._pack([value]) * (stop - start)
+        
+    def copy_from(self, src, start: int = 0) -> None:
+        """! Copy the items of src into this array, starting at index start.
+        
+        @param src The source Array or sequence of values.
+        
+        @param start The index where the first item of src is stored. Default is 0.
+        """
+        
+        values = self._block_values(src)
+        span = self._span(start, start + len(values))
+        self._data[span] = self._pack(values)
+        
+    def add_scaled(self, src, gain: float = 1, start: int = 0) -> None:
+        """! Add gain * src to this array elementwise, starting at index start.
+        
+        @param src The source Array or sequence of values.
+        
+        @param gain The gain applied to the source values. Default is 1.
+        
+        @param start The index where the first item of src is added. Default is 0.
+        """
+        
+        values = self._block_values(src)
+        span = self._span(start, start + len(values))
+        if gain != 1:
+            values = map(mul, values, repeat(gain))
+        self._data[span] = self._pack(map(add, self._data[span], values))
+        
+    def multiply(self, src, start: int = 0) -> None:
+        """! Multiply this array by src elementwise, starting at index start.
+        
+        @param src The source Array or sequence of values.
+        
+        @param start The index where the first item of src is multiplied. Default is 0.
+        """
+        
+        values = self._block_values(src)
+        span = self._span(start, start + len(values))
+        self._data[span] = self._pack(map(mul, self._data[span], values))
+        
+    def scale(self, gain: float, start: int = 0, stop: int = None) -> None:
+        """! Multiply every item of the range [start, stop) by gain.
+        
+        @param gain The input gain.
+        
+        @param start The first index of the range. Default is 0.
+        
+        @param stop The index one past the last index of the range. Default is None, i.e., the length of the array.
+        """
+        
+        span = self._span(start, self._cap if stop is None else stop)
+        self._data[span] = self._pack(map(mul, self._data[span], repeat(gain)))
+
+class TypedArray(Array):
+    """! The DataStructure.TypedArray class.
+    
+    Defines an array that stores numbers in a contiguous typed buffer. It supports the same indexing and length contract as DataStructure.Array, and its buffer can be shared with other libraries without copying through buffer().
+    """
+    
+    def __init__(self, cap: int = 10, init_val: float = 0, typecode: str = 'd') -> None:
+        """! The typed array class initializer.
+        
+        @param cap The capacity of the array.
+        
+        @param init_val The value used to initialize the array. Default is 0. None is treated as 0.
+        
+        @param typecode The item type of the buffer, using the typecodes of the array module. Default is 'd' (float64). Use 'f' for float32.
+        """
+        
+        ## The capacity of the array
+        self._cap = cap
+        ## The item typecode of the array buffer
+        self._typecode = typecode
+        ## The array data, stored in a contiguous typed buffer
+        self._data = array(typecode, [0 if init_val is None else init_val]) * self._cap
+        
+    @classmethod
+    def from_buffer(cls, buffer, typecode: str = 'd') -> 'TypedArray':
+        """! Create a typed array that stores its items in an existing writable buffer (e.g., a memory-mapped file) without copying.
+        
+        @param buffer The writable buffer, e.g., a bytearray, an mmap, or a memoryview. Its size must be a multiple of the item size.
+        
+        @param typecode The item type of the buffer. Default is 'd' (float64).
+        
+        @return A typed array whose items live in **buffer**.
+        """
+        
+        typed_array = cls.__new__(cls)
+        typed_array._typecode = typecode
+        typed_array._data = memoryview(buffer).cast('B').cast(typecode)
+        typed_array._cap = len(typed_array._data)
+        return typed_array
+        
+    def release(self) -> None:
+        """! Release the buffer of a typed array created by from_buffer(), so that the buffer (e.g., a memory map) can be closed. The typed array must not be used afterward.
+        """
+        
+        if isinstance(self._data, memoryview):
+            self._data.release()
+        
+    def __iter__(self) -> Iterator:
+        """! Iterate over the items stored in the array.
+        
+        @return An iterator over the items of the array.
+        """
+        
+        return iter(self._data)
+        
+    def copy_from(self, src, start: int = 0) -> None:
+        """! Copy the items of src into this array, starting at index start.
+        
+        A source typed array (or memoryview) of the same item type is copied with a single buffer move, without converting it to an intermediate array.
+        
+        @param src The source Array or sequence of values.
+        
+        @param start The index where the first item of src is stored. Default is 0.
+        """
+        
+        values = self._block_values(src)
+        if isinstance(values, memoryview) and values.format == self._typecode:
+            memoryview(self._data)[self._span(start, start + len(values))] = values
+        else:
+            super().copy_from(values, start)
+            
+    def _pack(self, values) -> array:
+        """! Convert a sequence of values to a typed buffer that can be assigned to a slice of **_data**.
+        
+        @param values The input values.
+        
+        @return The values stored in an array with the same typecode as **_data**.
+        """
+        
+        return values if isinstance(values, array) and values.typecode == self._typecode else array(self._typecode, values)
+        
+    def __buffer__(self, flags: int) -> memoryview:
+        """! Expose the array buffer through the buffer protocol (Python 3.12 or later).
+        
+        @param flags The buffer request flags.
+        
+        @return A memoryview of the array buffer.
+        """
+        
+        return memoryview(self._data)
+        
+    def buffer(self) -> memoryview:
+        """! Get a zero-copy view of the array buffer.
+        
+        The returned memoryview shares memory with the array, so it can be passed to, e.g., numpy.frombuffer() or written to a file without copying the samples.
+        
+        @return A memoryview of the array buffer.
+        """
+        
+        return memoryview(self._data)
+        
+    def typecode(self) -> str:
+        """! Get the item typecode of the array buffer.
+        
+        @return The typecode of the array buffer, e.g. 'd' or 'f'.
+        """
+        
+        return self._typecode
+
+class RingBuffer(TypedArray):
+    """! The DataStructure.RingBuffer class.
+    
+    Defines a fixed-capacity circular buffer (e.g., a delay line) stored in a contiguous typed buffer. Besides the TypedArray interface, which accesses items by their position in the buffer, it keeps a head position: read() and write() access items starting at the head and wrap around the end of the buffer, and write() advances the head.
+    """
+    
+    def __init__(self, cap: int = 10, init_val: float = 0, typecode: str = 'd') -> None:
+        """! The ring buffer class initializer.
+        
+        @param cap The capacity of the ring buffer.
+        
+        @param init_val The value used to initialize the ring buffer. Default is 0.
+        
+        @param typecode The item type of the buffer. Default is 'd' (float64).
+        """
+        
+        super().__init__(cap, init_val, typecode)
+        ## The position of the head, i.e., the next item to be read and overwritten
+        self._head = 0
+        
+    def head(self) -> int:
+        """! Get the position of the head.
+        
+        @return The position of the head.
+        """
+        
+        return self._head
+        
+    def reset(self, values) -> None:
+        """! Overwrite the whole ring buffer and move the head to position 0.
+        
+        @param values The source Array or sequence of values. It must have as many values as the capacity of the ring buffer.
+        """
+        
+        self.copy_from(self._block_values(values, self._cap))
+        self._head = 0
+        
+    def read(self, count: int) -> Any:
+        """! Get a copy of count items starting at the head, wrapping around the end of the buffer.
+        
+        @param count The number of items, at most the capacity of the ring buffer.
+        
+        @return The items, stored in a typed buffer.
+        """
+        
+        if count < 0 or count > self._cap:
+            raise IndexError
+        stop = self._head + count
+        if stop <= self._cap:
+            return self.get_block(self._head, stop)
+        return self.get_block(self._head) + self.get_block(0, stop - self._cap)
+        
+    def write(self, values) -> None:
+        """! Overwrite items starting at the head, wrapping around the end of the buffer, and advance the head past them.
+        
+        @param values The source Array or sequence of values, at most as many as the capacity of the ring buffer.
+        """
+        
+        values = self._block_values(values)
+        count = len(values)
+        if count > self._cap:
+            raise IndexError
+        first = min(count, self._cap - self._head)
+        self.copy_from(values[:first], self._head)
+        self.copy_from(values[first:], 0)
+        self._head = (self._head + count) % self._cap if self._cap else 0
+
+class ArrayView(Array):
+    """! The DataStructure.ArrayView class.
+    
+    Defines a zero-copy view of a range of an Array. A view shares the storage of the viewed array, supports the same indexing, length, and block operations, and may skip items with a step (e.g., a single channel of interleaved stereo audio data).
+    """
+    
+    def __init__(self, array: Array, start: int, stop: int, step: int = 1) -> None:
+        """! The array view class initializer.
+        
+        @param array The viewed array.
+        
+        @param start The first index of the range.
+        
+        @param stop The index one past the last index of the range.
+        
+        @param step The step between two consecutive indices in the view. Default is 1.
+        """
+        
+        if step < 1:
+            raise ValueError("The view step must be positive")
+        span = array._span(start, stop, step)
+        ## The viewed array
+        self._array = array
+        ## The capacity of the view
+        self._cap = len(range(start, stop, step))
+        ## The index of the first item of the view in **_data**
+        self._offset = span.start
+        ## The step between two consecutive items of the view in **_data**
+        self._stride = span.step
+        ## The array data, shared with the viewed array
+        self._data = array._data
+        
+    def __str__(self) -> str:
+        """! A string representation of the array view.
+        
+        @return A string that represents the array view.
+        """
+        
+        return '[' + ', '.join(str(elm) for elm in self.get_block()) + ']'
+        
+    def __iter__(self) -> Iterator:
+        """! Iterate over the items of the view.
+        
+        @return An iterator over the items of the view.
+        """
+        
+        return iter(self.get_block())
+        
+    def __getitem__(self, index: int) -> Any:
+        """! Get the item stored at index in the view.
+        
+        @param index The input index.
+        
+        @return The item stored at index.
+        """
+        
+        self._boundary_check(index)
+        return self._data[self._offset + index * self._stride]
+        
+    def __setitem__(self, index: int, value: Any):
+        """! Store the input value at index in the view.
+        
+        @param index The input index.
+        
+        @param value The input value.
+        """
+        
+        self._boundary_check(index)
+        self._data[self._offset + index * self._stride] = value
+        
+    def _span(self, start: int, stop: int, step: int = 1) -> slice:
+        """! Map the range [start, stop) of the view with the given step to a slice of **_data**.
+        
+        @param start The first index of the range.
+        
+        @param stop The index one past the last index of the range.
+        
+        @param step The step between two consecutive indices. Default is 1.
+        
+        @return The slice of **_data** that holds the items of the range.
+        """
+        
+        self._range_check(start, stop)
+        return slice(self._offset + start * self._stride, self._offset + stop * self._stride, self._stride * step)
+        
+    def _pack(self, values) -> Any:
+        """! Convert a sequence of values to a container that can be assigned to a slice of **_data**.
+        
+        @param values The input values.
+        
+        @return The values stored in a container of the same type as **_data**.
+        """
+        
+        return self._array._pack(values)
+        
+    def buffer(self) -> memoryview:
+        """! Get a zero-copy view of the items of the view, if the viewed array is backed by a typed buffer.
+        
+        @return A (possibly strided) memoryview of the items of the view.
+        """
+        
+        return memoryview(self._data)[self._span(0, self._cap)]
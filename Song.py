@@ -15,12 +15,12 @@
 # wave_type_2 envelope_type_2 instrument_amplitude_2 pan_angle_2
 # ...
 # wave_type_n envelope_type_n instrument_amplitude_n pan_angle_n
-# note_1_instrument_index note_1_amplitude note_1_start_sample_index note_1_end_sample_index
-# note_2_instrument_index note_2_amplitude note_2_start_sample_index note_2_end_sample_index
+# note_1_instrument_index note_1_number note_1_amplitude note_1_start_sample_index note_1_end_sample_index
+# note_2_instrument_index note_2_number note_2_amplitude note_2_start_sample_index note_2_end_sample_index
 # ...
-# note_m_instrument_index note_m_amplitude note_m_start_sample_index note_m_end_sample_index
+# note_m_instrument_index note_m_number note_m_amplitude note_m_start_sample_index note_m_end_sample_index
 # ```
-# The music score specifies how many samples the song has (**num_of_samples**) and how many instruments are used (**num_of_instruments**). For each instrument, it specifies which wave type (**wave_type_x**) should be used to generate the wave sound, which envelope should be applied (**envelope_type_x**), the instrument amplitude (**instrument_amplitude_x**), and the pan angle (**pan_angle_x**). Then, it describes all the notes of a song. Each note has an instrument index (**note_x_instrument_index**), its own amplitude (**note_x_amplitude**), and from which sample (**note_x_start_sample_index**) to which sample (**note_x_end_sample_index**) that the note sounds in the song. For example, below is a simple do-re-mi-fa-so melody described using the above music score format:
+# The music score specifies how many samples the song has (**num_of_samples**) and how many instruments are used (**num_of_instruments**). For each instrument, it specifies which wave type (**wave_type_x**) should be used to generate the wave sound, which envelope should be applied (**envelope_type_x**), the instrument amplitude (**instrument_amplitude_x**), and the pan angle (**pan_angle_x**). An ADSR instrument line may end with three optional integers, the number of attack, decay, and release samples (e.g. `2 2 0.4 0.02 441 882 1323`); otherwise the AudioProcessor defaults (882 samples each) are used. Then, it describes all the notes of a song. Each note has an instrument index (**note_x_instrument_index**), a note number (**note_x_number**, converted to a frequency by AudioProcessor.audio_note_number_to_freq()), its own amplitude (**note_x_amplitude**), and from which sample (**note_x_start_sample_index**) to which sample (**note_x_end_sample_index**) that the note sounds in the song. For example, below is a simple do-re-mi-fa-so melody described using the above music score format:
 # ```text
 # 441001
 # 1
@@ -52,13 +52,39 @@
 #
 # @section libraries_song Libraries/Modules
 # - typing (from the standard library)
-#   - access to TextIO, List, and Dict
+#   - access to TextIO, BinaryIO, Union, List, Dict, Tuple, and Iterator
+# - collections (from the standard library)
+#   - access to OrderedDict, used by the note cache, and deque, used to queue the notes synthesized by the thread pool
+# - concurrent.futures and threading (from the standard library)
+#   - access to ThreadPoolExecutor, ProcessPoolExecutor, and Lock, used to synthesize notes in parallel
+# - multiprocessing (from the standard library)
+#   - access to shared_memory, which holds the song stereo audio data rendered by the time shard processes
+# - operator, itertools, bisect, array, and mmap (from the standard library)
+#   - access to mul, truediv, sub, add, repeat, islice, chain, insort, bisect_right, array, and mmap
+# - struct, hashlib, os, os.path, tempfile, and sys (from the standard library)
+#   - access to Struct, error, blake2b, stat, fdopen, remove, replace, dirname, mkstemp, and byteorder, used by the compiled score cache
+# - io (from the standard library)
+#   - access to StringIO, used to parse the content of a score read for its compiled form
 # - Wave
-#   - access to Wave.BaseWave, Wave.SineWave, Wave.SquareWave, Wave.SawtoothWave, Wave.ComplexWave, and Wave.StringWave
+#   - access to Wave.BaseWave, Wave.SineWave, Wave.SquareWave, Wave.SawtoothWave, Wave.ComplexWave, Wave.StringWave, Wave.WavetableWave, and Wave.WaveWriter
 # - AudioProcessor
 #   - access to audio processing functions
 # - DataStructure
-#   - access to DataStructure.Array
+#   - access to DataStructure.Array and DataStructure.TypedArray
+#
+# Notes are mixed by a fused pipeline: each note is generated with its envelope applied, then scaled by the instrument amplitude and pan gains and added straight into the interleaved stereo song data, with no per-instrument track. Only where notes of the same instrument overlap (found by a sweep over the note start and end points, i.e., a difference array) are the notes summed in a Song.TrackSegment, averaged, and then mixed, so silent samples and samples covered by a single note are never buffered.
+#
+# The notes are parsed in bulk into a Song.NoteTable, a columnar table of typed arrays (instrument, note number, amplitude, first sample, and number of samples). NoteTable.read_chunks() parses a score a chunk at a time, for scores too large to hold in memory; Song.map_wave_file() renders a text score that way.
+#
+# With Song.score_cache enabled (or the score_cache argument of a render), a score is compiled on first use into a Song.CompiledScore, a binary file stored next to the score (the score filename followed by .bin) that holds the number of samples, the instruments, and the note columns. It is keyed by the size, modification time, and hash of the score, and later renders memory-map it instead of parsing the text.
+#
+# Identical notes (same instrument wave type and envelope, note number, amplitude, and length) are rendered once and reused through Song.NoteCache, an LRU cache of rendered notes with a memory budget.
+#
+# Long songs can be rendered in time shards: the song samples are split into contiguous ranges, each range is rendered by its own process (which renders the part of every note that falls in its range, at the correct phase), and each process writes its stereo samples directly into shared memory.
+#
+# Song.stream_wave_file() renders a song straight to a wave file without holding the whole song: the notes are sorted by their first sample, a sweep line keeps only the active notes, and the stereo samples are rendered and written one fixed-size block at a time, so the memory is bounded by the block size and the sounding notes instead of the song length (a sounding complex or string note, whose samples depend on the whole note, is held in full from its first block to its last so that it is synthesized once). Song.stream_blocks() yields the same blocks to the caller instead (e.g., AsyncRender renders them on a thread and writes them asynchronously).
+#
+# Song.map_wave_file() renders a song out of core: it preallocates the wave file, memory-maps its data chunk, accumulates the notes directly into the mapping as floating-point samples, and converts them in place to 16 bits samples at the end.
 #
 # @section notes_song Notes
 # - Comments should be Doxygen compatible.
@@ -103,11 +129,458 @@
 #
 # Copyright (c) 2023 Bucknell University. All rights reserved.
 
-from msilib.schema import IniFile
-from typing import TextIO, List, Dict
+from typing import TextIO, BinaryIO, Union, List, Dict, Tuple, Iterator
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from threading import Lock
+from operator import mul, truediv, sub, add
+from itertools import repeat, islice, chain
+from bisect import insort, bisect_right
+from array import array
+from mmap import mmap, ACCESS_READ
+from sys import byteorder
+from struct import Struct, error as struct_error
+from hashlib import blake2b
+from os import stat, fdopen, remove, replace
+from os.path import dirname
+from tempfile import mkstemp
+from io import StringIO
 from Wave import *
 from AudioProcessor import *
-from DataStructure import Array
+from DataStructure import Array, TypedArray
+
+class NoteCache:
+    """! The Song.NoteCache class.
+    
+    It stores rendered (generated and enveloped) note audio data under a memory budget, so that a note repeated with the same instrument settings, note number, amplitude, and length is only synthesized once. When storing a note would exceed the budget, the least recently used notes are evicted. It counts cache hits and misses. It can be used by several threads at once.
+    """
+    
+    ## The default memory budget in bytes
+    default_budget = 64 * 1024 * 1024
+    
+    def __init__(self, budget: int = None) -> None:
+        """! The NoteCache class initializer.
+        
+        @param budget The memory budget in bytes of the stored note audio data. Default is None, i.e., NoteCache.default_budget. A budget of 0 disables the cache.
+        """
+        
+        ## The memory budget in bytes
+        self._budget = NoteCache.default_budget if budget is None else budget
+        ## The number of bytes used by the stored notes
+        self._nbytes = 0
+        ## The stored notes, from the least to the most recently used
+        self._notes = OrderedDict()
+        ## The number of lookups that found a stored note
+        self.hits = 0
+        ## The number of lookups that did not find a stored note
+        self.misses = 0
+        ## The lock that serializes the cache operations
+        self._lock = Lock()
+        
+    def __len__(self) -> int:
+        """! The number of stored notes.
+        
+        @return The number of stored notes.
+        """
+        
+        return len(self._notes)
+        
+    def nbytes(self) -> int:
+        """! The memory used by the stored notes.
+        
+        @return The number of bytes used by the stored note audio data.
+        """
+        
+        return self._nbytes
+        
+    def get(self, key: Tuple) -> Array:
+        """! Look up a rendered note.
+        
+        @param key The note key, see Song._render_instrument_note().
+        
+        @return The audio data of the note, which must not be modified, or None if it is not stored.
+        """
+        
+        with self._lock:
+            audio_data = self._notes.get(key)
+            if audio_data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._notes.move_to_end(key)
+            return audio_data
+        
+    def put(self, key: Tuple, audio_data: Array) -> None:
+        """! Store a rendered note, evicting the least recently used notes if the memory budget is exceeded.
+        
+        Notes larger than the whole budget are not stored.
+        
+        @param key The note key.
+        
+        @param audio_data The audio data of the note. It must not be modified afterward.
+        """
+        
+        nbytes = len(audio_data) * audio_data.buffer().itemsize
+        with self._lock:
+            if nbytes > self._budget or key in self._notes:
+                return
+            while self._nbytes + nbytes > self._budget:
+                _, evicted = self._notes.popitem(last=False)
+                self._nbytes -= len(evicted) * evicted.buffer().itemsize
+            self._notes[key] = audio_data
+            self._nbytes += nbytes
+
+class NoteTable:
+    """! The Song.NoteTable class.
+    
+    It stores the notes of a score in columns of typed arrays: the instrument index, the note number, the note amplitude, the first sample, and the number of samples of each note. It is parsed in bulk: the note lines are split into tokens at once, and each column is converted with a single C-level pass.
+    """
+    
+    ## The number of values of a note line
+    num_fields = 5
+    ## The default number of characters parsed per chunk by read_chunks()
+    chunk_size = 1 << 20
+    
+    def __init__(self) -> None:
+        """! The NoteTable class initializer. It creates an empty table.
+        """
+        
+        ## The instrument index of each note
+        self.instruments = array('i')
+        ## The note number of each note
+        self.note_numbers = array('i')
+        ## The amplitude of each note
+        self.amplitudes = array('d')
+        ## The first sample of each note
+        self.starts = array('q')
+        ## The number of samples of each note
+        self.lengths = array('q')
+        
+    def __len__(self) -> int:
+        """! The number of notes.
+        
+        @return The number of notes.
+        """
+        
+        return len(self.starts)
+        
+    def __iter__(self) -> Iterator[Tuple]:
+        """! Iterate over the notes as (instrument index, note number, note amplitude, first sample, number of samples) tuples.
+        
+        @return An iterator over the notes.
+        """
+        
+        return zip(self.instruments, self.note_numbers, self.amplitudes, self.starts, self.lengths)
+        
+    def __getitem__(self, index: int) -> Tuple:
+        """! Get a note as an (instrument index, note number, note amplitude, first sample, number of samples) tuple.
+        
+        @param index The index of the note.
+        
+        @return The note.
+        """
+        
+        return self.instruments[index], self.note_numbers[index], self.amplitudes[index], self.starts[index], self.lengths[index]
+        
+    @classmethod
+    def from_text(cls, text: str) -> 'NoteTable':
+        """! Parse note lines.
+        
+        Each note line has five values: the instrument index, the note number, the note amplitude, and the first and last sample index of the note in the song. Blank lines are ignored.
+        
+        @param text The note lines.
+        
+        @return The table of the notes.
+        
+        @exception ValueError A line does not have five values, or a value is not a number.
+        """
+        
+        lines = list(map(str.split, text.splitlines()))
+        for values in lines:
+            if len(values) not in (0, cls.num_fields):
+                raise ValueError("A note line must have " + str(cls.num_fields) + " values, not " + str(len(values)) + ": " + " ".join(values))
+        tokens = list(chain.from_iterable(lines))
+        del lines
+        table = cls()
+        table.instruments = array('i', map(int, tokens[0::5]))
+        table.note_numbers = array('i', map(int, tokens[1::5]))
+        table.amplitudes = array('d', map(float, tokens[2::5]))
+        table.starts = array('q', map(int, tokens[3::5]))
+        # number of samples = last sample - first sample + 1
+        table.lengths = array('q', map(add, map(sub, map(int, tokens[4::5]), table.starts), repeat(1)))
+        return table
+        
+    @classmethod
+    def read(cls, in_file: TextIO) -> 'NoteTable':
+        """! Read all the remaining note lines of a file at once.
+        
+        @param in_file The input file stream, positioned at the first note line.
+        
+        @return The table of the notes.
+        """
+        
+        return cls.from_text(in_file.read())
+        
+    @classmethod
+    def read_chunks(cls, in_file: TextIO, chunk_size: int = None) -> Iterator['NoteTable']:
+        """! Read the remaining note lines of a file a chunk at a time, for scores too large to hold in memory.
+        
+        Each chunk ends at a line boundary, so no note is split between two tables.
+        
+        @param in_file The input file stream, positioned at the first note line.
+        
+        @param chunk_size The number of characters read per chunk. Default is None, i.e., NoteTable.chunk_size.
+        
+        @return An iterator over the tables of the chunks of notes, in score order.
+        """
+        
+        chunk_size = cls.chunk_size if chunk_size is None else chunk_size
+        rest = ''
+        while True:
+            text = in_file.read(chunk_size)
+            if not text:
+                break
+            text = rest + text
+            end = text.rfind('\n') + 1
+            rest = text[end:]
+            if end > 0:
+                yield cls.from_text(text[:end])
+        if rest.strip():
+            yield cls.from_text(rest)
+
+class CompiledScore:
+    """! The Song.CompiledScore class.
+    
+    It stores a parsed score in a compact binary file: a header (with the number of samples, instruments, and notes, and the size, modification time, and hash of the text score), a fixed-width record per instrument, and the note columns of a NoteTable in score order, each padded to 8 bytes. Loading it memory-maps the file and views the note columns in place, so no line is parsed and no note is copied; the notes are read from the mapping as they are rendered.
+    """
+    
+    ## The magic number of a compiled score file
+    magic = b'SCBN'
+    ## The version of the compiled score file format
+    version = 1
+    ## The file name suffix of a compiled score
+    suffix = '.bin'
+    ## The header: magic, version, number of samples, number of instruments, number of notes, score size, score modification time (ns), and score hash
+    _header = Struct('<4sIQIQQQ16s')
+    ## An instrument record: wave type, envelope type, amplitude, pan angle, and ADSR attack, decay, and release samples (-1: AudioProcessor default)
+    _instrument = Struct('<iiddqqq')
+    ## The typecode of each note column, in file order
+    _columns = (('instruments', 'i'), ('note_numbers', 'i'), ('amplitudes', 'd'), ('starts', 'q'), ('lengths', 'q'))
+    
+    def __init__(self, num_samples: int, instrument_info: List[Dict], notes: NoteTable) -> None:
+        """! The CompiledScore class initializer.
+        
+        @param num_samples The number of samples of the song.
+        
+        @param instrument_info The instrument information.
+        
+        @param notes The notes of the score.
+        """
+        
+        ## The number of samples of the song
+        self.num_samples = num_samples
+        ## The instrument information
+        self.instrument_info = instrument_info
+        ## The notes of the score
+        self.notes = notes
+        
+    @staticmethod
+    def cache_path(song_file: str) -> str:
+        """! The path of the compiled score of a text score.
+        
+        @param song_file The text score filename.
+        
+        @return The compiled score filename.
+        """
+        
+        return song_file + CompiledScore.suffix
+        
+    @staticmethod
+    def _read_source(song_file: str) -> bytes:
+        """! Read the content of a text score.
+        
+        @param song_file The text score filename.
+        
+        @return The content of the score.
+        """
+        
+        with open(song_file, 'rb') as in_file:
+            return in_file.read()
+        
+    @staticmethod
+    def _source_hash(source: bytes) -> bytes:
+        """! Hash a text score.
+        
+        @param source The content of the score.
+        
+        @return The 16 bytes hash of the score.
+        """
+        
+        return blake2b(source, digest_size=16).digest()
+        
+    @classmethod
+    def compile(cls, song_file: str) -> 'CompiledScore':
+        """! Parse a text score and save its compiled form next to it.
+        
+        If the compiled score cannot be written (e.g., a read-only directory), the parsed score is still returned.
+        
+        The score is read once, and the same content is parsed and hashed, so a score edited during the compilation cannot store one version under the hash of another. Its size and modification time are taken before it is read: if it changes afterwards, the stamp no longer matches and the next load falls back to the hash.
+        
+        @param song_file The text score filename.
+        
+        @return The parsed score.
+        """
+        
+        file_stat = stat(song_file)
+        source = cls._read_source(song_file)
+        in_file = StringIO(source.decode())
+        num_samples, instrument_info = Song._read_score_header(in_file)
+        notes = NoteTable.read(in_file)
+        score = cls(num_samples, instrument_info, notes)
+        try:
+            score.save(cls.cache_path(song_file), file_stat.st_size, file_stat.st_mtime_ns, cls._source_hash(source))
+        except OSError:
+            pass
+        return score
+        
+    def save(self, path: str, source_size: int, source_mtime: int, source_hash: bytes) -> None:
+        """! Save the compiled score.
+        
+        @param path The compiled score filename.
+        
+        @param source_size The size of the text score.
+        
+        @param source_mtime The modification time (ns) of the text score.
+        
+        @param source_hash The hash of the text score.
+        
+        The file is written to a temporary file in the same directory, which then replaces the compiled score, so a render never maps a partial file.
+        """
+        
+        handle, temp_path = mkstemp(suffix='.tmp', dir=dirname(path) or '.')
+        try:
+            with fdopen(handle, 'wb') as out_file:
+                out_file.write(self._header.pack(self.magic, self.version, self.num_samples, len(self.instrument_info), len(self.notes), source_size, source_mtime, source_hash))
+                for info in self.instrument_info:
+                    adsr = tuple(-1 if value is None else value for value in info['adsr'])
+                    out_file.write(self._instrument.pack(info['wave_type'], info['envelope_type'], info['amplitude'], info['pan_angle'], *adsr))
+                for name, typecode in self._columns:
+                    column = array(typecode, getattr(self.notes, name))
+                    if byteorder == 'big':
+                        column.byteswap()
+                    out_file.write(column)
+                    out_file.write(bytes(-len(column) * column.itemsize % 8))
+            replace(temp_path, path)
+        except BaseException:
+            remove(temp_path)
+            raise
+                
+    @classmethod
+    def open(cls, path: str) -> Tuple['CompiledScore', Tuple]:
+        """! Memory-map a compiled score.
+        
+        The note columns of the returned score are memoryviews of the file mapping.
+        
+        @param path The compiled score filename.
+        
+        @return The score and the (size, modification time, hash) of the text score it was compiled from.
+        
+        @exception ValueError The file is not a compiled score, or it is truncated.
+        
+        @exception struct.error An instrument record is truncated.
+        """
+        
+        with open(path, 'rb') as in_file:
+            mapping = mmap(in_file.fileno(), 0, access=ACCESS_READ)
+        try:
+            if len(mapping) < cls._header.size:
+                raise ValueError("Bad compiled score header!")
+            magic, version, num_samples, num_instruments, num_notes, source_size, source_mtime, source_hash = cls._header.unpack_from(mapping)
+            if magic != cls.magic or version != cls.version or byteorder == 'big':
+                raise ValueError("Bad compiled score header!")
+            offset = cls._header.size
+            instrument_info = []
+            for _ in range(num_instruments):
+                wave_type, envelope_type, amplitude, pan_angle, *adsr = cls._instrument.unpack_from(mapping, offset)
+                instrument_info.append({'wave_type': wave_type, 'envelope_type': envelope_type, 'amplitude': amplitude, 'pan_angle': pan_angle, 'adsr': tuple(None if value < 0 else value for value in adsr)})
+                offset += cls._instrument.size
+            # check the size before any column views the mapping, so that a bad file can still be closed
+            columns = []
+            for name, typecode in cls._columns:
+                size = num_notes * array(typecode).itemsize
+                columns.append((name, typecode, offset, size))
+                offset += size + (-size % 8)
+            if columns[-1][2] + columns[-1][3] > len(mapping):
+                raise ValueError("Bad compiled score size!")
+        except BaseException:
+            mapping.close()
+            raise
+        notes = NoteTable()
+        buffer = memoryview(mapping)
+        for name, typecode, offset, size in columns:
+            setattr(notes, name, buffer[offset:offset + size].cast(typecode))
+        return cls(num_samples, instrument_info, notes), (source_size, source_mtime, source_hash)
+        
+    @classmethod
+    def load(cls, song_file: str) -> 'CompiledScore':
+        """! Load a score from its compiled form, compiling it first if the compiled form is missing or stale.
+        
+        The compiled form is current if the size and modification time of the text score match, or otherwise if its hash matches (e.g., the score was touched or copied), in which case the compiled form is saved again with the new size and modification time, so the next loads do not hash the score.
+        
+        @param song_file The text score filename.
+        
+        @return The score.
+        """
+        
+        file_stat = stat(song_file)
+        try:
+            score, (source_size, source_mtime, source_hash) = cls.open(cls.cache_path(song_file))
+        except (FileNotFoundError, ValueError, struct_error):
+            # the compiled form is missing or corrupt
+            return cls.compile(song_file)
+        if (source_size, source_mtime) == (file_stat.st_size, file_stat.st_mtime_ns):
+            return score
+        if source_hash == cls._source_hash(cls._read_source(song_file)):
+            try:
+                score.save(cls.cache_path(song_file), file_stat.st_size, file_stat.st_mtime_ns, source_hash)
+            except OSError:
+                pass
+            return score
+        return cls.compile(song_file)
+
+class TrackSegment:
+    """! The Song.TrackSegment class.
+    
+    It stores the accumulated note samples of a stretch of an instrument track where two or more notes overlap, and the number of notes overlapping its samples as runs of samples with the same count.
+    """
+    
+    def __init__(self, start: int, stop: int, counts: List[Tuple]) -> None:
+        """! The TrackSegment class initializer.
+        
+        @param start The first song sample of the segment.
+        
+        @param stop The song sample one past the last sample of the segment.
+        
+        @param counts The runs of samples overlapped by the same number of notes, as (first song sample, song sample one past the last, number of notes) tuples.
+        """
+        
+        ## The first song sample of the segment
+        self.start = start
+        ## The song sample one past the last sample of the segment
+        self.stop = stop
+        ## The runs of samples overlapped by the same number of notes
+        self.counts = counts
+        ## The accumulated note samples
+        self.data = TypedArray(stop - start, 0)
+        
+    def average(self) -> None:
+        """! Averages the accumulated note samples by the number of notes overlapping each sample.
+        """
+        
+        for run_start, run_stop, count in self.counts:
+            first, last = run_start - self.start, run_stop - self.start
+            self.data.copy_from(list(map(truediv, self.data.get_block(first, last), repeat(count))), first)
 
 class Song(BaseWave):
     """! The Song.Song class.
@@ -115,141 +588,815 @@ class Song(BaseWave):
     It extends the Wave.BaseWave class and initializes the wave samples by reading a simple formatted music score text file. It reads the music score line by line, generates wave samples notes by notes, and mixes them in stereo audio data.
     """
     
-    def __init__(self, song_file: str) -> None:
+    ## Whether scores are loaded through their compiled form (see CompiledScore), compiling them on first use, when a render does not set its score_cache argument
+    score_cache = False
+    
+    def __init__(self, song_file: str, wavetable_size: int = None, note_cache: NoteCache = None, workers: int = 1, shards: int = 1, score_cache: bool = None) -> None:
         """! The Song.Song class initializer.
         
-        It opens the input **song_file** as an input stream and parses the music score text file accordingly. It first reads the total number of samples and the number of instruments. Then, it reads the instrument information, including the wave type (1: sine, 2: square, 3: sawtooth, 4: complex, 5: string), which envelope to apply (0: no envelope, 1: rise/fall envelope, 2: ADSR envelope), the wave amplitude, and the pan angle. It is recommended to store in a list of dict. This method then initializes the instrument audio data using Arrays. Since it has multiple instruments, it is suggested to use a list of Arrays. This will store the accumulated sound value of each instrument at each time position. 
-        
-        Furthermore, in order to compute the average value, it may be a good idea to initialize another list of Arrays to store the total number of samples generated for each instrument at each time position. These two variables are filled by reading notes specified in the music score. For each note read, it generates the corresponding sound wave and accumulates the sound sample in the list of Arrays variables. After reading all notes, it computes the average note value for each instrument at each time position. In the end, it mixes the instrument audio sample data into stereo song data.
+        It opens the input **song_file** as an input stream and parses the music score text file accordingly. It first reads the total number of samples and the number of instruments. Then, it reads the instrument information, including the wave type (1: sine, 2: square, 3: sawtooth, 4: complex, 5: string), which envelope to apply (0: no envelope, 1: rise/fall envelope, 2: ADSR envelope), the wave amplitude, and the pan angle. It is stored in a list of dict. It then reads the notes and renders the song with _render_song_range(), instrument by instrument: for each note, it generates the corresponding enveloped sound wave and mixes it into the stereo song data with the instrument's amplitude and pan gains. Where notes of the same instrument overlap (counted by a sweep over the note start and end points), the notes are first accumulated in a TrackSegment, which is averaged and mixed after the last note of the instrument.
         
         @param song_file The input musicscore text file
+        
+        @param wavetable_size The table size of the wavetable oscillators used to generate the notes (see Wave.WavetableWave). Default is None, i.e., the notes are generated by evaluating the wave formulas.
+        
+        @param note_cache The cache of rendered notes, which can be shared between songs. Default is None, i.e., a new NoteCache with the default memory budget.
+        
+        @param workers The number of threads that synthesize notes. Default is 1, i.e., notes are synthesized one after another. With more workers, notes are synthesized on a thread pool but still accumulated in score order, so the song is identical. The synthesis kernels are pure Python and hold the global interpreter lock, so the threads mostly overlap the mixing with the synthesis and give little speedup on CPython; use **shards** to render on several processors.
+        
+        @param shards The number of time shards, each rendered by its own process. Default is 1, i.e., the song is rendered in this process.
+        
+        @param score_cache Whether to load the score through its compiled form (see CompiledScore). Default is None, i.e., Song.score_cache.
         """
         
-        with open(song_file, 'r') as in_file:
-            # read the number of samples
-            num_samples = self._read_int(in_file)
-            # read the number of instruments
-            num_instruments = self._read_int(in_file)
-            # initialize instrument info
-            instrument_info = [{'wavetype': 1, 'envelope': 0, 'amplitude': 1, 'pan': 0} for _ in range(num_instruments)]
-            # read the instrument info
-            self._read_instrument_info(in_file, instrument_info)
-            # initialize instrument audio data to store the sum of all samples and the number of samples
-            audio_data = [Array(num_samples, 0) for _ in range(num_instruments)]
-            audio_num_samples = [Array(num_samples, 0) for _ in range(num_instruments)]
-            # read the instrument audio data
-            self._read_instrument_audio_data(in_file, instrument_info, audio_data, audio_num_samples)
-            # compute the average of the samples
-            self._average_audio_data_samples(audio_data, audio_num_samples)            
-            # initialize the song audio data, which has two channels for stereo sound
-            super().__init__(num_samples, 2)
-            # mix in instrument audio data into song stereo data
-            self._mix_instrument_audio_in_song(instrument_info, audio_data)
+        self._init_render_options(wavetable_size, note_cache, workers)
+        # read the number of samples, the instrument info, and the notes
+        num_samples, instrument_info, notes = self._read_score(song_file, score_cache)
+        # initialize the song audio data, which has two channels for stereo sound
+        super().__init__(num_samples, 2)
+        if shards > 1:
+            # render the time shards in separate processes, straight into the song stereo data
+            self._render_song_shards(instrument_info, notes, shards)
+        else:
+            self._render_song_range(instrument_info, notes, 0, num_samples, self._data)
+                
+    def _init_render_options(self, wavetable_size: int, note_cache: NoteCache, workers: int) -> None:
+        """! Initializes the options used to render notes.
+        
+        @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas.
+        
+        @param note_cache The cache of rendered notes, or None for a new NoteCache.
+        
+        @param workers The number of threads that synthesize notes.
+        """
+        
+        ## The table size of the wavetable oscillators, or None to evaluate the wave formulas
+        self._wavetable_size = wavetable_size
+        ## The cache of rendered notes
+        self.note_cache = NoteCache() if note_cache is None else note_cache
+        ## The number of threads that synthesize notes
+        self._workers = workers
+        ## The notes rendered in full that are pinned outside the note cache while they sound (see stream_blocks()), by note key: [audio data or None if not rendered yet, number of sounding notes]
+        self._pinned_notes = {}
+        
+    @classmethod
+    def _renderer(cls, wavetable_size: int = None, note_cache: NoteCache = None, workers: int = 1) -> 'Song':
+        """! Creates a song without samples, used to render the notes of a score part (e.g., a time shard).
+        
+        @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas. Default is None.
+        
+        @param note_cache The cache of rendered notes, or None for a new NoteCache. Default is None.
+        
+        @param workers The number of threads that synthesize notes. Default is 1.
+        
+        @return A song object that only has its render options initialized.
+        """
+        
+        song = cls.__new__(cls)
+        song._init_render_options(wavetable_size, note_cache, workers)
+        return song
+                
+    @classmethod
+    def stream_wave_file(cls, song_file: str, filename: Union[str, BinaryIO], block_frames: int = block_size, wavetable_size: int = None, note_cache: NoteCache = None, overview: 'WaveIndex.WaveMipmap' = None, score_cache: bool = None) -> None:
+        """! Renders a song straight to a wave file, one block of stereo samples at a time.
+        
+        The notes are sorted by their first sample and swept block by block: a note becomes active in the first block it overlaps and is dropped after its last one. Each block is rendered from the active notes only (in score order, as _render_song_range() does for the whole song) and written with a Wave.WaveWriter as soon as it is finished, so the song can be piped to an encoder or a player while it is rendered. The score is read before the wave header is written, so an invalid score fails before any output. The wave file is identical to Song(song_file).write_wave_file(filename), but the memory is bounded by **block_frames** and the sounding notes instead of the song length: the sine, square, sawtooth, and wavetable notes are rendered block by block, while a sounding complex or string note is held in full (pinned outside the note cache, see _pin_note()) until its last block, so it is synthesized once. If the render fails, the partial wave file is discarded (see Wave.WaveWriter.discard()).
+        
+        @param song_file The input musicscore text file.
+        
+        @param filename The output wave filename, or a binary output stream (e.g., sys.stdout.buffer).
+        
+        @param block_frames The number of stereo samples rendered per block. Default is AudioProcessor.block_size.
+        
+        @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas. Default is None.
+        
+        @param note_cache The cache of rendered notes (only complex and string notes are rendered in full), or None for a new NoteCache. Default is None.
+        
+        @param overview An empty WaveIndex.WaveMipmap to build from the blocks while they are written, see Wave.WaveWriter. Default is None, i.e., no overview.
+        
+        @param score_cache Whether to load the score through its compiled form (see CompiledScore). Default is None, i.e., Song.score_cache.
+        """
+        blocks = cls.stream_blocks(song_file, block_frames, wavetable_size, note_cache, score_cache)
+        # read the score (and render the first block) before the header is written, so an invalid score fails before any output
+        first_block = next(blocks, None)
+        with WaveWriter(filename, 2, overview) as writer:
+            if first_block is not None:
+                writer.write_frames(first_block)
+            for stereo_data in blocks:
+                writer.write_frames(stereo_data)
+                
+    @classmethod
+    def stream_blocks(cls, song_file: str, block_frames: int = block_size, wavetable_size: int = None, note_cache: NoteCache = None, score_cache: bool = None) -> Iterator[TypedArray]:
+        """! Renders a song one block of stereo samples at a time, as stream_wave_file() does.
+        
+        The score is read when the first block is requested, and each block is rendered only when it is requested, so the caller can stop the render between two blocks.
+        
+        @param song_file The input musicscore text file.
+        
+        @param block_frames The number of stereo samples rendered per block. Default is AudioProcessor.block_size.
+        
+        @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas. Default is None.
+        
+        @param note_cache The cache of rendered notes (only complex and string notes are rendered in full), or None for a new NoteCache. Default is None.
+        
+        @param score_cache Whether to load the score through its compiled form (see CompiledScore). Default is None, i.e., Song.score_cache.
+        
+        @return An iterator of the blocks, each a new TypedArray of interleaved (left, right) samples.
+        """
+        song = cls._renderer(wavetable_size, note_cache)
+        num_samples, instrument_info, notes = song._read_score(song_file, score_cache)
+        # sort the notes by their first sample, keeping their score index to accumulate them in score order
+        events = sorted(range(len(notes)), key=notes.starts.__getitem__)
+        next_event = 0
+        active = []
+        for start in range(0, num_samples, block_frames):
+            stop = min(num_samples, start + block_frames)
+            # activate the notes that start before the end of the block
+            while next_event < len(events) and notes[events[next_event]][3] < stop:
+                index = events[next_event]
+                insort(active, index)
+                song._pin_note(instrument_info, notes[index], 1)
+                next_event += 1
+            # drop the notes that ended before the block
+            for index in active:
+                if notes[index][3] + notes[index][4] <= start:
+                    song._pin_note(instrument_info, notes[index], -1)
+            active = [index for index in active if notes[index][3] + notes[index][4] > start]
+            yield song._render_song_range(instrument_info, [notes[index] for index in active], start, stop)
+            
+    def _pin_note(self, instrument_info: List[Dict], note: Tuple, count: int) -> None:
+        """! Pins (or unpins) a sounding note that is rendered in full, so that it is rendered once for all the blocks it overlaps, whatever the note cache budget.
+        
+        Notes of other wave types are rendered block by block and are not pinned.
+        
+        @param instrument_info The instrument information.
+        
+        @param note The note, as an (instrument index, note number, note amplitude, first sample, number of samples) tuple.
+        
+        @param count 1 when the note starts sounding, and -1 when it stops.
+        """
+        info = instrument_info[note[0]]
+        if not self._renders_in_full(info['wave_type']):
+            return
+        key = self._note_key(info, note[1], note[2], note[4])
+        pinned = self._pinned_notes.setdefault(key, [None, 0])
+        pinned[1] += count
+        if pinned[1] == 0:
+            del self._pinned_notes[key]
                 
-    def _read_int(self, in_file: TextIO) -> None:
+    @classmethod
+    def map_wave_file(cls, song_file: str, filename: str, wavetable_size: int = None, note_cache: NoteCache = None, workers: int = 1, overview: 'WaveIndex.WaveMipmap' = None, score_cache: bool = None) -> None:
+        """! Renders a song into a memory-mapped wave file, without holding the song audio data in memory.
+        
+        The wave file is preallocated with its header and a zeroed data chunk large enough for floating-point samples (using BaseWave.sample_typecode), and the data chunk is memory-mapped as the song stereo audio data. The notes are accumulated directly into the mapping; the operating system pages the samples in and out as needed. At the end, the samples are clipped and converted to 16 bits in place, one block at a time from the beginning (a 16 bits sample never overwrites a floating-point sample that has not been converted yet), and the file is truncated to the wave data size. The wave file is identical to Song(song_file).write_wave_file(filename).
+        
+        A text score is not held in memory either: its notes are read a chunk at a time while they are rendered (see _render_song_chunks()), so a note line that cannot be parsed only fails the render once it is reached. If the render fails, the partial wave file is removed. A compiled score (see **score_cache**) is memory-mapped instead.
+        
+        The samples are accumulated with the precision of BaseWave.sample_typecode (float64 by default), the precision of the in-memory render, which is what keeps the file identical; accumulating in float32 would round the mix differently. The file therefore peaks at 4 times (8 bytes per sample instead of 2) the size of the final wave file until it is truncated, so the disk must have room for it.
+        
+        @param song_file The input musicscore text file.
+        
+        @param filename The output wave filename.
+        
+        @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas. Default is None.
+        
+        @param note_cache The cache of rendered notes, or None for a new NoteCache. Default is None.
+        
+        @param workers The number of threads that synthesize notes. Default is 1.
+        
+        @param overview An empty WaveIndex.WaveMipmap to build from the 16 bits samples while they are converted, and to save as the sidecar of the wave file. Default is None, i.e., no overview.
+        
+        @param score_cache Whether to load the score through its compiled form (see CompiledScore). Default is None, i.e., Song.score_cache.
+        """
+        song = cls._renderer(wavetable_size, note_cache, workers)
+        if Song.score_cache if score_cache is None else score_cache:
+            num_samples, instrument_info, notes = song._read_score(song_file, True)
+        else:
+            # the notes are read a chunk at a time while they are rendered
+            with open(song_file, 'r') as in_file:
+                num_samples, instrument_info = song._read_score_header(in_file)
+            notes = None
+        song._init_header(num_samples, 2)
+        song._data = TypedArray(0)
+        song._write_mapped_wave_file(filename, song_file, num_samples, instrument_info, notes, overview)
+        if overview is not None:
+            overview.finish().save_sidecar(filename)
+            
+    def _write_mapped_wave_file(self, filename: str, song_file: str, num_samples: int, instrument_info: List[Dict], notes: NoteTable, overview: 'WaveIndex.WaveMipmap') -> None:
+        """! Renders a song into a memory-mapped wave file, see map_wave_file().
+        
+        If the render fails after the wave file is opened, the partial wave file is removed; a wave file that cannot be opened is left alone.
+        
+        @param filename The output wave filename.
+        
+        @param song_file The input musicscore text file.
+        
+        @param num_samples The number of song samples.
+        
+        @param instrument_info The instrument information.
+        
+        @param notes The notes of the compiled score, or None to read the notes of the text score a chunk at a time.
+        
+        @param overview An empty WaveIndex.WaveMipmap to build from the 16 bits samples while they are converted, or None.
+        """
+        with open(filename, 'w+b') as out_file:
+            try:
+                self._write_wave_header(out_file)
+                header_size = out_file.tell()
+                itemsize = array(BaseWave.sample_typecode).itemsize
+                out_file.truncate(header_size + itemsize * 2 * num_samples)
+                if num_samples > 0:
+                    with mmap(out_file.fileno(), 0) as mapping:
+                        buffer = memoryview(mapping)
+                        stereo_data = None
+                        try:
+                            stereo_data = TypedArray.from_buffer(buffer[header_size:], BaseWave.sample_typecode)
+                            if notes is None:
+                                self._render_song_chunks(song_file, instrument_info, num_samples, stereo_data)
+                            else:
+                                self._render_song_range(instrument_info, notes, 0, num_samples, stereo_data)
+                            # convert the samples to 16 bits in place
+                            for start in range(0, 2 * num_samples, 2 * block_size):
+                                stop = min(2 * num_samples, start + 2 * block_size)
+                                pcm_samples = self._pcm16_samples(stereo_data.get_block(start, stop))
+                                buffer[header_size + 2 * start:header_size + 2 * stop] = pcm_samples.tobytes()
+                                if overview is not None:
+                                    overview.add_pcm(pcm_samples)
+                        finally:
+                            if stereo_data is not None:
+                                stereo_data.release()
+                            buffer.release()
+                out_file.truncate(header_size + self._sub_chucksize2)
+            except BaseException:
+                # remove the partial wave file, which this render created
+                out_file.close()
+                remove(filename)
+                raise
+        
+    def _read_score(self, song_file: str, score_cache: bool = None) -> Tuple[int, List[Dict], NoteTable]:
+        """! Reads a score, from its compiled form if the score cache is enabled.
+        
+        The notes of a compiled score are not copied: the NoteTable views the note columns of the file mapping.
+        
+        @param song_file The input musicscore text file.
+        
+        @param score_cache Whether to load the score through its compiled form (see CompiledScore). Default is None, i.e., Song.score_cache.
+        
+        @return A tuple of the number of samples, the instrument information, and the notes (see _read_notes()).
+        """
+        if Song.score_cache if score_cache is None else score_cache:
+            score = CompiledScore.load(song_file)
+            return score.num_samples, score.instrument_info, score.notes
+        with open(song_file, 'r') as in_file:
+            num_samples, instrument_info = self._read_score_header(in_file)
+            return num_samples, instrument_info, self._read_notes(in_file)
+        
+    @staticmethod
+    def _read_score_header(in_file: TextIO) -> Tuple[int, List[Dict]]:
+        """! Reads the number of samples, the number of instruments, and the instrument information from the given file.
+        
+        @param in_file The input file stream, at the beginning of the music score.
+        
+        @return A tuple of the number of samples and the instrument information.
+        """
+        # read the number of samples
+        num_samples = Song._read_int(in_file)
+        # read the number of instruments
+        num_instruments = Song._read_int(in_file)
+        # initialize instrument info
+        instrument_info = [{'wave_type': 1, 'envelope_type': 0, 'amplitude': 1, 'pan_angle': 0, 'adsr': (None, None, None)} for _ in range(num_instruments)]
+        # read the instrument info
+        Song._read_instrument_info(in_file, instrument_info)
+        return num_samples, instrument_info
+        
+    @staticmethod
+    def _read_int(in_file: TextIO) -> int:
         """! A helper method to read a line from in_file and return it as an integer.
         
         This method reads a line from **in_file**, recasts it as an integer, and returns the recast result.
         
         @param in_file The input file stream.
+        
+        @return The integer read from the line.
         """
         line = in_file.readline()  # Read a line from the file
         return int(line.strip())  # Convert the line to an integer and return it
                 
-    def _read_instrument_info(self, in_file: TextIO, instrument_info: List[Dict]) -> None:
+    @staticmethod
+    def _read_instrument_info(in_file: TextIO, instrument_info: List[Dict]) -> None:
         """! Reads instrument information from the given file and stores it in a list of dictionaries.
 
-         Each line in the file represents an instrument's properties, which are read and stored as a dictionary at the corresponding index in the instrument_info list.
+        Each line in the file represents an instrument's properties (wave type, envelope type, amplitude, pan angle, and optionally the ADSR attack, decay, and release samples), which are read and stored as a dictionary at the corresponding index in the instrument_info list. A line must have either four or seven values, and the ADSR samples must be positive.
 
-         @param in_file: The input file stream containing instrument data.
-         @param instrument_info: The pre-sized list to be populated with instrument information dictionaries.
-         """
+        @param in_file The input file stream containing instrument data.
+        
+        @param instrument_info The pre-sized list to be populated with instrument information dictionaries.
+        """
       
-        num_of_instruments = int(in_file.readline().strip())
-        instrument_info = Array(num_of_instruments)
-        for i in range(num_of_instruments):
-           line = in_file.readline().strip()
-           values = line.split()
-           instrument_dict = {
-            'wave_type': int(values[0]),
-            'envelope_type': int(values[1]),
-            'amplitude': float(values[2]),
-            'pan_angle': float(values[3])
-           }
-        # Directly set the instrument information in the Array
-           instrument_info[i] = instrument_dict
-
-
+        for i in range(len(instrument_info)):
+            values = in_file.readline().split()
+            if len(values) != 4 and len(values) != 7:
+                raise ValueError("An instrument line must have 4 or 7 values, not " + str(len(values)))
+            adsr = tuple(int(value) for value in values[4:7]) if len(values) == 7 else (None, None, None)
+            if len(values) == 7 and min(adsr) < 1:
+                raise ValueError("ADSR attack, decay, and release samples must be positive")
+            # Directly set the instrument information in the list
+            instrument_info[i] = {
+                'wave_type': int(values[0]),
+                'envelope_type': int(values[1]),
+                'amplitude': float(values[2]),
+                'pan_angle': float(values[3]),
+                # the optional ADSR attack, decay, and release samples (None: AudioProcessor defaults)
+                'adsr': adsr
+            }
                 
     def _generate_instrument_note_wave(self, wave_type: int, num_samples: int, freq: float, amp: float) -> BaseWave:
-           if wave_type == 1:
-             return SineWave(num_samples, freq, amp)
-           elif wave_type == 2:
-             return SquareWave(num_samples, freq, amp)
-           elif wave_type == 3:
-             return SawtoothWave(num_samples, freq, amp)
-           elif wave_type == 4:
-             return ComplexWave(num_samples, freq, amp)
-           elif wave_type == 5:
-             return StringWave(num_samples, freq, amp)
-           else:
-             raise ValueError("Unknown wave type")
+        """! Generates the sound wave of an instrument note.
+        
+        @param wave_type The wave type of the instrument (1: sine, 2: square, 3: sawtooth, 4: complex, 5: string).
+        
+        @param num_samples The number of samples of the note.
+        
+        @param freq The frequency of the note.
+        
+        @param amp The amplitude of the note.
+        
+        @return The sound wave of the note.
+        """
+        if wave_type < 1 or wave_type > 5:
+            raise ValueError("Unknown wave type")
+        if self._wavetable_size and wave_type != 5:
+            return WavetableWave(num_samples, freq, amp, wave_type, self._wavetable_size)
+        if wave_type == 1:
+            return SineWave(num_samples, freq, amp)
+        elif wave_type == 2:
+            return SquareWave(num_samples, freq, amp)
+        elif wave_type == 3:
+            return SawtoothWave(num_samples, freq, amp)
+        elif wave_type == 4:
+            return ComplexWave(num_samples, freq, amp)
+        else:
+            return StringWave(num_samples, freq, amp)
          
+    def _apply_instrument_note_envelope(self, info: Dict, audio_data: Array) -> None:
+        """! Applies the envelope of an instrument to the audio data of a note.
         
-    def _read_instrument_audio_data(self, in_file: TextIO, instrument_info: List[Dict], audio_data: List[Array], audio_num_samples: List[Array]):
-        num_notes = int(in_file.readline().strip())  # Assuming the number of notes is specified in the file
-
-        for _ in range(num_notes):
-           line = in_file.readline().strip()
-           values = line.split()
-           instrument_index = int(values[0])
-           note_number = int(values[1])
-           note_amplitude = float(values[2])
-           note_start = int(values[3])
-           note_end = int(values[4])
-
-        # Convert the note number to frequency
-           frequency = self.audio_note_number_to_freq(note_number)
-
-        # Generate the note's wave using the specified instrument's wave type and envelope
-           wave_type = instrument_info[instrument_index]['wave_type']
-           envelope_type = instrument_info[instrument_index]['envelope_type']
-           wave_amp = instrument_info[instrument_index]['amplitude']
-
-        # Create an Array for the note's audio data with the appropriate size
-           note_audio_data = Array(note_end - note_start + 1)
+        The gain curve comes from the AudioProcessor envelope cache, keyed by the envelope type (0: no envelope, 1: rise/fall envelope, 2: ADSR envelope), the note length, and the instrument's ADSR samples.
+        
+        @param info The instrument information.
+        
+        @param audio_data The audio data of the note.
+        """
+        audio_apply_envelope(audio_data, info['envelope_type'], *info['adsr'])
+        
+    def _render_instrument_note(self, info: Dict, note_number: int, amp: float, num_samples: int) -> Array:
+        """! Renders a note of an instrument, i.e., generates its sound wave and applies the instrument's envelope.
+        
+        The rendered note is looked up in the notes pinned by stream_blocks(), then in (and stored in) the note cache, keyed by the wave type, note number, amplitude, length, and envelope of the note, and the wavetable size of the song.
+        
+        @param info The instrument information.
+        
+        @param note_number The note number.
+        
+        @param amp The amplitude of the note.
+        
+        @param num_samples The number of samples of the note.
+        
+        @return The audio data of the note, which must not be modified.
+        """
+        key = self._note_key(info, note_number, amp, num_samples)
+        pinned = self._pinned_notes.get(key)
+        if pinned is not None and pinned[0] is not None:
+            return pinned[0]
+        audio_data = self.note_cache.get(key)
+        if audio_data is None:
+            note_wave = self._generate_instrument_note_wave(info['wave_type'], num_samples, audio_note_number_to_freq(note_number), amp)
+            self._apply_instrument_note_envelope(info, note_wave._data)
+            audio_data = note_wave._data
+            self.note_cache.put(key, audio_data)
+        if pinned is not None:
+            pinned[0] = audio_data
+        return audio_data
+        
+    def _note_key(self, info: Dict, note_number: int, amp: float, num_samples: int) -> Tuple:
+        """! The key of a rendered note in the note cache.
+        
+        @param info The instrument information.
+        
+        @param note_number The note number.
+        
+        @param amp The amplitude of the note.
+        
+        @param num_samples The number of samples of the note.
+        
+        @return The wave type, note number, amplitude, length, and envelope of the note, and the wavetable size of the song.
+        """
+        return (info['wave_type'], note_number, amp, num_samples, info['envelope_type'], info['adsr'], self._wavetable_size)
+        
+    def _renders_in_full(self, wave_type: int) -> bool:
+        """! Whether the notes of a wave type are rendered in full even when only a range of their samples is needed.
+        
+        @param wave_type The wave type.
+        
+        @return True for the complex wave (unless it uses a wavetable) and the string wave.
+        """
+        return wave_type > 3 and not (self._wavetable_size and wave_type == 4)
+        
+    def _render_instrument_note_range(self, info: Dict, note_number: int, amp: float, num_samples: int, first: int, count: int) -> Array:
+        """! Renders a range of samples of a note of an instrument.
+        
+        The sine, square, sawtooth, and wavetable waves are generated directly for the range, at the phase of its first sample, and multiplied by the matching part of the envelope. The complex wave (normalized by the peak of the whole note) and the string wave (a recurrence from the first sample) are rendered in full through the note cache.
+        
+        @param info The instrument information.
+        
+        @param note_number The note number.
+        
+        @param amp The amplitude of the note.
+        
+        @param num_samples The number of samples of the whole note.
+        
+        @param first The index of the first sample of the range within the note.
+        
+        @param count The number of samples of the range.
+        
+        @return The audio data of the range, which must not be modified.
+        """
+        wave_type = info['wave_type']
+        if first == 0 and count == num_samples:
+            return self._render_instrument_note(info, note_number, amp, num_samples)
+        if self._renders_in_full(wave_type):
+            return self._render_instrument_note(info, note_number, amp, num_samples).view(first, first + count)
+        freq = audio_note_number_to_freq(note_number)
+        if self._wavetable_size:
+            samples = audio_wavetable_samples(first, count, wave_type, freq, amp, BaseWave.samples_per_second, self._wavetable_size)
+        elif wave_type == 1:
+            samples = audio_sine_samples(first, count, freq, amp, BaseWave.samples_per_second)
+        elif wave_type == 2:
+            samples = audio_square_samples(first, count, freq, amp, BaseWave.samples_per_second)
+        elif wave_type == 3:
+            samples = audio_sawtooth_samples(first, count, freq, amp, BaseWave.samples_per_second)
+        else:
+            raise ValueError("Unknown wave type")
+        if info['envelope_type'] != 0:
+            gains = audio_envelope_gains(info['envelope_type'], num_samples, *info['adsr'])
+            samples = map(mul, samples, gains[first:first + count])
+        audio_data = TypedArray(count)
+        audio_data.copy_from(list(samples))
+        return audio_data
+        
+    def _read_notes(self, in_file: TextIO) -> NoteTable:
+        """! Reads the notes from the given file.
+        
+        Each remaining line of the file describes a note: the instrument index, the note number, the note amplitude, and the first and last sample index of the note in the song. The lines are parsed in bulk into a NoteTable.
+        
+        @param in_file The input file stream containing the notes.
+        
+        @return The notes, whose items are (instrument index, note number, note amplitude, first sample, number of samples) tuples.
+        """
+        return NoteTable.read(in_file)
+        
+    def _instrument_tracks(self, num_instruments: int, notes: List[Tuple], start: int, stop: int) -> List[List[TrackSegment]]:
+        """! Finds where the notes of each instrument overlap in the song samples in the range [start, stop).
+        
+        The note start and end points (clipped to the range) are gathered in a difference array per instrument, i.e., +1 where a note starts and -1 where it ends. Sweeping the sorted points gives the number of overlapping notes between consecutive points; each stretch where two or more notes overlap becomes a TrackSegment.
+        
+        @param num_instruments The number of instruments.
+        
+        @param notes The notes, as (instrument index, note number, note amplitude, first sample, number of samples) tuples.
+        
+        @param start The first song sample of the range.
+        
+        @param stop The song sample one past the last sample of the range.
+        
+        @return The overlap segments of each instrument, sorted by their first sample.
+        """
+        deltas = [{} for _ in range(num_instruments)]
+        for instrument_index, _, _, note_start, num_note_samples in notes:
+            self._add_note_points(deltas[instrument_index], note_start, num_note_samples, start, stop)
+        return [self._overlap_track(delta, start) for delta in deltas]
+        
+    def _add_note_points(self, delta: Dict, note_start: int, num_note_samples: int, start: int, stop: int) -> None:
+        """! Adds the start and end points of a note, clipped to the range [start, stop), to the difference array of its instrument.
+        
+        @param delta The difference array of the instrument, which maps a song sample to the change in the number of sounding notes.
+        
+        @param note_start The first sample of the note.
+        
+        @param num_note_samples The number of samples of the note.
+        
+        @param start The first song sample of the range.
+        
+        @param stop The song sample one past the last sample of the range.
+        """
+        first, last = max(start, note_start), min(stop, note_start + num_note_samples)
+        if first < last:
+            delta[first] = delta.get(first, 0) + 1
+            delta[last] = delta.get(last, 0) - 1
+            
+    def _overlap_track(self, delta: Dict, start: int) -> List[TrackSegment]:
+        """! Sweeps the sorted points of the difference array of an instrument into its overlap segments.
+        
+        @param delta The difference array of the instrument, see _add_note_points().
+        
+        @param start The first song sample of the range.
+        
+        @return The overlap segments of the instrument, sorted by their first sample.
+        """
+        track = []
+        runs = []
+        count = 0
+        previous = start
+        for point in sorted(delta):
+            if count > 1:
+                runs.append((previous, point, count))
+            count += delta[point]
+            if count <= 1 and runs:
+                # at most one note sounds after this point, so the segment ends here
+                track.append(TrackSegment(runs[0][0], point, runs))
+                runs = []
+            previous = point
+        return track
+        
+    def _instrument_gains(self, info: Dict) -> Tuple[float, float]:
+        """! Computes the left and right gains of an instrument from its amplitude and pan angle.
+        
+        @param info The instrument information.
+        
+        @return The left and right gains.
+        """
+        left_gain, right_gain = audio_stereo_gains(info['pan_angle'])
+        return info['amplitude'] * left_gain, info['amplitude'] * right_gain
+        
+    def _render_notes(self, instrument_info: List[Dict], notes: List[Tuple], start: int, stop: int, tracks: List[List[TrackSegment]], stereo_data: Array) -> None:
+        """! Renders the samples of the notes in the range [start, stop) and mixes them into the stereo audio data of the range, instrument by instrument.
+        
+        The overlap segments of an instrument are averaged and mixed after its last note, so every stereo sample sums the instruments in order, as if each instrument had been rendered to its own track first.
+        
+        @param instrument_info The instrument information.
+        
+        @param notes The notes that overlap the range, in score order.
+        
+        @param start The first song sample of the range.
+        
+        @param stop The song sample one past the last sample of the range.
+        
+        @param tracks The overlap segments of each instrument, see _instrument_tracks().
+        
+        @param stereo_data The interleaved stereo audio data of the range.
+        """
 
-        # Generate the wave and apply the envelope (pseudo-code, these functions need to be implemented)
-           self._generate_wave(note_audio_data, frequency, wave_amp, wave_type)
-           self._apply_envelope(note_audio_data, envelope_type)
+        def render(note: Tuple) -> Array:
+            return self._render_note_in_range(instrument_info, note, start, stop)
 
-        # Mix the note into the main audio data array
-        for i in range(note_start, note_end + 1):
-            audio_data[instrument_index][i] += note_audio_data[i - note_start]
-            audio_num_samples[instrument_index] += 1
+        channels = (stereo_data.channel(0), stereo_data.channel(1))
+        instrument_notes = [[] for _ in instrument_info]
+        for note in notes:
+            instrument_notes[note[0]].append(note)
+        # the notes in mixing order, i.e., instrument by instrument and in score order within an instrument
+        ordered_notes = (note for same_notes in instrument_notes for note in same_notes)
+        pool = ThreadPoolExecutor(self._workers) if self._workers > 1 else None
+        try:
+            rendered_notes = map(render, ordered_notes) if pool is None else self._prefetch(pool, render, ordered_notes, 2 * self._workers)
+            for instrument_index, info in enumerate(instrument_info):
+                gains = self._instrument_gains(info)
+                same_notes = instrument_notes[instrument_index]
+                self._accumulate_notes(same_notes, islice(rendered_notes, len(same_notes)), tracks[instrument_index], gains, channels, start)
+                self._mix_overlap_segments(tracks[instrument_index], gains, channels, start)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
                 
-    def _average_audio_data_samples(self, audio_data: List[Array], audio_num_samples: List[Array]):
-        for instrument_index in range(len(audio_data)):
-          for sample_index in range(len(audio_data[instrument_index])):
-            if audio_num_samples[instrument_index] > 0:
-                audio_data[instrument_index][sample_index] /= audio_num_samples[instrument_index]
+    def _render_note_in_range(self, instrument_info: List[Dict], note: Tuple, start: int, stop: int) -> Array:
+        """! Renders the part of a note in the range [start, stop) using the instrument's wave type and envelope (or reuses an identical rendered note).
         
+        @param instrument_info The instrument information.
         
-    def _mix_instrument_audio_in_song(self, instrument_info: List[Dict], audio_data: List[Array]):
-        for i in range(len(instrument_info)):
-        # Extract the instrument's information
-            info = instrument_info[i]
-            pan_angle = info['pan_angle']
-            amplitude = info['amplitude']
+        @param note The note, as an (instrument index, note number, note amplitude, first sample, number of samples) tuple.
+        
+        @param start The first song sample of the range.
+        
+        @param stop The song sample one past the last sample of the range.
+        
+        @return The audio data of the part of the note in the range.
+        """
+        first, last = max(start, note[3]), min(stop, note[3] + note[4])
+        return self._render_instrument_note_range(instrument_info[note[0]], note[1], note[2], note[4], first - note[3], last - first)
+        
+    def _render_song_chunks(self, song_file: str, instrument_info: List[Dict], num_samples: int, stereo_data: Array) -> None:
+        """! Renders the whole song into its stereo audio data, reading the notes of the text score a chunk at a time (see NoteTable.read_chunks()) instead of holding them all.
+        
+        The song is mixed in the order of _render_notes(), instrument by instrument: for each instrument, a first pass over the chunks finds the overlap segments of its notes, and a second pass renders and mixes its notes in score order. The stereo audio data is therefore identical to _render_song_range(), while only one chunk of notes and the note start and end points of one instrument are held at a time. The score is read twice per instrument.
+        
+        @param song_file The input musicscore text file.
+        
+        @param instrument_info The instrument information.
+        
+        @param num_samples The number of song samples.
+        
+        @param stereo_data The interleaved stereo audio data of the song to mix into.
+        """
 
-        #Calculate the left and right gains based on the pan angle
-            left_gain, right_gain = audio_stereo_gains(pan_angle)
+        def render(note: Tuple) -> Array:
+            return self._render_note_in_range(instrument_info, note, 0, num_samples)
 
-        # Apply the gain to the instrument's audio data
-            audio_multiply_gain(audio_data[i], amplitude * left_gain)
-            audio_multiply_gain(audio_data[i], amplitude * right_gain)
+        channels = (stereo_data.channel(0), stereo_data.channel(1))
+        pool = ThreadPoolExecutor(self._workers) if self._workers > 1 else None
+        try:
+            for instrument_index, info in enumerate(instrument_info):
+                delta = {}
+                for notes in self._read_note_chunks(song_file):
+                    for note_instrument, _, _, note_start, num_note_samples in notes:
+                        if note_instrument == instrument_index:
+                            self._add_note_points(delta, note_start, num_note_samples, 0, num_samples)
+                track = self._overlap_track(delta, 0)
+                del delta
+                gains = self._instrument_gains(info)
+                for notes in self._read_note_chunks(song_file):
+                    same_notes = [note for note in notes if note[0] == instrument_index and note[3] < num_samples and note[3] + note[4] > 0]
+                    rendered_notes = map(render, same_notes) if pool is None else self._prefetch(pool, render, same_notes, 2 * self._workers)
+                    self._accumulate_notes(same_notes, rendered_notes, track, gains, channels)
+                self._mix_overlap_segments(track, gains, channels)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+                
+    def _read_note_chunks(self, song_file: str) -> Iterator[NoteTable]:
+        """! Reads the notes of a text score a chunk at a time.
+        
+        @param song_file The input musicscore text file.
+        
+        @return An iterator over the tables of the chunks of notes, see NoteTable.read_chunks().
+        """
+        with open(song_file, 'r') as in_file:
+            self._read_score_header(in_file)
+            yield from NoteTable.read_chunks(in_file)
+            
+    @staticmethod
+    def _prefetch(pool: ThreadPoolExecutor, function, items: Iterator, depth: int) -> Iterator:
+        """! Maps a function over items on a thread pool, keeping up to **depth** calls ahead of the consumer.
+        
+        Unlike ThreadPoolExecutor.map(), which submits every item at once, at most **depth** results wait to be consumed, so the memory stays bounded; and unlike mapping fixed windows of items, a new item is submitted as soon as a result is consumed, so the threads do not idle at window boundaries.
+        
+        @param pool The thread pool.
+        
+        @param function The function to map.
+        
+        @param items The items.
+        
+        @param depth The maximum number of submitted calls whose results are not consumed yet.
+        
+        @return An iterator of the results, in the order of the items.
+        """
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(function, item))
+            if len(pending) >= depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+            
+    def _accumulate_notes(self, notes: List[Tuple], rendered_notes, track: List[TrackSegment], gains: Tuple[float, float], channels: Tuple[Array, Array], start: int = 0) -> None:
+        """! Mixes rendered notes of an instrument into the stereo audio data, in the order of the notes.
+        
+        The samples of a note that no other note of the instrument overlaps are scaled by the instrument gains and added straight into the left and right channels. The samples in an overlap segment are accumulated in the segment instead.
+        
+        @param notes The notes, as (instrument index, note number, note amplitude, first sample, number of samples) tuples.
+        
+        @param rendered_notes The audio data of the notes in the range, in the same order as the notes.
+        
+        @param track The overlap segments of the instrument.
+        
+        @param gains The left and right gains of the instrument.
+        
+        @param channels The left and right channels of the stereo audio data of the range.
+        
+        @param start The first song sample of the range. Default is 0.
+        """
+        segment_stops = [segment.stop for segment in track]
+        for (_, _, _, note_start, _), note_audio_data in zip(notes, rendered_notes):
+            first = max(start, note_start)
+            last = first + len(note_audio_data)
+            position = first
+            # Walk the overlap segments that intersect the note
+            for segment in track[bisect_right(segment_stops, first):]:
+                if segment.start >= last:
+                    break
+                overlap_start, overlap_stop = max(position, segment.start), min(last, segment.stop)
+                if position < overlap_start:
+                    self._mix_samples(note_audio_data.view(position - first, overlap_start - first), gains, channels, position - start)
+                segment.data.add_scaled(note_audio_data.view(overlap_start - first, overlap_stop - first), 1, overlap_start - segment.start)
+                position = overlap_stop
+            if position < last:
+                self._mix_samples(note_audio_data if position == first else note_audio_data.view(position - first, last - first), gains, channels, position - start)
+                
+    def _mix_samples(self, samples: Array, gains: Tuple[float, float], channels: Tuple[Array, Array], start: int) -> None:
+        """! Adds samples scaled by the left and right gains into the left and right channels.
+        
+        @param samples The samples to mix.
+        
+        @param gains The left and right gains.
+        
+        @param channels The left and right channels.
+        
+        @param start The channel index of the first sample.
+        """
+        channels[0].add_scaled(samples, gains[0], start)
+        channels[1].add_scaled(samples, gains[1], start)
+        
+    def _mix_overlap_segments(self, track: List[TrackSegment], gains: Tuple[float, float], channels: Tuple[Array, Array], start: int = 0) -> None:
+        """! Averages the overlap segments of an instrument by the number of notes overlapping each sample and mixes them into the stereo audio data.
+        
+        @param track The overlap segments of the instrument.
+        
+        @param gains The left and right gains of the instrument.
+        
+        @param channels The left and right channels of the stereo audio data of the range.
+        
+        @param start The first song sample of the range. Default is 0.
+        """
+        for segment in track:
+            segment.average()
+            self._mix_samples(segment.data, gains, channels, segment.start - start)
+            
+    def _render_song_range(self, instrument_info: List[Dict], notes: Union[NoteTable, List[Tuple]], start: int, stop: int, stereo_data: Array = None) -> Array:
+        """! Renders the stereo audio data of the song samples in the range [start, stop).
+        
+        Every note that overlaps the range contributes the samples that fall in the range. Since the notes are averaged per sample, the result is identical to the same range of the whole song.
+        
+        @param instrument_info The instrument information.
+        
+        @param notes The notes (a NoteTable or a list), as (instrument index, note number, note amplitude, first sample, number of samples) tuples.
+        
+        @param start The first song sample of the range.
+        
+        @param stop The song sample one past the last sample of the range.
+        
+        @param stereo_data The stereo audio data of the range to mix into. Default is None, i.e., a new TypedArray.
+        
+        @return The interleaved stereo audio data of the range.
+        """
+        notes = [note for note in notes if note[3] < stop and note[3] + note[4] > start]
+        tracks = self._instrument_tracks(len(instrument_info), notes, start, stop)
+        stereo_data = TypedArray(2 * (stop - start), 0) if stereo_data is None else stereo_data
+        self._render_notes(instrument_info, notes, start, stop, tracks, stereo_data)
+        return stereo_data
+        
+    def _render_song_shards(self, instrument_info: List[Dict], notes: Union[NoteTable, List[Tuple]], shards: int) -> None:
+        """! Renders the song stereo audio data in time shards, each in a separate process.
+        
+        The song samples are split into **shards** contiguous ranges. Each process receives only the notes that overlap its range and renders the range with _render_song_range() straight into a shared memory block that holds the whole song, so no audio data is pickled. The shared memory is then copied into the song data in a single copy.
+        
+        A complex or string note is rendered in full (see _render_instrument_note_range()) by every shard it overlaps, since its samples depend on the whole note; a long note of these types that spans several shards is therefore synthesized several times.
+        
+        @param instrument_info The instrument information.
+        
+        @param notes The notes (a NoteTable or a list), as (instrument index, note number, note amplitude, first sample, number of samples) tuples.
+        
+        @param shards The number of time shards.
+        """
+        num_samples = len(self._data) // 2
+        bounds = [num_samples * shard // shards for shard in range(shards + 1)]
+        shared_data = shared_memory.SharedMemory(create=True, size=max(1, 16 * num_samples))
+        try:
+            with ProcessPoolExecutor(shards) as pool:
+                tasks = []
+                for start, stop in zip(bounds, bounds[1:]):
+                    shard_notes = [note for note in notes if note[3] < stop and note[3] + note[4] > start]
+                    tasks.append(pool.submit(_render_song_shard, shared_data.name, instrument_info, shard_notes, start, stop, self._wavetable_size))
+                for task in tasks:
+                    task.result()
+            stereo_data = TypedArray.from_buffer(shared_data.buf[:16 * num_samples], 'd')
+            try:
+                self._data.copy_from(stereo_data)
+            finally:
+                stereo_data.release()
+        finally:
+            shared_data.close()
+            shared_data.unlink()
 
-        # Mix the instrument's audio data into the song's stereo audio data
-        # Note: Assuming self._data is an Array with appropriate size
-            audio_stereo_mix_in(self._data, audio_data[i], 0)  # For left channel
-            audio_stereo_mix_in(self._data, audio_data[i], 1)  # For right channel
\ No newline at end of file
+def _render_song_shard(shared_data_name: str, instrument_info: List[Dict], notes: List[Tuple], start: int, stop: int, wavetable_size: int) -> None:
+    """! Renders a time shard of a song into the shared memory that holds the song stereo audio data (float64 samples).
+    
+    This function runs in a time shard process (see Song._render_song_shards()).
+    
+    @param shared_data_name The name of the shared memory block.
+    
+    @param instrument_info The instrument information.
+    
+    @param notes The notes that overlap the shard.
+    
+    @param start The first song sample of the shard.
+    
+    @param stop The song sample one past the last sample of the shard.
+    
+    @param wavetable_size The table size of the wavetable oscillators, or None to evaluate the wave formulas.
+    """
+    shared_data = shared_memory.SharedMemory(name=shared_data_name)
+    try:
+        stereo_data = TypedArray.from_buffer(shared_data.buf[16 * start:16 * stop], 'd')
+        try:
+            Song._renderer(wavetable_size)._render_song_range(instrument_info, notes, start, stop, stereo_data)
+        finally:
+            stereo_data.release()
+    finally:
+        shared_data.close()
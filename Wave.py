@@ -7,11 +7,13 @@
 # @brief This package defines the wave classes.
 #
 # @section description_wave Description
-# This package provides classes to represent wave sounds. It contains a base wave class and five different basic wave sounds: sine, square, sawtooth, complex, and string waves. The base wave class (BaseWave) provides the wave file read/write functionalities, while the derived wave classes (SineWave, SquareWave, SawtoothWave, ComplexWave, StringWave) use the audio processing functions that you should have implemented in AudioProcessor to generate the corresponding sound waves. You should not need to modify this file. However, you should study this file and learn the OOP modeling and the doxygen-style docstring.
+# This package provides classes to represent wave sounds. It contains a base wave class and five different basic wave sounds: sine, square, sawtooth, complex, and string waves. WavetableWave provides an alternative way to generate the sine, square, sawtooth, and complex waves by interpolated lookup in precomputed single-cycle wavetables. The base wave class (BaseWave) provides the wave file read/write functionalities (WaveReader gives memory-mapped, random access to the samples of a wave file, and WaveWriter writes a wave file incrementally, e.g., to a pipe), while the derived wave classes (SineWave, SquareWave, SawtoothWave, ComplexWave, StringWave) use the audio processing functions that you should have implemented in AudioProcessor to generate the corresponding sound waves. You should not need to modify this file. However, you should study this file and learn the OOP modeling and the doxygen-style docstring.
 #
 # @section libraries_wave Libraries/Modules
+# - typing, array, sys, itertools, math, mmap, os, and os.path (from the standard library)
+#   - access to BinaryIO, Union, array, byteorder, repeat, isfinite, mmap, remove, getsize, and isfile
 # - DataStructure
-#   - access to DataStructure.Array
+#   - access to DataStructure.Array and DataStructure.TypedArray
 # - AudioProcessor
 #   - access to audio processing functions
 #
@@ -27,7 +29,15 @@
 #
 # Copyright (c) 2023 Bucknell University. All rights reserved.
 
-from DataStructure import Array
+from typing import BinaryIO, Union
+from array import array
+from sys import byteorder
+from itertools import repeat
+from math import isfinite
+from mmap import mmap, ACCESS_READ
+from os import remove
+from os.path import getsize, isfile
+from DataStructure import Array, TypedArray
 from AudioProcessor import *
 
 class BaseWave:
@@ -38,11 +48,13 @@ class BaseWave:
     
     ## The number of samples per second
     samples_per_second = 44100
+    ## The typecode of the sample buffer ('d': float64, 'f': float32)
+    sample_typecode = 'd'
     
     def __init__(self, num_samples: int = 0, num_channels: int = 1, filename: str = None) -> None:
         """! The BaseWave class initializer.
         
-        It initializes the attributes required for the read/write wave file (**_num_channels**, **_byte_rate**, **_block_align**, **_sub_chucksize1**, **_sub_chucksize2**, **_chucksize**, and **_data**). Notice that **_data** is an Array that stores the wave samples. This is the attribute that you will modify when creating sounds. This initializer will also read and initialize the data from a wave file, should **filename** not None.
+        It initializes the attributes required for the read/write wave file (**_num_channels**, **_byte_rate**, **_block_align**, **_sub_chucksize1**, **_sub_chucksize2**, **_chucksize**, and **_data**). Notice that **_data** is a TypedArray (using BaseWave.sample_typecode) that stores the wave samples. This is the attribute that you will modify when creating sounds. This initializer will also read and initialize the data from a wave file, should **filename** not None.
         
         @param num_samples The number of wave samples. Default is 0.
         
@@ -51,6 +63,20 @@ class BaseWave:
         @param filename The input filename. Default is None.
         """
         
+        self._init_header(num_samples, num_channels)
+        ## The wave data
+        self._data = TypedArray(num_samples * self._num_channels, 0, BaseWave.sample_typecode)
+        if filename: # if there is an input filename, read from the file
+            self.read_wave_file(filename)
+            
+    def _init_header(self, num_samples: int, num_channels: int) -> None:
+        """! Initializes the wave header attributes for the given number of samples and channels.
+        
+        @param num_samples The number of wave samples.
+        
+        @param num_channels The number of wave channels.
+        """
+        
         ## The number of wave channels
         self._num_channels = num_channels
         ## The byte rate
@@ -63,10 +89,6 @@ class BaseWave:
         self._sub_chucksize2 = num_samples * self._num_channels * 2
         ## The total wave chuck size.
         self._chucksize = 4 + (8 + self._sub_chucksize1) + (8 + self._sub_chucksize2)
-        ## The wave data
-        self._data = Array(num_samples * self._num_channels, 0)
-        if filename: # if there is an input filename, read from the file
-            self.read_wave_file(filename)
     
     def __str__(self) -> str:
         """! A string representation of the base wave class.
@@ -86,101 +108,395 @@ class BaseWave:
         s += 'Num data: ' + str(len(self._data)) + '\n'
         return s
     
-    def write_wave_file(self, filename: str) -> None:
+    def write_wave_file(self, filename: Union[str, BinaryIO], overview: 'WaveIndex.WaveMipmap' = None) -> None:
         """! Write to a wave file.
         
         According to the wave file format defined in http://soundfile.sapp.org/doc/WaveFormat/, this method writes the sound wave to a binary wave file that can be played in the ordinary music player.
         
-        @param filename The output filename
-        """
-        with open(filename, "wb") as out_file:
-            # write Wave file header - RIFF
-            out_file.write(b'RIFF')
-            # write Wave file header - the chuck size
-            out_file.write(self._chucksize.to_bytes(4, byteorder='little', signed=False))
-            # write Wave file header - WAVE
-            out_file.write(b'WAVE')
-            # write Wave file header - fmt 
-            out_file.write(b'fmt ') # sub-chuck1 ID
-            # write the sub-chucksize 1
-            out_file.write(self._sub_chucksize1.to_bytes(4, byteorder='little', signed=False))
-            # write the PCM format
-            out_file.write((1).to_bytes(2, byteorder='little', signed=False))
-            # write the number of channels
-            out_file.write(self._num_channels.to_bytes(2, byteorder='little', signed=False))
-            # write the samples rate
-            out_file.write(BaseWave.samples_per_second.to_bytes(4, byteorder='little', signed=False))
-            # write the byte rate
-            out_file.write(self._byte_rate.to_bytes(4, byteorder='little', signed=False))
-            # write the block alignment
-            out_file.write(self._block_align.to_bytes(2, byteorder='little', signed=False))
-            # write the rate of bits per sample
-            out_file.write((16).to_bytes(2, byteorder='little', signed=False))
-            # write Wave file header - data
-            out_file.write(b'data') # sub-chuck2 ID
-            # write the sub-chucksize 2
-            out_file.write(self._sub_chucksize2.to_bytes(4, byteorder='little', signed=False))
-            # write the wave data
-            for data in self._data:
-                # clipped the value to  [-1, 1]
-                clipped_data = min(1, max(-1, data))
-                # convert to [-32768, 32767] -- i.e. 16 bits int
-                clipped_data = int(clipped_data * (32768 if clipped_data < 0 else 32767))
-                # write to the binary file using 2 bytes (16 bits)
-                out_file.write(clipped_data.to_bytes(2, byteorder='little', signed=True))
+        @param filename The output filename, or a binary output stream (e.g., sys.stdout.buffer), which is not closed. The header is complete, so the stream does not need to be seekable.
+        
+        @param overview An empty WaveIndex.WaveMipmap to build from the 16 bits samples while they are written. It is finished, and saved as the sidecar of the wave file if **filename** is a filename. Default is None, i.e., no overview.
+        """
+        if not isinstance(filename, str):
+            self._write_wave_header(filename)
+            self._write_wave_samples(filename, self._data, overview)
+            filename.flush()
+        else:
+            with open(filename, "wb") as out_file:
+                self._write_wave_header(out_file)
+                self._write_wave_samples(out_file, self._data, overview)
+        if overview is not None:
+            overview.finish()
+            if isinstance(filename, str):
+                overview.save_sidecar(filename)
+            
+    def _write_wave_header(self, out_file: BinaryIO) -> None:
+        """! Writes the wave file header (RIFF, fmt, and data chunk headers) using the header attributes.
+        
+        @param out_file The binary output file stream.
+        """
+        # write Wave file header - RIFF
+        out_file.write(b'RIFF')
+        # write Wave file header - the chuck size
+        out_file.write(self._chucksize.to_bytes(4, byteorder='little', signed=False))
+        # write Wave file header - WAVE
+        out_file.write(b'WAVE')
+        # write Wave file header - fmt 
+        out_file.write(b'fmt ') # sub-chuck1 ID
+        # write the sub-chucksize 1
+        out_file.write(self._sub_chucksize1.to_bytes(4, byteorder='little', signed=False))
+        # write the PCM format
+        out_file.write((1).to_bytes(2, byteorder='little', signed=False))
+        # write the number of channels
+        out_file.write(self._num_channels.to_bytes(2, byteorder='little', signed=False))
+        # write the samples rate
+        out_file.write(BaseWave.samples_per_second.to_bytes(4, byteorder='little', signed=False))
+        # write the byte rate
+        out_file.write(self._byte_rate.to_bytes(4, byteorder='little', signed=False))
+        # write the block alignment
+        out_file.write(self._block_align.to_bytes(2, byteorder='little', signed=False))
+        # write the rate of bits per sample
+        out_file.write((16).to_bytes(2, byteorder='little', signed=False))
+        # write Wave file header - data
+        out_file.write(b'data') # sub-chuck2 ID
+        # write the sub-chucksize 2
+        out_file.write(self._sub_chucksize2.to_bytes(4, byteorder='little', signed=False))
+        
+    @staticmethod
+    def _pcm16_samples(samples) -> array:
+        """! Converts wave samples to 16 bits PCM samples, in little-endian byte order.
+        
+        @param samples The (interleaved) wave samples.
+        
+        @return The 16 bits samples: each sample is clipped to [-1, 1], multiplied by 32768 if negative or 32767 otherwise, and truncated toward zero.
+        """
+        if isinstance(samples, Array):
+            samples = samples.get_block()
+        # clip the values to [-1, 1], unless they are all in range already (a NaN makes the sum NaN)
+        if len(samples) > 0 and not (min(samples) >= -1 and max(samples) <= 1 and isfinite(sum(samples))):
+            samples = list(map(min, repeat(1), map(max, repeat(-1), samples)))
+        # convert to [-32768, 32767] -- i.e. 16 bits int
+        pcm_samples = array('h', [int(data * (32768 if data < 0 else 32767)) for data in samples])
+        if byteorder == 'big':
+            pcm_samples.byteswap()
+        return pcm_samples
+        
+    @staticmethod
+    def _write_wave_samples(out_file: BinaryIO, samples: Array, overview: 'WaveIndex.WaveMipmap' = None) -> None:
+        """! Writes wave samples to the data chunk of a wave file, so a wave can also be written a block of samples at a time.
+        
+        The samples are converted to packed little-endian 16 bits samples in one batch by _pcm16_samples() and written with a single call.
+        
+        @param out_file The binary output file stream, positioned in the data chunk.
+        
+        @param samples The (interleaved) wave samples.
+        
+        @param overview A WaveIndex.WaveMipmap to add the 16 bits samples to, or None. Default is None.
+        """
+        # write the wave data, converted to 16 bits, in one call
+        pcm_samples = BaseWave._pcm16_samples(samples)
+        out_file.write(pcm_samples)
+        if overview is not None:
+            overview.add_pcm(pcm_samples)
         
     def read_wave_file(self, filename: str) -> None:
         """! Read from a wave file.
         
-        According to the wave file format defined in http://soundfile.sapp.org/doc/WaveFormat/, this method reads the sound wave data from a binary wave file and uses it to initialize the corresponding attributes.
+        According to the wave file format defined in http://soundfile.sapp.org/doc/WaveFormat/, this method reads the sound wave data from a binary wave file and uses it to initialize the corresponding attributes. The file is opened with a WaveReader, so chunks other than fmt and data are skipped, and the samples are converted from the memory-mapped data chunk in one batch.
         
         @param filename The input filename
         """
         
-        with open(filename, "rb") as in_file:
-            # read first 4 bytes - RIFF
-            string = str(in_file.read(4), encoding='utf-8')
-            if string != "RIFF":
-                raise Exception("Bad WAV header - RIFF!")
-            # read the chuck size
-            self._chucksize = int.from_bytes(in_file.read(4), byteorder='little', signed=False)
-            # read another 4 bytes - WAVE
-            string = str(in_file.read(4), encoding='utf-8')
-            if string != "WAVE":
-                raise Exception("Bad WAV header - WAVE!")
-            # read another 4 bytes - fmt 
-            string = str(in_file.read(4), encoding='utf-8')
-            if string != "fmt ":
-                raise Exception("Bad WAV header - fmt !")
-            # read sub-chucksize 1
-            self._sub_chucksize1 = int.from_bytes(in_file.read(4), byteorder='little', signed=False)
-            # read the PCM format
-            audio_format = int.from_bytes(in_file.read(2), byteorder='little', signed=False)
-            if audio_format != 1:
-                raise Exception("Bad WAV header - PCM Format!")
-            # read the number of channels
-            self._num_channels = int.from_bytes(in_file.read(2), byteorder='little', signed=False)
-            # read the samples rate
-            _ = int.from_bytes(in_file.read(4), byteorder='little', signed=False)
-            # read the byte rate
-            self._byte_rate = int.from_bytes(in_file.read(4), byteorder='little', signed=False)
-            # read the block alignment
-            self._block_align = int.from_bytes(in_file.read(2), byteorder='little', signed=False)
-            # read the rate of bits per sample
-            _ = int.from_bytes(in_file.read(2), byteorder='little', signed=False)
-            # read another 4 bytes - data
-            string = str(in_file.read(4), encoding='utf-8')
-            if string != "data":
-                raise Exception("Bad WAV header - data!")
-            # read sub-chucksize 2
-            self._sub_chucksize2 = int.from_bytes(in_file.read(4), byteorder='little', signed=False)
-            # read the wave data
-            num_data = self._sub_chucksize2 // 2
-            self._data = Array(num_data, 0)
-            for i in range(num_data):
-                int_val = int.from_bytes(in_file.read(2), byteorder='little', signed=True)
-                self._data[i] = int_val / (32768 if int_val < 0 else 32767)
+        with WaveReader(filename) as reader:
+            self._chucksize = reader.chucksize
+            self._sub_chucksize1 = reader.sub_chucksize1
+            self._num_channels = reader.num_channels
+            self._byte_rate = reader.byte_rate
+            self._block_align = reader.block_align
+            self._sub_chucksize2 = reader.sub_chucksize2
+            self._data = TypedArray(reader.num_samples(), 0, BaseWave.sample_typecode)
+            self._data.copy_from(reader.read_samples(0, reader.num_samples()))
                 
+class WaveReader:
+    """! The Wave.WaveReader class.
+    
+    It opens a 16 bits PCM wave file for random access. It walks the RIFF chunk list (skipping chunks such as LIST or fact), memory-maps the file, and exposes the samples of the data chunk without copying them. Samples are converted to floating-point values only when they are read.
+    """
+    
+    def __init__(self, filename: str) -> None:
+        """! The WaveReader class initializer.
+        
+        It opens and memory-maps the wave file and parses its header chunks.
+        
+        @param filename The input filename.
+        """
+        
+        with open(filename, "rb") as in_file:
+            ## The memory-mapped wave file
+            self._mapping = mmap(in_file.fileno(), 0, access=ACCESS_READ) if getsize(filename) > 0 else b''
+        try:
+            self._read_chunks()
+        except Exception:
+            if isinstance(self._mapping, mmap):
+                self._mapping.close()
+            raise
+            
+    def _read_chunks(self) -> None:
+        """! Parses the RIFF header and walks the chunk list to find the fmt and data chunks.
+        """
+        
+        header = bytes(self._mapping[:12])
+        if len(header) < 12 or header[:4] != b'RIFF':
+            raise Exception("Bad WAV header - RIFF!")
+        if header[8:12] != b'WAVE':
+            raise Exception("Bad WAV header - WAVE!")
+        ## The total wave chuck size
+        self.chucksize = int.from_bytes(header[4:8], byteorder='little', signed=False)
+        ## The fmt sub-chuck size (sub-chucksize 1)
+        self.sub_chucksize1 = None
+        ## The data sub-chuck size (sub-chucksize 2), limited to the bytes present in the file
+        self.sub_chucksize2 = None
+        data_offset = None
+        # walk the chunk list: each chunk has a 4 bytes ID, a 4 bytes size, and its data padded to an even size
+        offset = 12
+        while offset + 8 <= len(self._mapping) and (self.sub_chucksize1 is None or data_offset is None):
+            chunk_id = bytes(self._mapping[offset:offset + 4])
+            chunk_size = int.from_bytes(self._mapping[offset + 4:offset + 8], byteorder='little', signed=False)
+            if chunk_id == b'fmt ':
+                self._read_format(bytes(self._mapping[offset + 8:offset + 8 + chunk_size]))
+                self.sub_chucksize1 = chunk_size
+            elif chunk_id == b'data':
+                data_offset = offset + 8
+                self.sub_chucksize2 = min(chunk_size, len(self._mapping) - data_offset)
+            offset += 8 + chunk_size + (chunk_size & 1)
+        if self.sub_chucksize1 is None:
+            raise Exception("Bad WAV header - fmt !")
+        if data_offset is None:
+            raise Exception("Bad WAV header - data!")
+        ## The 16 bits samples of the data chunk, a zero-copy view of the mapping
+        self._pcm = memoryview(self._mapping)[data_offset:data_offset + self.sub_chucksize2 - self.sub_chucksize2 % 2].cast('h')
+        
+    def _read_format(self, chunk: bytes) -> None:
+        """! Parses the fmt chunk.
+        
+        @param chunk The data of the fmt chunk.
+        """
+        
+        if len(chunk) < 16:
+            raise Exception("Bad WAV header - fmt !")
+        # read the PCM format
+        if int.from_bytes(chunk[0:2], byteorder='little', signed=False) != 1:
+            raise Exception("Bad WAV header - PCM Format!")
+        ## The number of wave channels
+        self.num_channels = int.from_bytes(chunk[2:4], byteorder='little', signed=False)
+        ## The samples rate
+        self.samples_per_second = int.from_bytes(chunk[4:8], byteorder='little', signed=False)
+        ## The byte rate
+        self.byte_rate = int.from_bytes(chunk[8:12], byteorder='little', signed=False)
+        ## The block alignment
+        self.block_align = int.from_bytes(chunk[12:14], byteorder='little', signed=False)
+        # read the rate of bits per sample
+        if int.from_bytes(chunk[14:16], byteorder='little', signed=False) != 16:
+            raise Exception("Bad WAV header - bits per sample!")
+        
+    def __enter__(self) -> 'WaveReader':
+        """! Enter the runtime context of the reader.
+        
+        @return The reader.
+        """
+        
+        return self
+        
+    def __exit__(self, *exc_info) -> None:
+        """! Exit the runtime context of the reader, closing it.
+        
+        @param exc_info The exception information, if any.
+        """
+        
+        self.close()
+        
+    def close(self) -> None:
+        """! Release the samples and close the memory map.
+        """
+        
+        self._pcm.release()
+        if isinstance(self._mapping, mmap):
+            self._mapping.close()
+        
+    def num_samples(self) -> int:
+        """! The number of (interleaved) samples in the data chunk.
+        
+        @return The number of samples.
+        """
+        
+        return len(self._pcm)
+        
+    def num_frames(self) -> int:
+        """! The number of frames, i.e., samples per channel, in the data chunk.
+        
+        @return The number of frames.
+        """
+        
+        return len(self._pcm) // self.num_channels if self.num_channels else 0
+        
+    def pcm(self, start: int = 0, stop: int = None) -> memoryview:
+        """! Get the 16 bits samples in the range [start, stop) without copying them.
+        
+        The samples are little-endian, as stored in the wave file, so the values are only correct on little-endian machines; read_samples() converts them on any machine.
+        
+        @param start The first sample index. Default is 0.
+        
+        @param stop The index one past the last sample. Default is None, i.e., the number of samples.
+        
+        @return A memoryview of 16 bits integers that shares memory with the file mapping. It must be released (e.g., by using it in a with statement) before the reader is closed.
+        """
+        
+        stop = len(self._pcm) if stop is None else stop
+        if start < 0 or stop > len(self._pcm) or start > stop:
+            raise IndexError
+        return self._pcm[start:stop]
+        
+    def read_samples(self, start: int, count: int) -> array:
+        """! Read (interleaved) samples as floating-point values in [-1, 1].
+        
+        @param start The first sample index.
+        
+        @param count The number of samples.
+        
+        @return The samples, using BaseWave.sample_typecode.
+        """
+        
+        pcm_samples = self.pcm(start, start + count)
+        if byteorder == 'big':
+            pcm_samples = array('h', pcm_samples.tobytes())
+            pcm_samples.byteswap()
+        return array(BaseWave.sample_typecode, [int_val / (32768 if int_val < 0 else 32767) for int_val in pcm_samples])
+        
+    def read_frames(self, start: int, count: int) -> array:
+        """! Read frames as interleaved floating-point values in [-1, 1].
+        
+        @param start The first frame index.
+        
+        @param count The number of frames.
+        
+        @return The samples of the frames, interleaved by channel, using BaseWave.sample_typecode.
+        """
+        
+        return self.read_samples(start * self.num_channels, count * self.num_channels)
+        
+class WaveWriter:
+    """! The Wave.WaveWriter class.
+    
+    It writes a 16 bits PCM wave file incrementally. It writes a placeholder header when it is opened, appends the sample blocks passed to write_frames(), and back-patches the chuck sizes in the header when it is closed. When the output is not seekable (e.g., a pipe to an encoder or a player), it writes a streaming header instead, whose chuck sizes are 0xFFFFFFFF (i.e., unknown length), so the samples can be consumed while they are produced. A wave file left unfinished by an exception is discarded instead (see discard()).
+    """
+    
+    ## The chuck size written in the header of a non-seekable output
+    streaming_size = 0xFFFFFFFF
+    
+    def __init__(self, target: Union[str, BinaryIO], num_channels: int = 2, overview: 'WaveIndex.WaveMipmap' = None) -> None:
+        """! The WaveWriter class initializer.
+        
+        @param target The output filename, or a binary output stream (e.g., sys.stdout.buffer), which the writer does not close.
+        
+        @param num_channels The number of wave channels. Default is 2.
+        
+        @param overview An empty WaveIndex.WaveMipmap to build from the 16 bits samples while they are written. It is finished when the writer is closed, and saved as the sidecar of the wave file if **target** is a filename. Default is None, i.e., no overview.
+        """
+        
+        ## The output filename, or None for a stream
+        self._filename = target if isinstance(target, str) else None
+        ## The overview built from the written frames
+        self._overview = overview
+        ## Whether the writer opened (and therefore closes) the output stream
+        self._owns_file = isinstance(target, str)
+        ## The binary output stream
+        self._out_file = open(target, "wb") if self._owns_file else target
+        ## Whether the header can be back-patched
+        self._seekable = self._out_file.seekable()
+        ## The position of the header in the output stream
+        self._header_position = self._out_file.tell() if self._seekable else 0
+        ## The wave that holds the header attributes
+        self._header = BaseWave(0, num_channels)
+        ## The number of samples written so far
+        self._num_samples = 0
+        if not self._seekable:
+            self._header._sub_chucksize2 = WaveWriter.streaming_size
+            self._header._chucksize = WaveWriter.streaming_size
+        self._header._write_wave_header(self._out_file)
+        
+    def __enter__(self) -> 'WaveWriter':
+        """! Enter the runtime context of the writer.
+        
+        @return The writer.
+        """
+        
+        return self
+        
+    def __exit__(self, *exc_info) -> None:
+        """! Exit the runtime context of the writer, closing it, or discarding the wave file if an exception was raised.
+        
+        @param exc_info The exception information, if any.
+        """
+        
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.discard()
+        
+    def num_frames(self) -> int:
+        """! The number of frames, i.e., samples per channel, written so far.
+        
+        @return The number of frames.
+        """
+        
+        return self._num_samples // self._header._num_channels
+        
+    def write_frames(self, samples: Array) -> None:
+        """! Append frames to the data chunk.
+        
+        @param samples The samples of the frames, interleaved by channel (an Array or a sequence of values in [-1, 1]).
+        """
+        
+        if len(samples) % self._header._num_channels != 0:
+            raise ValueError("The number of samples is not a multiple of the number of channels")
+        BaseWave._write_wave_samples(self._out_file, samples, self._overview)
+        self._num_samples += len(samples)
+        
+    def close(self) -> None:
+        """! Finish the wave file: back-patch the chuck sizes in the header (if the output is seekable), flush, close the output stream if the writer opened it, and finish (and save) the overview.
+        """
+        
+        if self._out_file is None:
+            return
+        if self._seekable:
+            self._header._init_header(self.num_frames(), self._header._num_channels)
+            end_position = self._out_file.tell()
+            self._out_file.seek(self._header_position)
+            self._header._write_wave_header(self._out_file)
+            self._out_file.seek(end_position)
+        self._out_file.flush()
+        if self._owns_file:
+            self._out_file.close()
+        self._out_file = None
+        if self._overview is not None:
+            self._overview.finish()
+            if self._filename is not None:
+                self._overview.save_sidecar(self._filename)
+        
+    def discard(self) -> None:
+        """! Abandon an unfinished wave file: flush and close the output stream without back-patching the header or saving the overview, so a partial wave file never looks complete, and remove the wave file if the writer opened it.
+        """
+        
+        if self._out_file is not None:
+            try:
+                self._out_file.flush()
+            finally:
+                if self._owns_file:
+                    self._out_file.close()
+                self._out_file = None
+        if self._owns_file and isfile(self._filename):
+            remove(self._filename)
+        
 class SineWave(BaseWave):
     """! The Wave.SineWave class.
     
@@ -309,3 +625,27 @@ class StringWave(BaseWave):
         super().__init__(num_samples)
         audio_generate_string_wave(self._data, wave_freq, amplitude, BaseWave.samples_per_second)
             
+class WavetableWave(BaseWave):
+    """! The Wave.WavetableWave class.
+    
+    It extends the Wave.BaseWave class by initializing a sine, square, sawtooth, or complex wave sound from the wave's single-cycle wavetable, instead of evaluating the wave formula at every sample.
+    """
+    
+    def __init__(self, num_samples: int, wave_freq: float, amplitude: float = 0.8, wave_type: int = 1, table_size: int = None) -> None:
+        """! The WavetableWave class initializer.
+        
+        The initializer reuses the base class initializer, takes the number of samples, wave frequency, wave amplitude, wave type, and wavetable size as the input parameters, and uses them to initialize a wave by calling audio_generate_wavetable_wave().
+        
+        @param num_samples The number of wave samples.
+        
+        @param wave_freq The wave frequency.
+        
+        @param amplitude The wave amplitude. Default is 0.8.
+        
+        @param wave_type The wave type (1: sine, 2: square, 3: sawtooth, 4: complex). Default is 1.
+        
+        @param table_size The number of samples in the wavetable. Default is None, i.e., AudioProcessor.wavetable_size.
+        """
+        
+        super().__init__(num_samples)
+        audio_generate_wavetable_wave(self._data, wave_type, wave_freq, amplitude, BaseWave.samples_per_second, table_size)
@@ -0,0 +1,614 @@
+"""! @brief The WaveIndex package.
+"""
+
+##
+# @file WaveIndex.py
+#
+# @brief This package defines sidecar indexes of wave files.
+#
+# @section description_waveindex Description
+# This package provides small index files stored next to a wave file (sidecars), so that wave files can be checked without decoding all of their samples. WaveFingerprint stores a hash of each block of samples, both exact and quantized to a tolerance, and the energy of each block. Comparing a new render against a reference first compares the fingerprints, and only the blocks whose hashes differ need to be decoded and compared.
+#
+# WaveMipmap stores an overview of a wave: the minimum, maximum, and energy of each block of frames at several zoom levels (each level merges pairs of blocks of the level below). It is built in one streaming pass while the wave is written, from the 16 bits samples as they are written (see Wave.BaseWave.write_wave_file() and Wave.WaveWriter), and answers queries such as the peak or RMS of a range of frames, or where clipping occurs, in O(log n) block lookups instead of a full scan of the samples.
+#
+# A sidecar is rebuilt automatically when the size or modification time of its wave file changes, or when it was built with other parameters. A sidecar is written to a temporary file that replaces the old sidecar once complete, so a reader never sees a partial sidecar.
+#
+# @section libraries_waveindex Libraries/Modules
+# - typing (from the standard library)
+#   - access to List and Tuple
+# - hashlib, struct, os, tempfile, itertools, operator, math, sys, and array (from the standard library)
+#   - access to blake2b, Struct, stat, fdopen, remove, replace, dirname, mkstemp, repeat, floordiv, mul, add, sqrt, byteorder, and array
+# - Wave
+#   - access to Wave.BaseWave and Wave.WaveReader
+# - AudioProcessor
+#   - access to AudioProcessor.block_size
+#
+# @section notes_waveindex Notes
+# - Comments should be Doxygen compatible.
+#
+# Copyright (c) 2023 Bucknell University. All rights reserved.
+
+from typing import List, Tuple
+from hashlib import blake2b
+from struct import Struct
+from os import stat, fdopen, remove, replace
+from os.path import dirname
+from tempfile import mkstemp
+from itertools import repeat
+from operator import floordiv, mul, add
+from math import sqrt
+from sys import byteorder
+from array import array
+from Wave import BaseWave, WaveReader
+from AudioProcessor import block_size
+
+def _save_atomically(path: str, chunks: List[bytes]) -> None:
+    """! Write a file through a temporary file in the same directory, which then replaces the file.
+
+    @param path The filename.
+
+    @param chunks The contents of the file.
+    """
+
+    handle, temp_path = mkstemp(suffix='.tmp', dir=dirname(path) or '.')
+    try:
+        with fdopen(handle, 'wb') as out_file:
+            for chunk in chunks:
+                out_file.write(chunk)
+        replace(temp_path, path)
+    except BaseException:
+        remove(temp_path)
+        raise
+
+class WaveFingerprint:
+    """! The WaveIndex.WaveFingerprint class.
+
+    It stores, for each block of samples of a wave file, an exact hash of the 16 bits samples, a hash of the samples quantized to a tolerance, and the energy (sum of squared samples) of the block. Two blocks with the same exact hash are identical; two blocks with the same quantized hash differ by less than the tolerance at every sample.
+    """
+
+    ## The magic number of a fingerprint sidecar file
+    magic = b'WVFP'
+    ## The version of the sidecar file format
+    version = 1
+    ## The file name suffix of a fingerprint sidecar
+    suffix = '.fp'
+    ## The default tolerance of the quantized hashes
+    default_tolerance = 0.001
+    ## The sidecar header: magic, version, block samples, quantization step, number of samples, wave file size, and wave file modification time (ns)
+    _header = Struct('<4sIIIQQQ')
+    ## A sidecar entry: exact hash, quantized hash, and block energy
+    _entry = Struct('<8s8sd')
+
+    def __init__(self, num_samples: int, block_samples: int, step: int, source: tuple = (0, 0)) -> None:
+        """! The WaveFingerprint class initializer.
+
+        @param num_samples The number of (interleaved) samples of the wave file.
+
+        @param block_samples The number of samples per block.
+
+        @param step The quantization step of the quantized hashes, in 16 bits sample units.
+
+        @param source The size and modification time (ns) of the wave file. Default is (0, 0).
+        """
+
+        ## The number of samples of the wave file
+        self.num_samples = num_samples
+        ## The number of samples per block
+        self.block_samples = block_samples
+        ## The quantization step of the quantized hashes
+        self.step = step
+        ## The size and modification time (ns) of the wave file
+        self.source = source
+        ## The exact hash of each block
+        self.exact = []
+        ## The quantized hash of each block
+        self.quantized = []
+        ## The energy of each block
+        self.energy = []
+
+    @staticmethod
+    def step_for(tolerance: float) -> int:
+        """! Compute the quantization step that guarantees a difference smaller than the tolerance.
+
+        Samples in the same quantization bucket differ by at most step - 1 units of 1/32768.
+
+        @param tolerance The tolerance, as a difference of samples in [-1, 1].
+
+        @return The quantization step, in 16 bits sample units.
+        """
+
+        return max(1, int(tolerance * 32768))
+
+    @staticmethod
+    def sidecar_path(filename: str) -> str:
+        """! The path of the fingerprint sidecar of a wave file.
+
+        @param filename The wave filename.
+
+        @return The sidecar filename.
+        """
+
+        return filename + WaveFingerprint.suffix
+
+    @classmethod
+    def build(cls, filename: str, block_samples: int = block_size, tolerance: float = None) -> 'WaveFingerprint':
+        """! Build the fingerprint of a wave file.
+
+        @param filename The wave filename.
+
+        @param block_samples The number of samples per block. Default is AudioProcessor.block_size.
+
+        @param tolerance The tolerance of the quantized hashes. Default is None, i.e., WaveFingerprint.default_tolerance.
+
+        @return The fingerprint of the wave file.
+        """
+
+        step = cls.step_for(cls.default_tolerance if tolerance is None else tolerance)
+        file_stat = stat(filename)
+        with WaveReader(filename) as reader:
+            fingerprint = cls(reader.num_samples(), block_samples, step, (file_stat.st_size, file_stat.st_mtime_ns))
+            for start in range(0, reader.num_samples(), block_samples):
+                count = min(block_samples, reader.num_samples() - start)
+                with reader.pcm(start, start + count) as pcm_samples:
+                    fingerprint.exact.append(blake2b(pcm_samples, digest_size=8).digest())
+                    quantized = array('h', map(floordiv, pcm_samples, repeat(step))) if step > 1 else pcm_samples
+                    fingerprint.quantized.append(blake2b(quantized, digest_size=8).digest())
+                    del quantized
+                samples = reader.read_samples(start, count)
+                fingerprint.energy.append(sum(map(mul, samples, samples)))
+        return fingerprint
+
+    @classmethod
+    def load(cls, path: str) -> 'WaveFingerprint':
+        """! Load a fingerprint from a sidecar file.
+
+        @param path The sidecar filename.
+
+        @return The fingerprint stored in the sidecar.
+        """
+
+        with open(path, 'rb') as in_file:
+            data = in_file.read()
+        if len(data) < cls._header.size:
+            raise Exception("Bad fingerprint header!")
+        magic, version, block_samples, step, num_samples, size, mtime = cls._header.unpack_from(data)
+        if magic != cls.magic or version != cls.version:
+            raise Exception("Bad fingerprint header!")
+        fingerprint = cls(num_samples, block_samples, step, (size, mtime))
+        num_blocks = -(-num_samples // block_samples) if block_samples else 0
+        if len(data) != cls._header.size + num_blocks * cls._entry.size:
+            raise Exception("Bad fingerprint size!")
+        for exact, quantized, energy in cls._entry.iter_unpack(data[cls._header.size:]):
+            fingerprint.exact.append(exact)
+            fingerprint.quantized.append(quantized)
+            fingerprint.energy.append(energy)
+        return fingerprint
+
+    def save(self, path: str) -> None:
+        """! Save the fingerprint to a sidecar file.
+
+        @param path The sidecar filename.
+        """
+
+        _save_atomically(path, [self._header.pack(self.magic, self.version, self.block_samples, self.step, self.num_samples, *self.source),
+                                b''.join(self._entry.pack(*entry) for entry in zip(self.exact, self.quantized, self.energy))])
+
+    @classmethod
+    def of(cls, filename: str, block_samples: int = block_size, tolerance: float = None) -> 'WaveFingerprint':
+        """! Get the fingerprint of a wave file from its sidecar, building (and saving) the sidecar if it is missing or stale.
+
+        The sidecar is stale if the size or modification time of the wave file changed, or if it was built with another block size or tolerance. If the sidecar cannot be written (e.g., a read-only directory), the fingerprint is still returned.
+
+        @param filename The wave filename.
+
+        @param block_samples The number of samples per block. Default is AudioProcessor.block_size.
+
+        @param tolerance The tolerance of the quantized hashes. Default is None, i.e., WaveFingerprint.default_tolerance.
+
+        @return The fingerprint of the wave file.
+        """
+
+        step = cls.step_for(cls.default_tolerance if tolerance is None else tolerance)
+        file_stat = stat(filename)
+        path = cls.sidecar_path(filename)
+        try:
+            fingerprint = cls.load(path)
+            if fingerprint.source == (file_stat.st_size, file_stat.st_mtime_ns) and fingerprint.block_samples == block_samples and fingerprint.step == step:
+                return fingerprint
+        except Exception:
+            pass
+        fingerprint = cls.build(filename, block_samples, tolerance)
+        try:
+            fingerprint.save(path)
+        except OSError:
+            pass
+        return fingerprint
+
+    def num_blocks(self) -> int:
+        """! The number of blocks.
+
+        @return The number of blocks.
+        """
+
+        return len(self.exact)
+
+    def differing_blocks(self, other: 'WaveFingerprint', quantized: bool = False) -> List[int]:
+        """! Find the blocks whose hashes differ from the blocks of another fingerprint with the same block size.
+
+        Blocks that exist in only one of the fingerprints differ. The last blocks also differ if the numbers of samples differ.
+
+        @param other The other fingerprint.
+
+        @param quantized Whether to compare the quantized hashes (which must use the same step) instead of the exact hashes. Default is False.
+
+        @return The indices of the differing blocks, in increasing order.
+        """
+
+        if self.block_samples != other.block_samples or (quantized and self.step != other.step):
+            raise ValueError("The fingerprints use different parameters")
+        hashes1, hashes2 = (self.quantized, other.quantized) if quantized else (self.exact, other.exact)
+        blocks = [index for index, (hash1, hash2) in enumerate(zip(hashes1, hashes2)) if hash1 != hash2]
+        num_blocks = min(len(hashes1), len(hashes2))
+        if self.num_samples != other.num_samples and num_blocks > 0 and (not blocks or blocks[-1] != num_blocks - 1):
+            blocks.append(num_blocks - 1)
+        return blocks + list(range(num_blocks, max(len(hashes1), len(hashes2))))
+
+class WaveMipmap:
+    """! The WaveIndex.WaveMipmap class.
+
+    It stores the minimum, maximum, and energy (sum of squared samples) of each block of frames of a wave, over all channels, at several zoom levels. Level 0 has one entry per **base_frames** frames; each higher level merges pairs of entries of the level below, up to a single entry. The statistics are those of the 16 bits samples of the wave file, decoded as Wave.WaveReader.read_samples() does, so they match the samples read back from the file; a sample clipped when it was written is at full scale (-1 or 1).
+
+    A mipmap is built incrementally: add_pcm() accepts blocks of interleaved 16 bits samples as they are written (add_samples() accepts floating-point samples and converts them first), and finish() completes the last block and the higher levels.
+    """
+
+    ## The magic number of a mipmap sidecar file
+    magic = b'WVMM'
+    ## The version of the sidecar file format
+    version = 2
+    ## The file name suffix of a mipmap sidecar
+    suffix = '.mip'
+    ## The default number of frames per level 0 block
+    default_base_frames = 256
+    ## The sidecar header: magic, version, number of channels, frames per level 0 block, number of frames, wave file size, and wave file modification time (ns)
+    _header = Struct('<4sIIIQQQ')
+
+    def __init__(self, num_channels: int = 2, base_frames: int = None, source: tuple = (0, 0)) -> None:
+        """! The WaveMipmap class initializer.
+
+        @param num_channels The number of wave channels. Default is 2.
+
+        @param base_frames The number of frames per level 0 block. Default is None, i.e., WaveMipmap.default_base_frames.
+
+        @param source The size and modification time (ns) of the wave file. Default is (0, 0).
+        """
+
+        ## The number of wave channels
+        self.num_channels = num_channels
+        ## The number of frames per level 0 block
+        self.base_frames = WaveMipmap.default_base_frames if base_frames is None else base_frames
+        ## The size and modification time (ns) of the wave file
+        self.source = source
+        ## The number of frames added so far
+        self.num_frames = 0
+        ## The minimum, maximum, and energy arrays of each level
+        self.levels = [(array('d'), array('d'), array('d'))]
+        ## The 16 bits samples added since the last complete level 0 block (less than a block)
+        self._pending = array('h')
+
+    @staticmethod
+    def sidecar_path(filename: str) -> str:
+        """! The path of the mipmap sidecar of a wave file.
+
+        @param filename The wave filename.
+
+        @return The sidecar filename.
+        """
+
+        return filename + WaveMipmap.suffix
+
+    def add_samples(self, samples) -> None:
+        """! Add interleaved floating-point samples to the mipmap, converted to 16 bits as Wave.BaseWave.write_wave_file() writes them.
+
+        @param samples The interleaved samples (an Array or a sequence of values), a whole number of frames.
+        """
+
+        self.add_pcm(BaseWave._pcm16_samples(samples))
+
+    def add_pcm(self, pcm_samples) -> None:
+        """! Add interleaved 16 bits samples to the mipmap, completing level 0 blocks as they fill up.
+
+        The complete blocks are read from slices of **pcm_samples**; only the samples of the last, incomplete block are kept until the next call.
+
+        @param pcm_samples The interleaved 16 bits samples, in little-endian byte order as written to the wave file (an array or a memoryview of 'h'), a whole number of frames.
+        """
+
+        if len(pcm_samples) % self.num_channels != 0:
+            raise ValueError("The number of samples is not a multiple of the number of channels")
+        if byteorder == 'big':
+            pcm_samples = array('h', bytes(pcm_samples))
+            pcm_samples.byteswap()
+        pcm_samples = memoryview(pcm_samples)
+        self.num_frames += len(pcm_samples) // self.num_channels
+        block_samples = self.base_frames * self.num_channels
+        start = 0
+        if len(self._pending) > 0:
+            # complete the block started by the previous calls
+            start = min(len(pcm_samples), block_samples - len(self._pending))
+            self._pending.extend(pcm_samples[:start])
+            if len(self._pending) < block_samples:
+                return
+            self._add_block(self._pending)
+            self._pending = array('h')
+        num_full = start + (len(pcm_samples) - start) // block_samples * block_samples
+        for block_start in range(start, num_full, block_samples):
+            self._add_block(pcm_samples[block_start:block_start + block_samples])
+        self._pending.extend(pcm_samples[num_full:])
+
+    def _add_block(self, pcm_samples) -> None:
+        """! Append the statistics of a level 0 block.
+
+        @param pcm_samples The 16 bits samples of the block.
+        """
+
+        mins, maxs, energy = self.levels[0]
+        samples = [int_val / (32768 if int_val < 0 else 32767) for int_val in pcm_samples]
+        mins.append(min(samples))
+        maxs.append(max(samples))
+        energy.append(sum(map(mul, samples, samples)))
+
+    def finish(self) -> 'WaveMipmap':
+        """! Complete the last (partial) level 0 block and build the higher levels.
+
+        @return The mipmap.
+        """
+
+        if len(self._pending) > 0:
+            self._add_block(self._pending)
+            self._pending = array('h')
+        del self.levels[1:]
+        while len(self.levels[-1][0]) > 1:
+            mins, maxs, energy = self.levels[-1]
+            # merge pairs of entries; an odd last entry is carried up as it is
+            self.levels.append((array('d', map(min, mins[0::2], mins[1::2])) + mins[len(mins) - len(mins) % 2:],
+                                array('d', map(max, maxs[0::2], maxs[1::2])) + maxs[len(maxs) - len(maxs) % 2:],
+                                array('d', map(add, energy[0::2], energy[1::2])) + energy[len(energy) - len(energy) % 2:]))
+        return self
+
+    @classmethod
+    def from_samples(cls, samples, num_channels: int = 2, base_frames: int = None) -> 'WaveMipmap':
+        """! Build the mipmap of interleaved samples.
+
+        @param samples The interleaved samples (an Array or a sequence of values).
+
+        @param num_channels The number of wave channels. Default is 2.
+
+        @param base_frames The number of frames per level 0 block. Default is None, i.e., WaveMipmap.default_base_frames.
+
+        @return The mipmap.
+        """
+
+        mipmap = cls(num_channels, base_frames)
+        mipmap.add_samples(samples)
+        return mipmap.finish()
+
+    @classmethod
+    def build(cls, filename: str, base_frames: int = None) -> 'WaveMipmap':
+        """! Build the mipmap of a wave file from its samples.
+
+        @param filename The wave filename.
+
+        @param base_frames The number of frames per level 0 block. Default is None, i.e., WaveMipmap.default_base_frames.
+
+        @return The mipmap of the wave file.
+        """
+
+        file_stat = stat(filename)
+        with WaveReader(filename) as reader:
+            mipmap = cls(reader.num_channels, base_frames, (file_stat.st_size, file_stat.st_mtime_ns))
+            step = block_size * reader.num_channels
+            for start in range(0, reader.num_frames() * reader.num_channels, step):
+                with reader.pcm(start, min(start + step, reader.num_frames() * reader.num_channels)) as pcm_samples:
+                    mipmap.add_pcm(pcm_samples)
+        return mipmap.finish()
+
+    @classmethod
+    def load(cls, path: str) -> 'WaveMipmap':
+        """! Load a mipmap from a sidecar file.
+
+        @param path The sidecar filename.
+
+        @return The mipmap stored in the sidecar.
+        """
+
+        with open(path, 'rb') as in_file:
+            data = in_file.read()
+        if len(data) < cls._header.size:
+            raise Exception("Bad mipmap header!")
+        magic, version, num_channels, base_frames, num_frames, size, mtime = cls._header.unpack_from(data)
+        if magic != cls.magic or version != cls.version or num_channels == 0 or base_frames == 0:
+            raise Exception("Bad mipmap header!")
+        mipmap = cls(num_channels, base_frames, (size, mtime))
+        mipmap.num_frames = num_frames
+        values = array('d')
+        values.frombytes(data[cls._header.size:])
+        if byteorder == 'big':
+            values.byteswap()
+        mipmap.levels = []
+        size = -(-num_frames // base_frames)
+        offset = 0
+        while True:
+            if offset + 3 * size > len(values):
+                raise Exception("Bad mipmap size!")
+            mipmap.levels.append(tuple(values[offset + i * size:offset + (i + 1) * size] for i in range(3)))
+            offset += 3 * size
+            if size <= 1:
+                break
+            size = (size + 1) // 2
+        if offset != len(values):
+            raise Exception("Bad mipmap size!")
+        return mipmap
+
+    def save(self, path: str) -> None:
+        """! Save the mipmap to a sidecar file.
+
+        @param path The sidecar filename.
+        """
+
+        values = array('d')
+        for level in self.levels:
+            for values_of_level in level:
+                values.extend(values_of_level)
+        if byteorder == 'big':
+            values.byteswap()
+        _save_atomically(path, [self._header.pack(self.magic, self.version, self.num_channels, self.base_frames, self.num_frames, *self.source), values])
+
+    def save_sidecar(self, filename: str) -> None:
+        """! Stamp the mipmap with the size and modification time of its (complete) wave file, and save it as the sidecar of the wave file.
+
+        @param filename The wave filename.
+        """
+
+        file_stat = stat(filename)
+        self.source = (file_stat.st_size, file_stat.st_mtime_ns)
+        self.save(self.sidecar_path(filename))
+
+    @classmethod
+    def of(cls, filename: str, base_frames: int = None) -> 'WaveMipmap':
+        """! Get the mipmap of a wave file from its sidecar, building (and saving) the sidecar if it is missing or stale.
+
+        The sidecar is stale if the size or modification time of the wave file changed, or if it was built with another number of frames per level 0 block. If the sidecar cannot be written (e.g., a read-only directory), the mipmap is still returned.
+
+        @param filename The wave filename.
+
+        @param base_frames The number of frames per level 0 block. Default is None, i.e., WaveMipmap.default_base_frames.
+
+        @return The mipmap of the wave file.
+        """
+
+        file_stat = stat(filename)
+        try:
+            mipmap = cls.load(cls.sidecar_path(filename))
+            if mipmap.source == (file_stat.st_size, file_stat.st_mtime_ns) and mipmap.base_frames == (cls.default_base_frames if base_frames is None else base_frames):
+                return mipmap
+        except Exception:
+            pass
+        mipmap = cls.build(filename, base_frames)
+        try:
+            mipmap.save(cls.sidecar_path(filename))
+        except OSError:
+            pass
+        return mipmap
+
+    def _block_ranges(self, start: int, stop: int) -> List[Tuple[int, int]]:
+        """! Decompose the level 0 blocks [start, stop) into O(log n) entries of the levels.
+
+        @param start The first level 0 block.
+
+        @param stop The level 0 block one past the last block.
+
+        @return The (level, entry index) of the entries that exactly cover the blocks.
+        """
+
+        entries = []
+        level = 0
+        while start < stop:
+            if start % 2 == 1:
+                entries.append((level, start))
+                start += 1
+            if stop % 2 == 1:
+                stop -= 1
+                entries.append((level, stop))
+            start //= 2
+            stop //= 2
+            level += 1
+        return entries
+
+    def _range_stats(self, start: int, stop: int, reader: WaveReader = None) -> Tuple[float, float, float, int]:
+        """! Compute the minimum, maximum, energy, and number of samples of the frames [start, stop).
+
+        The blocks fully inside the range come from the index. The partial blocks at both ends are read from **reader** (as decoded 16 bits samples, like the index) if it is given; otherwise the whole blocks are used, so the result covers the range rounded out to level 0 blocks.
+
+        @param start The first frame.
+
+        @param stop The frame one past the last frame.
+
+        @param reader The wave file of the mipmap, used to read the partial blocks exactly. Default is None.
+
+        @return The minimum, maximum, energy, and number of samples.
+        """
+
+        start, stop = max(0, start), min(self.num_frames, stop)
+        if start >= stop:
+            raise ValueError("Empty frame range")
+        first_block = start // self.base_frames if reader is None else -(-start // self.base_frames)
+        last_block = -(-stop // self.base_frames) if reader is None else stop // self.base_frames
+        stats = []
+        if reader is not None:
+            # read the partial blocks at both ends of the range
+            for edge_start, edge_stop in ((start, min(stop, first_block * self.base_frames)), (max(start, last_block * self.base_frames, first_block * self.base_frames), stop)):
+                if edge_start < edge_stop:
+                    samples = reader.read_frames(edge_start, edge_stop - edge_start)
+                    stats.append((min(samples), max(samples), sum(map(mul, samples, samples))))
+            last_block = max(first_block, last_block)
+        for level, index in self._block_ranges(first_block, last_block):
+            mins, maxs, energy = self.levels[level]
+            stats.append((mins[index], maxs[index], energy[index]))
+        if reader is None:
+            start, stop = first_block * self.base_frames, min(self.num_frames, last_block * self.base_frames)
+        return min(stat[0] for stat in stats), max(stat[1] for stat in stats), sum(stat[2] for stat in stats), (stop - start) * self.num_channels
+
+    def peak(self, start: int = 0, stop: int = None, reader: WaveReader = None) -> Tuple[float, float]:
+        """! The minimum and maximum sample of the frames [start, stop), over all channels.
+
+        @param start The first frame. Default is 0.
+
+        @param stop The frame one past the last frame. Default is None, i.e., the number of frames.
+
+        @param reader The wave file of the mipmap, used to read the partial blocks at both ends (as decoded 16 bits samples). Default is None, i.e., the range is rounded out to level 0 blocks.
+
+        @return The minimum and maximum sample.
+        """
+
+        minimum, maximum, _, _ = self._range_stats(start, self.num_frames if stop is None else stop, reader)
+        return minimum, maximum
+
+    def rms(self, start: int = 0, stop: int = None, reader: WaveReader = None) -> float:
+        """! The RMS of the samples of the frames [start, stop), over all channels.
+
+        @param start The first frame. Default is 0.
+
+        @param stop The frame one past the last frame. Default is None, i.e., the number of frames.
+
+        @param reader The wave file of the mipmap, used to read the partial blocks at both ends (as decoded 16 bits samples). Default is None, i.e., the range is rounded out to level 0 blocks.
+
+        @return The RMS of the samples.
+        """
+
+        _, _, energy, count = self._range_stats(start, self.num_frames if stop is None else stop, reader)
+        return sqrt(energy / count)
+
+    def find_clipping(self, limit: float = 1) -> List[Tuple[int, int]]:
+        """! Find the level 0 blocks that contain a sample at or beyond -limit or limit, e.g., samples at full scale, where the samples are clipped when written as 16 bits.
+
+        The search starts from the top level and only descends into entries whose minimum or maximum reaches the limit.
+
+        @param limit The magnitude that the samples must stay below. Default is 1.
+
+        @return The frame ranges [start, stop) of the blocks, merged when adjacent, in increasing order.
+        """
+
+        entries = [0] if self.num_frames > 0 else []
+        for level in range(len(self.levels) - 1, -1, -1):
+            mins, maxs, _ = self.levels[level]
+            entries = [index for index in entries if mins[index] <= -limit or maxs[index] >= limit]
+            if level > 0:
+                below = len(self.levels[level - 1][0])
+                entries = [child for index in entries for child in (2 * index, 2 * index + 1) if child < below]
+        ranges = []
+        for index in entries:
+            start, stop = index * self.base_frames, min(self.num_frames, (index + 1) * self.base_frames)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+        return ranges
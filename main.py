@@ -70,17 +70,51 @@
 #
 # Note: it may take minutes to generate the song Toccata Fugue in D Minor.
 #
+# The same operations can also be run without the menu, as subcommands (run `python main.py <subcommand> -h` for their options):
+#
+#     python main.py render-song songs/simple.txt simple.wav --workers 4
+#     python main.py tone sine 44100 261.63 sine_c.wav
+#     python main.py envelope adsr sawtooth_g.wav sawtooth_g_adsr.wav
+#     python main.py stereo sine_c.wav 0.18 sine_c_stereo.wav
+#     python main.py compare sine_c.wav my_sine_c.wav --tolerance 0.01
+#
+# Many jobs can be run at once from a job manifest, on a pool of worker processes:
+#
+#     python main.py batch jobs.json --workers 8
+#
+# A manifest is either a JSON list of jobs (or an object with a "jobs" list) or a CSV file with a header row. A job has a "command" (one of the subcommands above) and a field per argument or option of the subcommand, named as in its usage with dashes replaced by underscores (e.g., {"command": "tone", "wave_type": "sine", "num_samples": 44100, "frequency": 261.63, "output": "sine_c.wav"}); empty CSV cells use the option defaults. A job is skipped, unless --force is given, if its output is newer than its input and was written by a job with the same arguments and options, as recorded in the stamp file next to the output (the output filename followed by .job). The jobs run independently and in any order, so a job that needs the output of another one (e.g., a compare of a rendered song) belongs to a later manifest. At the end, the batch prints the status and time of every job.
+#
+# A long-lived local render server avoids paying the interpreter startup, module imports, and cold caches for every render:
+#
+#     python main.py serve --port 8765 --workers 2 --queue-size 8 --root .
+#
+# It accepts jobs (in the manifest format, as a JSON object with the content type application/json) posted to http://127.0.0.1:8765/, runs them on a pool of worker threads that share the note cache (see song_note_cache), and rejects jobs with status 503 when the queue is full. A job with an output file writes it and responds with its name; a job without one (e.g., {"command": "tone", "wave_type": "sine", "num_samples": 44100, "frequency": 261.63}) streams the wave file itself as the response, and a compare job responds with the difference statistics. GET /status reports the job counters and the note cache statistics.
+#
+# The server only listens on a loopback address (--host must be 127.0.0.1, ::1, or localhost), since it runs the jobs of anyone who can reach it. It only serves requests addressed to 127.0.0.1, localhost, or [::1] (checked against the Host header, so that a web page cannot reach it through DNS rebinding), it rejects a job without a valid Content-Length or larger than RenderRequestHandler.max_job_size, and the files of a job are resolved under the root directory (--root, the current directory by default): a job that names a file outside of it is rejected.
+#
+#     curl -H 'Content-Type: application/json' --data '{"command": "render-song", "input": "songs/simple.txt"}' http://127.0.0.1:8765/ -o simple.wav
+#
 # @section libraries_main Libraries/Modules
 # - sys (from the standard library)
 #   - access to command line arguments
 # - typing (from the standard library)
-#   - access to Tuple
+#   - access to Tuple, Dict, and List
+# - os, math, operator, and concurrent.futures (from the standard library)
+#   - access to listdir, isdir, isfile, join, getmtime, log10, sqrt, inf, sub, mul, and ProcessPoolExecutor, used to compare wave files and to run job manifests
+# - hashlib (from the standard library)
+#   - access to blake2b, used to stamp the job outputs
+# - argparse, json, csv, io, contextlib, and time (from the standard library)
+#   - access to ArgumentParser, load, DictReader, StringIO, redirect_stdout, and perf_counter, used by the subcommands and job manifests
+# - http.server, threading, ipaddress, and os (from the standard library)
+#   - access to ThreadingHTTPServer, BaseHTTPRequestHandler, loads, dumps, ThreadPoolExecutor, Future, BoundedSemaphore, Lock, ip_address, realpath, commonpath, and remove, used by the render server
 # - Wave
-#   - access to Wave.BaseWave, Wave.SineWave, Wave.SquareWave, Wave.SawtoothWave, Wave.ComplexWave, and Wave.StringWave
+#   - access to Wave.BaseWave, Wave.SineWave, Wave.SquareWave, Wave.SawtoothWave, Wave.ComplexWave, Wave.StringWave, and Wave.WaveReader
 # - AudioProcessor
 #   - access to audio processing functions
 # - Song
 #   - access to Song.Song
+# - WaveIndex
+#   - access to WaveIndex.WaveFingerprint and WaveIndex.WaveMipmap
 #
 # @section notes_main Notes
 # - Comments should be Doxygen compatible.
@@ -95,10 +129,26 @@
 # Copyright (c) 2023 Bucknell University. All rights reserved.
 
 from sys import argv
-from typing import Tuple
+from typing import Tuple, Dict, List, BinaryIO, Union
+from os import listdir, remove
+from os.path import isdir, isfile, join, getmtime, realpath, commonpath
+from math import log10, sqrt, inf
+from operator import sub, mul
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future
+from argparse import ArgumentParser
+from json import load, loads, dumps
+from hashlib import blake2b
+from ipaddress import ip_address
+from csv import DictReader
+from io import StringIO
+from contextlib import redirect_stdout
+from time import perf_counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import BoundedSemaphore, Lock
 from Wave import *
 from AudioProcessor import *
 from Song import *
+from WaveIndex import WaveFingerprint, WaveMipmap
 
 def print_main_menu() -> int:
     """! This function prints the main menu and gets user's selection.
@@ -155,6 +205,20 @@ def create_waveform(wave_type: int) -> None:
     
     num_samples, freq = get_wave_parameters()
     filename = get_filename()
+    write_waveform(wave_type, num_samples, freq, filename)
+
+def write_waveform(wave_type: int, num_samples: int, freq: float, filename: Union[str, BinaryIO]) -> None:
+    """! This function writes a digital waveform to a wave file.
+    
+    @param wave_type 1: sine wave, 2: square wave, 3: sawtooth wave, 4: complex wave, 5: string wave.
+    
+    @param num_samples The number of samples.
+    
+    @param freq The wave frequency.
+    
+    @param filename The output wave file, or a binary output stream.
+    """
+    
     if wave_type == 1: wave = SineWave(num_samples, freq) 
     elif wave_type == 2: wave = SquareWave(num_samples, freq) 
     elif wave_type == 3: wave = SawtoothWave(num_samples, freq)
@@ -171,6 +235,18 @@ def apply_stereo() -> None:
     in_filename = get_filename(True)
     angle = float(input("Angle: "))
     out_filename = get_filename()
+    write_stereo(in_filename, angle, out_filename)
+
+def write_stereo(in_filename: str, angle: float, out_filename: Union[str, BinaryIO]) -> None:
+    """! This function mixes a mono wave file into a stereo wave file.
+    
+    @param in_filename The input (mono) wave file.
+    
+    @param angle The stereo pan angle.
+    
+    @param out_filename The output (stereo) wave file, or a binary output stream.
+    """
+    
     wave_left = BaseWave(filename = in_filename)
     wave_right = BaseWave(filename = in_filename)
     gain_left, gain_right = audio_stereo_gains(angle)
@@ -189,9 +265,7 @@ def apply_rise_fall_envelope() -> None:
     
     in_filename = get_filename(True)
     out_filename = get_filename(False)
-    wave = BaseWave(filename = in_filename)
-    audio_rise_fall_envelope(wave._data)
-    wave.write_wave_file(out_filename)
+    write_envelope(1, in_filename, out_filename)
 
 def apply_adsr_envelope() -> None:
     """! This function applies the ADSR envelope to an input wave sound.
@@ -201,8 +275,21 @@ def apply_adsr_envelope() -> None:
     
     in_filename = get_filename(True)
     out_filename = get_filename(False)
+    write_envelope(2, in_filename, out_filename)
+
+def write_envelope(envelope_type: int, in_filename: str, out_filename: Union[str, BinaryIO]) -> None:
+    """! This function applies an envelope to a wave file.
+    
+    @param envelope_type 1: rise-fall envelope, 2: ADSR envelope.
+    
+    @param in_filename The input wave file.
+    
+    @param out_filename The output wave file, or a binary output stream.
+    """
+    
     wave = BaseWave(filename = in_filename)
-    audio_adsr_envelope(wave._data)
+    if envelope_type == 1: audio_rise_fall_envelope(wave._data)
+    else: audio_adsr_envelope(wave._data)
     wave.write_wave_file(out_filename)
     
 def generate_song() -> None:
@@ -213,49 +300,808 @@ def generate_song() -> None:
     
     in_filename = get_filename(True)
     out_filename = get_filename(False)
-    wave = Song(in_filename)
-    wave.write_wave_file(out_filename)
+    write_song(in_filename, out_filename)
 
-def compare_two_wave_files(file1: str, file2: str) -> None:
-    """! This function compares two wave files and reports the differences.
+## The note cache shared by the songs rendered in this process, so that a batch worker process or the render server reuses the notes of its previous songs
+song_note_cache = NoteCache()
+
+def write_song(in_filename: str, out_filename: Union[str, BinaryIO], wavetable_size: int = None, workers: int = 1, shards: int = 1, stream: bool = False, mapped: bool = False, score_cache: bool = False, overview: bool = False) -> None:
+    """! This function renders a simple formatted music sheet to a wave file.
     
-    This function reads the two input wave files and first compares if they have the same number of samples. Then, it compares how many samples differ by more than 0.001, 0.01, 0.1, and 0.2. It reports all the differences. If there is no difference, it reports that the two files are identical.
+    @param in_filename The music sheet file.
     
-    @param file1 The first wave file.
+    @param out_filename The output wave file, or a binary output stream, which the song is streamed to with Song.stream_wave_file() (whatever the render options, and without an overview).
+    
+    @param wavetable_size The wavetable size of the simple waves, or None to synthesize them exactly. Default is None.
+    
+    @param workers The number of threads that synthesize notes. Default is 1.
+    
+    @param shards The number of time shard processes. Default is 1.
+    
+    @param stream Whether to stream the song to the file with Song.stream_wave_file(). Default is False.
+    
+    @param mapped Whether to render the song into a memory-mapped file with Song.map_wave_file(). Default is False.
+    
+    @param score_cache Whether to load the music sheet through its compiled form (see Song.CompiledScore). Default is False.
+    
+    @param overview Whether to build the overview of the wave file while it is written, saved as its sidecar (see WaveIndex.WaveMipmap). Default is False.
+    
+    The notes are rendered through song_note_cache.
+    """
+    
+    mipmap = WaveMipmap() if overview else None
+    if not isinstance(out_filename, str): Song.stream_wave_file(in_filename, out_filename, wavetable_size=wavetable_size, note_cache=song_note_cache, score_cache=score_cache)
+    elif stream: Song.stream_wave_file(in_filename, out_filename, wavetable_size=wavetable_size, note_cache=song_note_cache, overview=mipmap, score_cache=score_cache)
+    elif mapped: Song.map_wave_file(in_filename, out_filename, wavetable_size=wavetable_size, note_cache=song_note_cache, workers=workers, overview=mipmap, score_cache=score_cache)
+    else: Song(in_filename, wavetable_size, song_note_cache, workers, shards, score_cache).write_wave_file(out_filename, mipmap)
+
+def wave_difference_stats(file1: str, file2: str, thresholds: Tuple[float, ...] = (0.001, 0.01, 0.1, 0.2), tolerance: float = None, use_fingerprints: bool = False) -> Dict:
+    """! This function measures the differences between two wave files.
+    
+    This function opens the two wave files with Wave.WaveReader and streams their samples one block at a time. For each block, it computes the absolute differences in one pass and counts how many exceed each threshold. It also accumulates the maximum absolute error, the squared error, and the power of the first file (the reference) to compute the RMS error and the signal-to-noise ratio. If a tolerance is given, it stops after the first block with a difference larger than the tolerance.
+    
+    With fingerprints, it first compares the block hashes of the two files (see WaveIndex.WaveFingerprint, whose sidecars are built on first use) and only decodes the blocks whose hashes differ; the other blocks are identical and only contribute their stored energy. With a tolerance, the fingerprints are built for that tolerance and their quantized hashes are compared instead: the blocks whose quantized hashes match differ by less than the tolerance at every sample, so they are skipped too, and their (small) differences are not included in the counts and errors.
+    
+    @param file1 The first (reference) wave file.
     
     @param file2 The second wave file.
+    
+    @param thresholds The difference thresholds. Default is (0.001, 0.01, 0.1, 0.2).
+    
+    @param tolerance The largest acceptable difference, or None to compare all samples. Default is None.
+    
+    @param use_fingerprints Whether to skip the blocks whose fingerprint hashes match. Default is False.
+    
+    @return A dict with the number of samples of both files ('num_samples'), the number of compared samples ('compared'), the number of samples differing by more than each threshold ('counts'), the maximum absolute error ('max_error'), the RMS error ('rms_error'), the signal-to-noise ratio in dB ('snr'), and whether the comparison stopped early ('stopped').
     """
     
-    print("Comparing " + file1 + " and " + file2)
-    wave1 = BaseWave(filename = file1)
-    wave2 = BaseWave(filename = file2)
-    if len(wave1._data) != len(wave2._data):
-        print("The number of samples does not match: " + str(len(wave1._data)) + " vs " + str(len(wave2._data)))
-    min_num = min(len(wave1._data), len(wave2._data))
-    diffs = { 0.001: 0, 0.01: 0, 0.1: 0, 0.2: 0 }
-    for i in range(min_num):
-        diff = abs(wave1._data[i] - wave2._data[i])
-        for key in diffs.keys():
-            if diff > key: diffs[key] += 1
+    with WaveReader(file1) as wave1, WaveReader(file2) as wave2:
+        min_num = min(wave1.num_samples(), wave2.num_samples())
+        counts = { key: 0 for key in thresholds }
+        max_error = 0
+        squared_error = 0
+        signal_power = 0
+        compared = 0
+        stopped = False
+        if use_fingerprints:
+            fingerprint1, fingerprint2 = WaveFingerprint.of(file1, tolerance=tolerance), WaveFingerprint.of(file2, tolerance=tolerance)
+            differing_blocks = set(fingerprint1.differing_blocks(fingerprint2, quantized=tolerance is not None))
+        for start in range(0, min_num, block_size):
+            count = min(block_size, min_num - start)
+            if use_fingerprints and start // block_size not in differing_blocks:
+                # the block is identical in both files (or within the tolerance)
+                signal_power += fingerprint1.energy[start // block_size]
+                compared += count
+                continue
+            samples1 = wave1.read_samples(start, count)
+            diffs = list(map(abs, map(sub, samples1, wave2.read_samples(start, count))))
+            for key in thresholds:
+                # key < diff, i.e., the sample differs by more than the threshold
+                counts[key] += sum(map(key.__lt__, diffs))
+            max_error = max(max_error, max(diffs))
+            squared_error += sum(map(mul, diffs, diffs))
+            signal_power += sum(map(mul, samples1, samples1))
+            compared += count
+            if tolerance is not None and max_error > tolerance:
+                stopped = True
+                break
+        return {
+            'num_samples': (wave1.num_samples(), wave2.num_samples()),
+            'compared': compared,
+            'counts': counts,
+            'max_error': max_error,
+            'rms_error': sqrt(squared_error / compared) if compared else 0,
+            'snr': 10 * log10(signal_power / squared_error) if squared_error > 0 and signal_power > 0 else inf,
+            'stopped': stopped
+        }
+
+def print_wave_difference_stats(stats: Dict) -> None:
+    """! This function reports the differences measured by wave_difference_stats().
+    
+    @param stats The difference statistics of two wave files.
+    """
+    
+    num_samples1, num_samples2 = stats['num_samples']
+    if num_samples1 != num_samples2:
+        print("The number of samples does not match: " + str(num_samples1) + " vs " + str(num_samples2))
     has_diff = False
-    for key, val in diffs.items():
+    for key, val in stats['counts'].items():
         if val > 0:
             print("Number of samples (> " + str(key) + "): " + str(val))
             has_diff = True
-    if not has_diff: print("Files are identical!")
+    if stats['max_error'] > 0:
+        print("Max abs error: " + str(stats['max_error']) + ", RMS error: " + str(stats['rms_error']) + ", SNR: " + str(stats['snr']) + " dB")
+    if stats['stopped']:
+        print("Stopped after " + str(stats['compared']) + " samples: the tolerance is exceeded")
+    if not has_diff and not stats['stopped'] and num_samples1 == num_samples2: print("Files are identical!")
+
+def wave_files_match(stats: Dict, tolerance: float = None) -> bool:
+    """! This function decides if two wave files pass a comparison.
+    
+    @param stats The difference statistics of the two wave files, see wave_difference_stats().
+    
+    @param tolerance The largest acceptable difference, or None to accept the differences below the smallest threshold of wave_difference_stats() (i.e., the files reported as identical). Default is None.
+    
+    @return True if the files have the same number of samples and no sample differs by more than the tolerance (or than the smallest threshold, without a tolerance).
+    """
+    
+    num_samples1, num_samples2 = stats['num_samples']
+    if num_samples1 != num_samples2 or stats['stopped']:
+        return False
+    return stats['max_error'] <= tolerance if tolerance is not None else not any(stats['counts'].values())
+
+def compare_two_wave_files(file1: str, file2: str, tolerance: float = None, use_fingerprints: bool = False) -> bool:
+    """! This function compares two wave files and reports the differences.
+    
+    This function streams the two input wave files with wave_difference_stats() and first compares if they have the same number of samples. Then, it reports how many samples differ by more than 0.001, 0.01, 0.1, and 0.2, and the maximum absolute error, RMS error, and signal-to-noise ratio. If there is no difference, it reports that the two files are identical.
+    
+    @param file1 The first wave file.
+    
+    @param file2 The second wave file.
+    
+    @param tolerance The largest acceptable difference, after which the comparison stops early, or None to compare all samples. Default is None.
+    
+    @param use_fingerprints Whether to compare the fingerprint sidecars first and only decode the differing blocks. Default is False.
+    
+    @return True if the files match, see wave_files_match().
+    """
+    
+    print("Comparing " + file1 + " and " + file2)
+    stats = wave_difference_stats(file1, file2, tolerance=tolerance, use_fingerprints=use_fingerprints)
+    print_wave_difference_stats(stats)
+    return wave_files_match(stats, tolerance)
+
+def _wave_difference_stats_task(task: Tuple) -> Dict:
+    """! This function runs wave_difference_stats() on a (file1, file2, tolerance) tuple in a worker process.
+    
+    @param task The two wave files and the tolerance.
+    
+    @return The difference statistics of the two wave files.
+    """
+    
+    file1, file2, tolerance = task
+    return wave_difference_stats(file1, file2, tolerance=tolerance)
+
+def compare_wave_directories(dir1: str, dir2: str, tolerance: float = None, workers: int = None) -> Dict[str, Dict]:
+    """! This function compares the wave files with the same name in two directories.
+    
+    The file pairs are compared in parallel on a process pool, and the differences of each pair are reported in name order. A wave file found in only one of the directories is reported as missing from the other one.
+    
+    @param dir1 The first (reference) directory.
+    
+    @param dir2 The second directory.
+    
+    @param tolerance The largest acceptable difference, after which the comparison of a pair stops early, or None to compare all samples. Default is None.
+    
+    @param workers The number of worker processes. Default is None, i.e., the number of processors.
+    
+    @return The difference statistics of each file pair, by file name, with None for the files missing from one of the directories.
+    """
+    
+    names1 = set(name for name in listdir(dir1) if name.endswith(".wav") and isfile(join(dir1, name)))
+    names2 = set(name for name in listdir(dir2) if name.endswith(".wav") and isfile(join(dir2, name)))
+    names = sorted(names1 & names2)
+    tasks = [(join(dir1, name), join(dir2, name), tolerance) for name in names]
+    with ProcessPoolExecutor(workers) as pool:
+        results = dict(zip(names, pool.map(_wave_difference_stats_task, tasks)))
+    for name in names:
+        print("Comparing " + join(dir1, name) + " and " + join(dir2, name))
+        print_wave_difference_stats(results[name])
+    for name in sorted(names1 - names2):
+        print("Missing: " + join(dir2, name))
+        results[name] = None
+    for name in sorted(names2 - names1):
+        print("Missing: " + join(dir1, name))
+        results[name] = None
+    return results
+
+def _render_song_command(input: str, output: Union[str, BinaryIO], wavetable_size: int, workers: int, shards: int, stream: bool, mapped: bool, score_cache: bool, overview: bool) -> None:
+    """! The render-song subcommand: renders a music sheet with write_song()."""
+    
+    write_song(input, output, wavetable_size, workers, shards, stream, mapped, score_cache, overview)
+
+def _tone_command(wave_type: str, num_samples: int, frequency: float, output: Union[str, BinaryIO]) -> None:
+    """! The tone subcommand: writes a waveform with write_waveform()."""
+    
+    write_waveform(WAVE_TYPES.index(wave_type) + 1, num_samples, frequency, output)
+
+def _envelope_command(envelope_type: str, input: str, output: Union[str, BinaryIO]) -> None:
+    """! The envelope subcommand: applies an envelope with write_envelope()."""
+    
+    write_envelope(ENVELOPE_TYPES.index(envelope_type) + 1, input, output)
+
+def _stereo_command(input: str, angle: float, output: Union[str, BinaryIO]) -> None:
+    """! The stereo subcommand: pans a mono wave file with write_stereo()."""
+    
+    write_stereo(input, angle, output)
+
+def _compare_command(file1: str, file2: str, tolerance: float, fingerprints: bool) -> bool:
+    """! The compare subcommand: compares two wave files with compare_two_wave_files(), and fails if they do not match."""
+    
+    return compare_two_wave_files(file1, file2, tolerance, fingerprints)
+
+## The wave types of the tone subcommand, in create_waveform() order
+WAVE_TYPES = ('sine', 'square', 'sawtooth', 'complex', 'string')
+## The envelope types of the envelope subcommand, in write_envelope() order
+ENVELOPE_TYPES = ('rise-fall', 'adsr')
+## The subcommands by name: (function, help, positional arguments, options). A function returns False if its check fails (e.g., compare), and None otherwise. A positional argument is (name, type, help, choices), and an option is (name, type, default, help), where a bool option is a flag. The names are the function parameters.
+COMMANDS = {
+    'render-song': (_render_song_command, "render a music sheet to a wave file",
+        [('input', str, "the music sheet file", None), ('output', str, "the output wave file", None)],
+        [('wavetable_size', int, None, "the wavetable size of the simple waves (default: exact synthesis)"),
+         ('workers', int, 1, "the number of note synthesis threads"),
+         ('shards', int, 1, "the number of time shard processes"),
+         ('stream', bool, False, "stream the song to the wave file block by block"),
+         ('mapped', bool, False, "render the song into a memory-mapped wave file"),
+         ('score_cache', bool, False, "load the music sheet through its compiled form"),
+         ('overview', bool, False, "save the overview of the wave file (peaks and energy) as its .mip sidecar")]),
+    'tone': (_tone_command, "write a simple waveform to a wave file",
+        [('wave_type', str, "the wave type", WAVE_TYPES), ('num_samples', int, "the number of samples", None), ('frequency', float, "the wave frequency", None), ('output', str, "the output wave file", None)],
+        []),
+    'envelope': (_envelope_command, "apply an envelope to a wave file",
+        [('envelope_type', str, "the envelope type", ENVELOPE_TYPES), ('input', str, "the input wave file", None), ('output', str, "the output wave file", None)],
+        []),
+    'stereo': (_stereo_command, "mix a mono wave file into a stereo wave file",
+        [('input', str, "the input wave file", None), ('angle', float, "the stereo pan angle", None), ('output', str, "the output wave file", None)],
+        []),
+    'compare': (_compare_command, "compare two wave files",
+        [('file1', str, "the first (reference) wave file", None), ('file2', str, "the second wave file", None)],
+        [('tolerance', float, None, "stop at the first block that differs by more than the tolerance"),
+         ('fingerprints', bool, False, "only decode the blocks whose fingerprints differ")])
+}
+
+def build_argument_parser() -> ArgumentParser:
+    """! This function builds the command line parser of the subcommands in COMMANDS and of the batch subcommand.
+    
+    @return The command line parser.
+    """
+    
+    parser = ArgumentParser(prog="main.py", description="Project 1 audio processing. Run without arguments for the interactive menu.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command, (_, command_help, arguments, options) in COMMANDS.items():
+        subparser = subparsers.add_parser(command, help=command_help)
+        for name, value_type, value_help, choices in arguments:
+            subparser.add_argument(name, type=value_type, help=value_help, choices=choices)
+        for name, value_type, default, value_help in options:
+            flag = '--' + name.replace('_', '-')
+            if value_type is bool: subparser.add_argument(flag, action='store_true', help=value_help)
+            else: subparser.add_argument(flag, type=value_type, default=default, help=value_help)
+    subparser = subparsers.add_parser('serve', help="run a local render server")
+    subparser.add_argument('--host', type=loopback_host, default='127.0.0.1', help="the loopback address to listen on (default: 127.0.0.1)")
+    subparser.add_argument('--port', type=int, default=8765, help="the port to listen on (default: 8765)")
+    subparser.add_argument('--workers', type=int, default=2, help="the number of worker threads (default: 2)")
+    subparser.add_argument('--queue-size', type=int, default=8, help="the number of jobs that can wait for a worker (default: 8)")
+    subparser.add_argument('--root', default='.', help="the directory that the job files must be in (default: the current directory)")
+    subparser = subparsers.add_parser('batch', help="run the jobs of a JSON or CSV job manifest on a process pool")
+    subparser.add_argument('manifest', help="the JSON or CSV job manifest")
+    subparser.add_argument('--workers', type=int, default=None, help="the number of worker processes (default: the number of processors)")
+    subparser.add_argument('--force', action='store_true', help="run the jobs whose outputs are up to date too")
+    return parser
+
+def read_job_manifest(filename: str) -> List[Dict]:
+    """! This function reads the jobs of a job manifest.
+    
+    A manifest ending with .csv is read as a CSV file with a header row, and any other manifest as JSON: a list of jobs or an object with a "jobs" list.
+    
+    @param filename The job manifest.
+    
+    @return The jobs, as dicts of field values.
+    """
+    
+    with open(filename, 'r', newline='') as in_file:
+        if filename.lower().endswith(".csv"):
+            return list(DictReader(in_file))
+        jobs = load(in_file)
+    return jobs['jobs'] if isinstance(jobs, dict) else jobs
+
+def job_arguments(job: Dict) -> Tuple[str, Dict]:
+    """! This function converts the fields of a job to the arguments of its subcommand.
+    
+    The fields are converted to the argument types of the subcommand (a flag is set by true, 1, or yes), and missing or empty option fields take their defaults.
+    
+    @param job The job fields.
+    
+    @return The subcommand name and its arguments, by name.
+    """
+    
+    command = job.get('command')
+    if command not in COMMANDS:
+        raise ValueError("Unknown command: " + str(command))
+    _, _, arguments, options = COMMANDS[command]
+    kwargs = {}
+    for name, value_type, _, choices in arguments:
+        if job.get(name) in (None, ''):
+            raise ValueError("Missing argument of " + command + ": " + name)
+        kwargs[name] = value_type(job[name])
+        if choices is not None and kwargs[name] not in choices:
+            raise ValueError("Invalid " + name + " of " + command + ": " + str(job[name]))
+    for name, value_type, default, _ in options:
+        value = job.get(name)
+        if value in (None, ''): kwargs[name] = default
+        elif value_type is bool: kwargs[name] = value if isinstance(value, bool) else str(value).strip().lower() in ('1', 'true', 'yes')
+        else: kwargs[name] = value_type(value)
+    return command, kwargs
+
+## The file name suffix of the stamp file of a job output
+JOB_STAMP_SUFFIX = ".job"
+
+def job_stamp(command: str, kwargs: Dict) -> str:
+    """! This function computes the stamp of a job, a hash of its subcommand and of all its arguments and options.
+    
+    @param command The subcommand name.
+    
+    @param kwargs The subcommand arguments of the job.
+    
+    @return The stamp, as a hexadecimal string.
+    """
+    
+    return blake2b(dumps([command, kwargs], sort_keys=True).encode(), digest_size=16).hexdigest()
+
+def is_job_up_to_date(command: str, kwargs: Dict) -> bool:
+    """! This function checks if the output of a job is up to date.
+    
+    The output is up to date if it exists, its stamp file (see job_stamp()) shows that it was written by a job with the same arguments and options, and it is not older than the job input, if any. A job without an output (e.g., compare) is never up to date.
+    
+    @param command The subcommand name.
+    
+    @param kwargs The subcommand arguments of the job.
+    
+    @return True if the job can be skipped.
+    """
+    
+    output = kwargs.get('output')
+    if output is None or not isfile(output) or not isfile(output + JOB_STAMP_SUFFIX):
+        return False
+    with open(output + JOB_STAMP_SUFFIX, 'r') as stamp_file:
+        if stamp_file.read().strip() != job_stamp(command, kwargs):
+            return False
+    return 'input' not in kwargs or getmtime(kwargs['input']) <= getmtime(output)
+
+def run_job(job: Dict, force: bool = False) -> Dict:
+    """! This function runs one job of a job manifest.
+    
+    The job output printed by the subcommand is captured instead of printed, and any error is reported in the result instead of raised, so the other jobs keep running. The stamp file of the job output is removed before the job runs and written once it is done.
+    
+    @param job The job fields.
+    
+    @param force Whether to run the job even if its output is up to date. Default is False.
+    
+    @return A dict with the subcommand ('command'), the job output file or None ('output'), the status ('done', 'skipped', or 'failed'), the error message or None ('error'), the elapsed seconds ('seconds'), and the printed text ('log').
+    """
+    
+    result = { 'command': job.get('command'), 'output': job.get('output') or None, 'status': 'done', 'error': None, 'seconds': 0, 'log': '' }
+    start = perf_counter()
+    log = StringIO()
+    try:
+        command, kwargs = job_arguments(job)
+        output = kwargs.get('output')
+        if not force and is_job_up_to_date(command, kwargs):
+            result['status'] = 'skipped'
+        else:
+            if output is not None and isfile(output + JOB_STAMP_SUFFIX):
+                remove(output + JOB_STAMP_SUFFIX)
+            with redirect_stdout(log):
+                passed = COMMANDS[command][0](**kwargs)
+            if passed is False:
+                result['status'] = 'failed'
+                result['error'] = "The " + command + " check failed"
+            elif output is not None:
+                with open(output + JOB_STAMP_SUFFIX, 'w') as stamp_file:
+                    stamp_file.write(job_stamp(command, kwargs) + "\n")
+    except Exception as error:
+        result['status'] = 'failed'
+        result['error'] = type(error).__name__ + ": " + str(error)
+    result['seconds'] = perf_counter() - start
+    result['log'] = log.getvalue()
+    return result
+
+def _run_job_task(task: Tuple) -> Dict:
+    """! This function runs run_job() on a (job, force) tuple in a worker process.
+    
+    @param task The job fields and whether to force the job.
+    
+    @return The result of the job.
+    """
+    
+    job, force = task
+    return run_job(job, force)
+
+def run_job_manifest(filename: str, workers: int = None, force: bool = False) -> List[Dict]:
+    """! This function runs the jobs of a job manifest on a process pool and prints a summary.
+    
+    The jobs run in parallel, and their printed text, status, and time are reported in manifest order once all jobs are finished.
+    
+    @param filename The JSON or CSV job manifest.
+    
+    @param workers The number of worker processes. Default is None, i.e., the number of processors.
+    
+    @param force Whether to run the jobs whose outputs are up to date too. Default is False.
+    
+    @return The results of the jobs (see run_job()), in manifest order.
+    """
+    
+    jobs = read_job_manifest(filename)
+    start = perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(_run_job_task, [(job, force) for job in jobs]))
+    elapsed = perf_counter() - start
+    for result in results:
+        print(result['log'], end="")
+    print("%-5s %-12s %-9s %9s  %s" % ("Job", "Command", "Status", "Seconds", "Output"))
+    for index, result in enumerate(results, 1):
+        print("%-5d %-12s %-9s %9.2f  %s" % (index, result['command'], result['status'], result['seconds'], result['error'] or result['output'] or ""))
+    statuses = [result['status'] for result in results]
+    print(str(len(results)) + " jobs (" + ", ".join(str(statuses.count(status)) + " " + status for status in ('done', 'skipped', 'failed')) + ") in " + "%.2f" % elapsed + " seconds")
+    return results
+
+def loopback_host(host: str) -> str:
+    """! This function checks that the render server listens on a loopback address.
+    
+    @param host The address to listen on.
+    
+    @return The address.
+    
+    @exception ValueError The address is not localhost or a loopback IP address (e.g., 0.0.0.0 would let anyone on the network run jobs).
+    """
+    
+    try:
+        if host == 'localhost' or ip_address(host).is_loopback:
+            return host
+    except ValueError:
+        pass
+    raise ValueError("The render server only listens on a loopback address, not " + host)
+
+## The job fields that name a file, which the render server resolves under its root directory
+SERVER_PATH_FIELDS = ('input', 'output', 'file1', 'file2')
+
+def resolve_server_path(root: str, path: str) -> str:
+    """! This function resolves a file of a render server job under the server root directory.
+    
+    @param root The root directory.
+    
+    @param path The file path, relative to the root directory.
+    
+    @return The real path of the file.
+    
+    @exception ValueError The file is outside of the root directory (e.g., an absolute path, a path with .. components, or a symbolic link that leaves the root).
+    """
+    
+    root = realpath(root)
+    full_path = realpath(join(root, path))
+    if commonpath([root, full_path]) != root:
+        raise ValueError("The file is outside of the server root: " + path)
+    return full_path
+
+def run_server_job(job: Dict, root: str = '.', stream: BinaryIO = None) -> Union[Tuple[str, bytes], None]:
+    """! This function runs a job posted to the render server.
+    
+    The files of the job are resolved under the root directory (see resolve_server_path()). A job without an output file writes its wave file to **stream** (a song is rendered block by block with Song.stream_wave_file(), i.e., with a Wave.WaveWriter in streaming mode), so the wave file is neither stored nor held in memory. A compare job returns its difference statistics (see wave_difference_stats()) instead of printing them.
+    
+    @param job The job fields.
+    
+    @param root The root directory of the job files. Default is the current directory.
+    
+    @param stream The binary output stream of a job without an output file. Default is None.
+    
+    @return The content type and the content of the response (a JSON object with the output file or the difference statistics), or None if the wave file was written to **stream**.
+    """
+    
+    job = dict(job)
+    output = job.get('output')
+    for name in SERVER_PATH_FIELDS:
+        if job.get(name) not in (None, ''):
+            job[name] = resolve_server_path(root, str(job[name]))
+    streamed = job.get('command') != 'compare' and output in (None, '')
+    if streamed:
+        if stream is None:
+            raise ValueError("A job without an output file needs an output stream")
+        # a placeholder for the required output argument, replaced by the stream
+        job['output'] = '-'
+    command, kwargs = job_arguments(job)
+    if command == 'compare':
+        stats = wave_difference_stats(kwargs['file1'], kwargs['file2'], tolerance=kwargs['tolerance'], use_fingerprints=kwargs['fingerprints'])
+        stats['counts'] = { str(key): val for key, val in stats['counts'].items() }
+        stats['snr'] = None if stats['snr'] == inf else stats['snr']
+        return 'application/json', dumps(stats).encode()
+    if streamed:
+        kwargs['output'] = stream
+    COMMANDS[command][0](**kwargs)
+    if streamed:
+        return None
+    return 'application/json', dumps({ 'output': output }).encode()
+
+class RenderServer(ThreadingHTTPServer):
+    """! The render server.
+    
+    It is a local HTTP server that runs the posted jobs (see RenderRequestHandler) on a pool of worker threads. The songs rendered by the workers share song_note_cache, which stays warm from one request to the next. At most **workers** jobs run at once and at most **queue_size** more wait for a worker; further jobs are rejected until a slot is free. The files of the jobs are resolved under the **root** directory. The server only listens on a loopback address (see loopback_host()).
+    """
+    
+    ## The request threads do not keep the server alive
+    daemon_threads = True
+    
+    def __init__(self, address: Tuple[str, int], workers: int = 2, queue_size: int = 8, root: str = '.') -> None:
+        """! The RenderServer class initializer.
+        
+        @param address The loopback host and the port to listen on.
+        
+        @param workers The number of worker threads. Default is 2.
+        
+        @param queue_size The number of jobs that can wait for a worker. Default is 8.
+        
+        @param root The root directory of the job files. Default is the current directory.
+        
+        @exception ValueError The host is not a loopback address.
+        """
+        
+        loopback_host(address[0])
+        super().__init__(address, RenderRequestHandler)
+        port = self.server_address[1]
+        ## The accepted values of the Host header of the requests: the loopback names, with the port
+        self.allowed_hosts = set(host + ":" + str(port) for host in ('127.0.0.1', 'localhost', '[::1]'))
+        ## The root directory of the job files
+        self.root = realpath(root)
+        ## The worker threads that run the jobs
+        self._pool = ThreadPoolExecutor(workers)
+        ## The slots of the running and waiting jobs
+        self._slots = BoundedSemaphore(workers + queue_size)
+        ## The lock that serializes the counter updates
+        self._lock = Lock()
+        ## The number of running and waiting jobs
+        self.pending = 0
+        ## The number of finished jobs
+        self.completed = 0
+        ## The number of jobs that raised an error
+        self.failed = 0
+        ## The number of jobs rejected because the queue was full
+        self.rejected = 0
+        
+    def submit(self, job: Dict, stream: BinaryIO = None) -> Future:
+        """! Queue a job on the worker threads.
+        
+        @param job The job fields.
+        
+        @param stream The output stream of a job without an output file, see run_server_job(). Default is None.
+        
+        @return The future of the job result (see run_server_job()), or None if the queue is full.
+        """
+        
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return None
+        with self._lock:
+            self.pending += 1
+        future = self._pool.submit(run_server_job, job, self.root, stream)
+        future.add_done_callback(self._job_done)
+        return future
+        
+    def _job_done(self, future: Future) -> None:
+        """! Release the slot of a finished job and count it.
+        
+        @param future The future of the job.
+        """
+        
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.failed += future.exception() is not None
+        self._slots.release()
+        
+    def status(self) -> Dict:
+        """! The server status.
+        
+        @return A dict with the job counters ('pending', 'completed', 'failed', and 'rejected') and the note cache statistics ('note_cache': 'notes', 'nbytes', 'hits', and 'misses').
+        """
+        
+        with self._lock:
+            status = { 'pending': self.pending, 'completed': self.completed, 'failed': self.failed, 'rejected': self.rejected }
+        status['note_cache'] = { 'notes': len(song_note_cache), 'nbytes': song_note_cache.nbytes(), 'hits': song_note_cache.hits, 'misses': song_note_cache.misses }
+        return status
+        
+    def server_close(self) -> None:
+        """! Close the server socket and wait for the running jobs."""
+        
+        super().server_close()
+        self._pool.shutdown()
+
+class _ResponseStream:
+    """! The output stream of a streamed wave file response of RenderRequestHandler.
+    
+    It is not seekable, so a Wave.WaveWriter writes a streaming header. The response status and headers are sent with the first write, so a job that fails before writing its wave file still gets an error response.
+    """
+    
+    def __init__(self, handler: BaseHTTPRequestHandler) -> None:
+        """! The _ResponseStream class initializer.
+        
+        @param handler The request handler.
+        """
+        
+        ## The request handler
+        self._handler = handler
+        ## Whether the response status and headers were sent
+        self.started = False
+        
+    def seekable(self) -> bool:
+        """! The stream is not seekable.
+        
+        @return False.
+        """
+        
+        return False
+        
+    def write(self, data: bytes) -> int:
+        """! Write data to the response body, after the response status and headers if they were not sent yet.
+        
+        @param data The data.
+        
+        @return The number of bytes written.
+        """
+        
+        if not self.started:
+            self.started = True
+            # the length is unknown: the body ends when the connection is closed
+            self._handler.close_connection = True
+            self._handler.send_response(200)
+            self._handler.send_header('Content-Type', 'audio/wav')
+            self._handler.send_header('Connection', 'close')
+            self._handler.end_headers()
+        return self._handler.wfile.write(data)
+        
+    def flush(self) -> None:
+        """! Flush the response body."""
+        
+        self._handler.wfile.flush()
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """! The request handler of RenderServer.
+    
+    POST / runs the job of the JSON object in the request body, and GET /status responds with RenderServer.status(). A request whose Host header is not one of RenderServer.allowed_hosts responds with status 403, a POST whose content type is not application/json with status 415, a POST whose Content-Length is missing or invalid with status 400, and a POST larger than max_job_size with status 413 (before its body is read). A job with invalid fields (including a file outside of the server root) responds with status 400, a job that fails otherwise with status 500, and a job rejected because the queue is full with status 503, each with a JSON object holding the error. A job without an output file streams its wave file as the response body; if it fails after the wave file started, the connection is closed and the body is cut short.
+    """
+    
+    ## The largest accepted job, in bytes
+    max_job_size = 64 * 1024
+    
+    def _check_host(self) -> bool:
+        """! Check the Host header of the request, and respond with status 403 if the host is not allowed.
+        
+        @return True if the host is allowed.
+        """
+        
+        if self.headers.get('Host') in self.server.allowed_hosts:
+            return True
+        self._respond_error(403, "Forbidden host: " + str(self.headers.get('Host')))
+        return False
+        
+    def do_GET(self) -> None:
+        """! Respond with the server status."""
+        
+        if not self._check_host():
+            return
+        if self.path == '/status':
+            self._respond(200, 'application/json', dumps(self.server.status()).encode())
+        else:
+            self._respond_error(404, "Not found: " + self.path)
+            
+    def do_POST(self) -> None:
+        """! Run a job and respond with its result."""
+        
+        if not self._check_host():
+            return
+        if self.headers.get('Content-Type', '').split(';')[0].strip().lower() != 'application/json':
+            self._respond_error(415, "A job must be posted as application/json")
+            return
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._respond_error(400, "A job must have a valid Content-Length")
+            return
+        if length > self.max_job_size:
+            self._respond_error(413, "A job must not be larger than " + str(self.max_job_size) + " bytes")
+            return
+        try:
+            job = loads(self.rfile.read(length))
+            if not isinstance(job, dict):
+                raise ValueError("A job must be a JSON object")
+        except ValueError as error:
+            self._respond_error(400, "Invalid job: " + str(error))
+            return
+        start = perf_counter()
+        stream = _ResponseStream(self)
+        future = self.server.submit(job, stream)
+        if future is None:
+            self._respond_error(503, "The render queue is full")
+            return
+        try:
+            result = future.result()
+        except Exception as error:
+            if stream.started:
+                # the wave file is cut short by closing the connection
+                self.log_error("Job failed while streaming: %s", error)
+            elif isinstance(error, ValueError):
+                self._respond_error(400, type(error).__name__ + ": " + str(error))
+            else:
+                self._respond_error(500, type(error).__name__ + ": " + str(error))
+            return
+        if result is not None:
+            content_type, content = result
+            self._respond(200, content_type, content, perf_counter() - start)
+        
+    def _respond(self, code: int, content_type: str, content: bytes, seconds: float = None) -> None:
+        """! Send a response.
+        
+        @param code The HTTP status code.
+        
+        @param content_type The content type.
+        
+        @param content The content.
+        
+        @param seconds The job time, sent in the X-Render-Seconds header, or None. Default is None.
+        """
+        
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        if seconds is not None:
+            self.send_header('X-Render-Seconds', "%.6f" % seconds)
+        self.end_headers()
+        self.wfile.write(content)
+        
+    def _respond_error(self, code: int, message: str) -> None:
+        """! Send an error response.
+        
+        @param code The HTTP status code.
+        
+        @param message The error message.
+        """
+        
+        self._respond(code, 'application/json', dumps({ 'error': message }).encode())
+
+def serve(host: str = '127.0.0.1', port: int = 8765, workers: int = 2, queue_size: int = 8, root: str = '.') -> None:
+    """! This function runs the render server until it is interrupted.
+    
+    @param host The loopback address to listen on. Default is 127.0.0.1.
+    
+    @param port The port to listen on. Default is 8765.
+    
+    @param workers The number of worker threads. Default is 2.
+    
+    @param queue_size The number of jobs that can wait for a worker. Default is 8.
+    
+    @param root The root directory of the job files. Default is the current directory.
+    """
+    
+    with RenderServer((host, port), workers, queue_size, root) as server:
+        print("Serving on http://" + host + ":" + str(server.server_address[1]) + "/", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
 def main() -> None:
     """! Project 1 Main Program
     
-    This is the main program of Project 1. It has the following two usages:
+    This is the main program of Project 1. It has the following three usages:
     
-        python main.py    and    python main.py wave_file_1 wave_file 2
+        python main.py    and    python main.py wave_file_1 wave_file 2    and    python main.py subcommand ...
         
-    When it takes no command line arguments, it runs print_main_menu() and creates wave files according to the user's choices. On the other hand, when it takes two command line arguments, it assumes the two inputs are two wave filenames, and the program will compare the two files by calling compare_two_wave_files(). Otherwise, this function will print the program usage.
+    When it takes no command line arguments, it runs print_main_menu() and creates wave files according to the user's choices. On the other hand, when it takes two command line arguments, it assumes the two inputs are two wave filenames, and the program will compare the two files by calling compare_two_wave_files(). If the two inputs are directories, it compares the wave files with the same name in both by calling compare_wave_directories(). A comparison exits with status 1 if the files differ (or exceed the tolerance of the compare subcommand), or if a wave file is missing from one of the directories. When the first argument is a subcommand (see COMMANDS), batch, or serve, it parses the arguments with build_argument_parser() and runs the subcommand, the job manifest (a batch with failed jobs exits with status 1), or the render server. Otherwise, this function will print the program usage.
     """
     
     args = argv[1:]
-    if len(args) == 0:
+    if len(args) > 0 and (args[0] in COMMANDS or args[0] in ('batch', 'serve', '-h', '--help')):
+        options = vars(build_argument_parser().parse_args(args))
+        command = options.pop('command')
+        if command == 'batch':
+            results = run_job_manifest(options['manifest'], options['workers'], options['force'])
+            if any(result['status'] == 'failed' for result in results):
+                raise SystemExit(1)
+        elif command == 'serve':
+            serve(options['host'], options['port'], options['workers'], options['queue_size'], options['root'])
+        elif COMMANDS[command][0](**options) is False:
+            raise SystemExit(1)
+    elif len(args) == 0:
         main_option = 0
         while main_option < 1 or main_option > 9:
             try:
@@ -275,10 +1121,17 @@ def main() -> None:
     elif len(args) == 2:
         file1 = args[0]
         file2 = args[1]
-        if ".wav" in file1 and ".wav" in file2:
-            compare_two_wave_files(file1, file2)
+        if isdir(file1) and isdir(file2):
+            results = compare_wave_directories(file1, file2)
+            if not all(stats is not None and wave_files_match(stats) for stats in results.values()):
+                raise SystemExit(1)
+        elif ".wav" in file1 and ".wav" in file2:
+            if not compare_two_wave_files(file1, file2):
+                raise SystemExit(1)
     else:
         print("\nTo compare two wave files: python main.py wave_file_1 wave_file_2")
+        print("To compare the wave files of two directories: python main.py directory_1 directory_2")
+        print("To run a subcommand or a job manifest: python main.py {" + ",".join(COMMANDS) + ",batch,serve} ... (see python main.py -h)")
         print("\n\tOR\n")
         print("To test audio processing: python main.py\n")
 
@@ -0,0 +1,52 @@
+"""! @brief The shared test fixtures.
+"""
+
+##
+# @file conftest.py
+#
+# @brief This file defines the fixtures shared by the tests.
+#
+# @section description_conftest Description
+# The tests import the project modules from the repository root and compare the rendered wave files against the reference wave files in doc/html/rss.
+#
+# @section libraries_conftest Libraries/Modules
+# - sys, os.path, and shutil (from the standard library)
+#   - access to path, dirname, abspath, join, and copy
+# - pytest
+#   - access to fixture
+#
+# Copyright (c) 2023 Bucknell University. All rights reserved.
+
+import sys
+from os.path import dirname, abspath, join
+from shutil import copy
+import pytest
+
+## The repository root directory
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+## The directory of the reference wave files
+REFERENCE_DIR = join(ROOT, "doc", "html", "rss")
+## The directory of the music scores
+SONGS_DIR = join(ROOT, "songs")
+
+def reference_bytes(name: str) -> bytes:
+    """! Read a reference wave file.
+
+    @param name The wave filename in doc/html/rss.
+
+    @return The content of the wave file.
+    """
+
+    with open(join(REFERENCE_DIR, name), 'rb') as in_file:
+        return in_file.read()
+
+@pytest.fixture
+def score(tmp_path) -> str:
+    """! A copy of songs/simple.txt in a temporary directory, so that its sidecars (e.g., the compiled score) stay out of the repository.
+
+    @return The path of the copy.
+    """
+
+    return copy(join(SONGS_DIR, "simple.txt"), str(tmp_path / "simple.txt"))
@@ -0,0 +1,122 @@
+"""! @brief The batch job tests.
+"""
+
+##
+# @file test_batch.py
+#
+# @brief This file tests the job manifests of the batch subcommand in main.py.
+#
+# @section description_test_batch Description
+# JSON and CSV manifests must be read into the same jobs. A batch run writes the outputs of its jobs with their .job stamps, skips the jobs whose outputs are up to date on the next run, reports the failed jobs in its summary, and makes main() exit with status 1.
+#
+# @section libraries_test_batch Libraries/Modules
+# - json, os, and os.path (from the standard library)
+#   - access to dump, utime, stat, join, and isfile
+# - pytest
+#   - access to raises
+# - main
+#
+# Copyright (c) 2023 Bucknell University. All rights reserved.
+
+from json import dump
+from os import utime, stat
+from os.path import join, isfile
+import pytest
+from conftest import REFERENCE_DIR
+import main
+from main import read_job_manifest, job_arguments, is_job_up_to_date, run_job_manifest, JOB_STAMP_SUFFIX
+
+def _jobs(directory) -> list:
+    """! The jobs of the test manifests: a tone, an envelope of a reference wave file, and a failing comparison.
+
+    @param directory The directory of the job outputs.
+
+    @return The jobs, as dicts of string fields (as read from a CSV manifest).
+    """
+
+    return [
+        { 'command': 'tone', 'wave_type': 'sine', 'num_samples': '1000', 'frequency': '440', 'output': str(directory / "tone.wav") },
+        { 'command': 'envelope', 'envelope_type': 'rise-fall', 'input': join(REFERENCE_DIR, "sine_c.wav"), 'output': str(directory / "rise_fall.wav") },
+        { 'command': 'compare', 'file1': join(REFERENCE_DIR, "sine_c.wav"), 'file2': join(REFERENCE_DIR, "sine_c_rf.wav") }
+    ]
+
+def _write_csv(filename: str, jobs: list) -> None:
+    """! Write jobs to a CSV manifest, with a header row of all their fields.
+
+    @param filename The manifest filename.
+
+    @param jobs The jobs.
+    """
+
+    fields = ['command', 'wave_type', 'num_samples', 'frequency', 'envelope_type', 'input', 'file1', 'file2', 'output']
+    with open(filename, 'w') as out_file:
+        out_file.write(",".join(fields) + "\n")
+        for job in jobs:
+            out_file.write(",".join(job.get(field, '') for field in fields) + "\n")
+
+def test_json_and_csv_manifests(tmp_path):
+    """! A JSON list, a JSON object with a jobs list, and a CSV manifest are read into the same jobs."""
+
+    jobs = _jobs(tmp_path)
+    with open(str(tmp_path / "list.json"), 'w') as out_file:
+        dump(jobs, out_file)
+    with open(str(tmp_path / "object.json"), 'w') as out_file:
+        dump({ 'jobs': jobs }, out_file)
+    _write_csv(str(tmp_path / "jobs.csv"), jobs)
+    assert read_job_manifest(str(tmp_path / "list.json")) == jobs
+    assert read_job_manifest(str(tmp_path / "object.json")) == jobs
+    csv_jobs = read_job_manifest(str(tmp_path / "jobs.csv"))
+    assert [job_arguments(job) for job in csv_jobs] == [job_arguments(job) for job in jobs]
+
+def test_batch_skips_up_to_date_jobs(tmp_path, capsys):
+    """! A batch run stamps the outputs of its jobs, and the next run skips them; the failed comparison is reported in both summaries."""
+
+    manifest = str(tmp_path / "jobs.csv")
+    _write_csv(manifest, _jobs(tmp_path))
+    results = run_job_manifest(manifest, workers=1)
+    assert [result['status'] for result in results] == ['done', 'done', 'failed']
+    assert results[2]['error'] == "The compare check failed"
+    assert isfile(str(tmp_path / "tone.wav") + JOB_STAMP_SUFFIX) and isfile(str(tmp_path / "rise_fall.wav") + JOB_STAMP_SUFFIX)
+    assert "3 jobs (2 done, 0 skipped, 1 failed)" in capsys.readouterr().out
+    results = run_job_manifest(manifest, workers=1)
+    assert [result['status'] for result in results] == ['skipped', 'skipped', 'failed']
+    assert "3 jobs (0 done, 2 skipped, 1 failed)" in capsys.readouterr().out
+    results = run_job_manifest(manifest, workers=1, force=True)
+    assert [result['status'] for result in results] == ['done', 'done', 'failed']
+
+def test_job_up_to_date(tmp_path):
+    """! An output is up to date only if its stamp matches the job arguments and it is not older than the job input."""
+
+    source = str(tmp_path / "source.wav")
+    tone = _jobs(tmp_path)[0]
+    command, kwargs = job_arguments(dict(tone, output=source))
+    assert not is_job_up_to_date(command, kwargs)
+    manifest = str(tmp_path / "jobs.json")
+    envelope = { 'command': 'envelope', 'envelope_type': 'adsr', 'input': source, 'output': str(tmp_path / "adsr.wav") }
+    with open(manifest, 'w') as out_file:
+        dump([dict(tone, output=source)], out_file)
+    run_job_manifest(manifest, workers=1)
+    with open(manifest, 'w') as out_file:
+        dump([envelope], out_file)
+    run_job_manifest(manifest, workers=1)
+    assert is_job_up_to_date(command, kwargs)
+    assert not is_job_up_to_date(command, dict(kwargs, frequency=880.0))
+    command, kwargs = job_arguments(envelope)
+    assert is_job_up_to_date(command, kwargs)
+    # the input is modified after the output was written
+    output_time = stat(kwargs['output']).st_mtime_ns
+    utime(source, ns=(output_time + 10 ** 9, output_time + 10 ** 9))
+    assert not is_job_up_to_date(command, kwargs)
+
+def test_batch_failure_exit_status(tmp_path, monkeypatch, capsys):
+    """! main() exits with status 1 after a batch with a failed job, which includes a job with missing arguments."""
+
+    manifest = str(tmp_path / "jobs.json")
+    with open(manifest, 'w') as out_file:
+        dump({ 'jobs': _jobs(tmp_path)[:1] + [{ 'command': 'tone', 'wave_type': 'sine' }] }, out_file)
+    monkeypatch.setattr(main, 'argv', ['main.py', 'batch', manifest, '--workers', '1'])
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 1
+    out = capsys.readouterr().out
+    assert "Missing argument of tone: num_samples" in out and "2 jobs (1 done, 0 skipped, 1 failed)" in out
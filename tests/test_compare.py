@@ -0,0 +1,150 @@
+"""! @brief The wave comparison tests.
+"""
+
+##
+# @file test_compare.py
+#
+# @brief This file tests the streaming comparison of wave files in main.py.
+#
+# @section description_test_compare Description
+# The difference statistics of doc/html/rss/sine_c.wav and its rise-fall version sine_c_rf.wav are checked against the statistics computed from all the samples at once: the threshold counts, the maximum and RMS errors, and the signal-to-noise ratio. The tolerance must stop the comparison early, compare_two_wave_files() must return whether the files match, and compare_wave_directories() must report the files missing from one of the directories. With fingerprints, only the blocks whose hashes differ are decoded, and the blocks within the tolerance of a quantized hash are left out of the counts.
+#
+# @section libraries_test_compare Libraries/Modules
+# - math, os.path, shutil, and struct (from the standard library)
+#   - access to log10, sqrt, inf, join, copy, and pack_into
+# - pytest
+#   - access to approx
+# - Wave, WaveIndex, and main
+#
+# Copyright (c) 2023 Bucknell University. All rights reserved.
+
+from math import log10, sqrt, inf
+from os.path import join
+from shutil import copy
+from struct import pack_into
+import pytest
+from conftest import REFERENCE_DIR
+from Wave import SineWave, WaveReader
+from WaveIndex import WaveFingerprint
+from main import wave_difference_stats, compare_two_wave_files, compare_wave_directories, wave_files_match
+
+## The reference sine wave file
+SINE = join(REFERENCE_DIR, "sine_c.wav")
+## The reference sine wave file with the rise-fall envelope
+SINE_RF = join(REFERENCE_DIR, "sine_c_rf.wav")
+
+def _samples(filename: str) -> list:
+    """! Read all the samples of a wave file.
+
+    @param filename The wave filename.
+
+    @return The samples, as floating-point values in [-1, 1].
+    """
+
+    with WaveReader(filename) as reader:
+        return list(reader.read_samples(0, reader.num_samples()))
+
+def test_identical_files():
+    """! A wave file compared with itself has no difference and matches."""
+
+    stats = wave_difference_stats(SINE, SINE)
+    assert stats['counts'] == { 0.001: 0, 0.01: 0, 0.1: 0, 0.2: 0 }
+    assert (stats['max_error'], stats['rms_error'], stats['snr'], stats['stopped']) == (0, 0, inf, False)
+    assert stats['compared'] == stats['num_samples'][0] == stats['num_samples'][1] == 44100
+    assert compare_two_wave_files(SINE, SINE)
+
+def test_difference_stats_match_full_comparison(capsys):
+    """! The block-wise statistics match the statistics of all the samples, and the files do not match."""
+
+    samples1, samples2 = _samples(SINE), _samples(SINE_RF)
+    diffs = [abs(sample1 - sample2) for sample1, sample2 in zip(samples1, samples2)]
+    squared_error = sum(diff * diff for diff in diffs)
+    stats = wave_difference_stats(SINE, SINE_RF)
+    assert stats['counts'] == { key: sum(diff > key for diff in diffs) for key in (0.001, 0.01, 0.1, 0.2) }
+    assert stats['max_error'] == max(diffs)
+    assert stats['rms_error'] == pytest.approx(sqrt(squared_error / len(diffs)))
+    assert stats['snr'] == pytest.approx(10 * log10(sum(sample * sample for sample in samples1) / squared_error))
+    assert stats['compared'] == len(diffs) and not stats['stopped']
+    assert not compare_two_wave_files(SINE, SINE_RF)
+    assert "Number of samples (> 0.2): " + str(stats['counts'][0.2]) in capsys.readouterr().out
+
+def test_tolerance_stops_early():
+    """! A comparison stops after the first block that exceeds the tolerance, and fails."""
+
+    stats = wave_difference_stats(SINE, SINE_RF, tolerance=0.001)
+    assert stats['stopped'] and 0 < stats['compared'] < 44100
+    assert not wave_files_match(stats, 0.001)
+    # the rise-fall envelope changes the samples by less than 1
+    assert wave_files_match(wave_difference_stats(SINE, SINE_RF, tolerance=1), 1)
+    assert not compare_two_wave_files(SINE, SINE_RF, tolerance=0.001)
+
+def test_directories_report_missing_files(tmp_path, capsys):
+    """! The wave files of two directories are compared by name, and a file found in only one directory is reported as missing."""
+
+    dir1, dir2 = tmp_path / "dir1", tmp_path / "dir2"
+    dir1.mkdir()
+    dir2.mkdir()
+    copy(SINE, str(dir1 / "sine.wav"))
+    copy(SINE, str(dir2 / "sine.wav"))
+    copy(SINE, str(dir1 / "only1.wav"))
+    copy(SINE_RF, str(dir2 / "only2.wav"))
+    results = compare_wave_directories(str(dir1), str(dir2), workers=1)
+    assert sorted(results) == ["only1.wav", "only2.wav", "sine.wav"]
+    assert results["only1.wav"] is None and results["only2.wav"] is None
+    assert wave_files_match(results["sine.wav"])
+    out = capsys.readouterr().out
+    assert "Missing: " + join(str(dir2), "only1.wav") in out and "Missing: " + join(str(dir1), "only2.wav") in out
+
+def _write_modified(filename: str, source: bytes, samples: dict) -> None:
+    """! Write a mono wave file with some of its 16-bit samples replaced.
+
+    @param filename The wave filename.
+
+    @param source The bytes of the original wave file.
+
+    @param samples The new samples, by sample index.
+    """
+
+    data = bytearray(source)
+    offset = data.index(b"data") + 8
+    for index, sample in samples.items():
+        pack_into("<h", data, offset + 2 * index, sample)
+    with open(filename, "wb") as out_file:
+        out_file.write(data)
+
+def test_fingerprints_skip_matching_blocks(tmp_path, monkeypatch):
+    """! With fingerprints, only the blocks whose hashes differ are decoded and counted; with a tolerance, a block within a quantization bucket is skipped and not counted."""
+
+    sine = str(tmp_path / "sine.wav")
+    SineWave(5 * 4096, 440).write_wave_file(sine)
+    with open(sine, "rb") as in_file:
+        source = in_file.read()
+    file1, file2 = str(tmp_path / "file1.wav"), str(tmp_path / "file2.wav")
+    step = WaveFingerprint.step_for(0.01)
+    # block 1 differs by 100 units (more than 0.001) within a bucket of the step, block 3 differs by far more than the tolerance
+    _write_modified(file1, source, { 4096 + 7: 10 * step, 3 * 4096 + 7: 0 })
+    _write_modified(file2, source, { 4096 + 7: 10 * step + 100, 3 * 4096 + 7: 10000 })
+    read_starts = []
+    read_samples = WaveReader.read_samples
+    def record_read_samples(self, start, count):
+        read_starts.append(start)
+        return read_samples(self, start, count)
+    monkeypatch.setattr(WaveReader, "read_samples", record_read_samples)
+    # the sidecars are built before measuring, so that only the reads of the comparison are recorded
+    WaveFingerprint.of(file1)
+    WaveFingerprint.of(file2)
+    read_starts.clear()
+    stats = wave_difference_stats(file1, file2, use_fingerprints=True)
+    assert sorted(set(read_starts)) == [4096, 3 * 4096]
+    assert stats['counts'][0.001] == 2 and stats['counts'][0.2] == 1
+    assert stats['max_error'] == pytest.approx(10000 / 32768, abs=1e-4)
+    assert stats['compared'] == 5 * 4096 and not stats['stopped']
+    assert stats == wave_difference_stats(file1, file2)
+
+    WaveFingerprint.of(file1, tolerance=0.01)
+    WaveFingerprint.of(file2, tolerance=0.01)
+    read_starts.clear()
+    stats = wave_difference_stats(file1, file2, tolerance=0.01, use_fingerprints=True)
+    assert sorted(set(read_starts)) == [3 * 4096]
+    assert stats['counts'][0.001] == 1 and stats['stopped']
+    assert stats['compared'] == 4 * 4096
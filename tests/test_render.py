@@ -0,0 +1,248 @@
+"""! @brief The render tests.
+"""
+
+##
+# @file test_render.py
+#
+# @brief This file tests that every render mode writes the reference wave files byte for byte.
+#
+# @section description_test_render Description
+# The song songs/simple.txt is rendered serially, with note synthesis threads, in time shards, streamed block by block, into a memory-mapped file, through its compiled score, with AsyncRender, and by the render server, and each wave file must be identical to doc/html/rss/simple.wav. A cancelled AsyncRender render removes its partial wave file, and AsyncRender runs at most max_concurrent renders at once. The tone, envelope, and stereo subcommands are checked against their reference wave files too.
+#
+# @section libraries_test_render Libraries/Modules
+# - asyncio, concurrent.futures, http.client, json, threading, time, and os.path (from the standard library)
+#   - access to run, sleep, gather, create_task, CancelledError, ThreadPoolExecutor, HTTPConnection, dumps, loads, Thread, Lock, time.sleep, join, and isfile
+# - pytest
+#   - access to mark
+# - Song, AsyncRender, Wave, and main
+#
+# Copyright (c) 2023 Bucknell University. All rights reserved.
+
+from asyncio import run, sleep, gather, create_task, CancelledError
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from json import dumps, loads
+from threading import Thread, Lock
+import time
+from os.path import join, isfile
+import pytest
+from conftest import REFERENCE_DIR, reference_bytes
+from Song import Song, NoteTable
+from AsyncRender import AsyncRenderer
+from Wave import WaveWriter
+from main import RenderServer, RenderRequestHandler, write_waveform, write_envelope, write_stereo
+
+def _read(filename: str) -> bytes:
+    """! Read a file.
+
+    @param filename The filename.
+
+    @return The content of the file.
+    """
+
+    with open(filename, 'rb') as in_file:
+        return in_file.read()
+
+def _render_async(score: str, output: str) -> None:
+    """! Render a song with an AsyncRender.AsyncRenderer."""
+
+    renderer = AsyncRenderer(max_concurrent=2)
+    try:
+        run(renderer.render_song(score, output))
+    finally:
+        renderer.shutdown()
+
+## The render modes: a function of the score and the output wave file
+RENDER_MODES = {
+    'serial': lambda score, output: Song(score).write_wave_file(output),
+    'workers': lambda score, output: Song(score, workers=3).write_wave_file(output),
+    'shards': lambda score, output: Song(score, shards=2).write_wave_file(output),
+    'stream': lambda score, output: Song.stream_wave_file(score, output, block_frames=1000),
+    'mapped': lambda score, output: Song.map_wave_file(score, output, workers=2),
+    'score_cache': lambda score, output: Song(score, score_cache=True).write_wave_file(output),
+    'async': _render_async,
+}
+
+@pytest.mark.parametrize('mode', sorted(RENDER_MODES))
+def test_render_mode_matches_reference(mode, score, tmp_path):
+    """! Every render mode writes doc/html/rss/simple.wav byte for byte."""
+
+    output = str(tmp_path / "simple.wav")
+    RENDER_MODES[mode](score, output)
+    assert _read(output) == reference_bytes("simple.wav")
+
+def test_mapped_render_reads_note_chunks(score, tmp_path, monkeypatch):
+    """! The notes read a chunk at a time are the notes read at once, and the memory-mapped render that reads them writes the reference wave file."""
+
+    with open(score, 'r') as in_file:
+        Song._read_score_header(in_file)
+        position = in_file.tell()
+        notes = list(NoteTable.read(in_file))
+        in_file.seek(position)
+        chunks = list(NoteTable.read_chunks(in_file, 64))
+    assert len(chunks) > 1 and [note for chunk in chunks for note in chunk] == notes
+    monkeypatch.setattr(NoteTable, 'chunk_size', 64)
+    output = str(tmp_path / "simple.wav")
+    Song.map_wave_file(score, output, workers=2)
+    assert _read(output) == reference_bytes("simple.wav")
+
+def test_mapped_render_failure_cleanup(score, tmp_path):
+    """! A memory-mapped render that fails removes its partial wave file, and a wave file that cannot be opened reports the original error."""
+
+    with open(score, 'a') as out_file:
+        out_file.write("0 45 0.5 10\n")
+    output = str(tmp_path / "simple.wav")
+    with pytest.raises(ValueError):
+        Song.map_wave_file(score, output)
+    assert not isfile(output)
+    with pytest.raises(FileNotFoundError):
+        Song.map_wave_file(score, str(tmp_path / "missing" / "simple.wav"))
+
+def test_async_render_cancel_removes_file(score, tmp_path, monkeypatch):
+    """! An AsyncRender render cancelled in the middle of the song removes its partial wave file."""
+
+    written = []
+    write_frames = WaveWriter.write_frames
+    def record_write_frames(self, samples):
+        write_frames(self, samples)
+        written.append(len(samples))
+    monkeypatch.setattr(WaveWriter, 'write_frames', record_write_frames)
+    output = str(tmp_path / "simple.wav")
+    renderer = AsyncRenderer(max_concurrent=1)
+    async def cancel_render():
+        task = create_task(renderer.render_song(score, output, block_frames=1000))
+        while not written:
+            await sleep(0.001)
+        assert isfile(output)
+        task.cancel()
+        with pytest.raises(CancelledError):
+            await task
+    try:
+        run(cancel_render())
+    finally:
+        # the partial file is discarded on a thread, once the write in progress is finished
+        renderer.shutdown()
+    assert 0 < sum(written) < 441001 * 2
+    assert not isfile(output)
+
+def test_async_render_limits_concurrent_renders(tmp_path):
+    """! AsyncRender runs at most max_concurrent renders at once, even with more threads."""
+
+    lock = Lock()
+    active = [0, 0]
+    class SlowWave:
+        """! A wave that records how many waves are synthesized at once."""
+        def __init__(self, num_samples, freq):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+        def write_wave_file(self, filename):
+            pass
+    for max_concurrent in (1, 2):
+        active[1] = 0
+        renderer = AsyncRenderer(max_concurrent=max_concurrent, executor=ThreadPoolExecutor(4))
+        async def render_tones():
+            await gather(*(renderer.render_tone(SlowWave, 100, 440, str(tmp_path / (str(index) + ".wav"))) for index in range(4)))
+        try:
+            run(render_tones())
+        finally:
+            renderer.shutdown()
+        assert active[1] == max_concurrent
+
+def test_compiled_score_render_matches_reference(score, tmp_path):
+    """! A render through an existing compiled score (memory-mapped, not parsed) writes the reference wave file."""
+
+    Song(score, score_cache=True)
+    output = str(tmp_path / "simple.wav")
+    Song(score, score_cache=True).write_wave_file(output)
+    assert _read(output) == reference_bytes("simple.wav")
+
+@pytest.fixture
+def server(tmp_path):
+    """! A render server on a free port, whose root is the temporary directory.
+
+    @return The server.
+    """
+
+    render_server = RenderServer(('127.0.0.1', 0), workers=2, queue_size=2, root=str(tmp_path))
+    thread = Thread(target=render_server.serve_forever, daemon=True)
+    thread.start()
+    yield render_server
+    render_server.shutdown()
+    render_server.server_close()
+    thread.join()
+
+def _post(server: RenderServer, job: dict, headers: dict = None):
+    """! Post a job to a render server.
+
+    @param server The render server.
+
+    @param job The job fields.
+
+    @param headers The request headers, sent as given (a Content-Length is not added). Default is None, i.e., the JSON content type and the body length.
+
+    @return The response status and body.
+    """
+
+    body = dumps(job).encode()
+    if headers is None:
+        headers = { 'Content-Type': 'application/json', 'Content-Length': str(len(body)) }
+    connection = HTTPConnection('127.0.0.1', server.server_address[1], timeout=60)
+    try:
+        connection.putrequest('POST', '/', skip_host='Host' in headers)
+        for name, value in headers.items():
+            connection.putheader(name, value)
+        connection.endheaders(body)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+def test_server_render_matches_reference(server, score, tmp_path):
+    """! The render server writes the reference wave file, and streams the same samples when the job has no output file."""
+
+    status, body = _post(server, { 'command': 'render-song', 'input': "simple.txt", 'output': "simple.wav" })
+    assert status == 200 and loads(body) == { 'output': "simple.wav" }
+    assert _read(str(tmp_path / "simple.wav")) == reference_bytes("simple.wav")
+    status, body = _post(server, { 'command': 'render-song', 'input': "simple.txt" })
+    assert status == 200
+    # the streamed header has unknown chuck sizes
+    assert body[:4] == b'RIFF' and body[4:8] == WaveWriter.streaming_size.to_bytes(4, 'little')
+    assert body[44:] == reference_bytes("simple.wav")[44:]
+
+def test_server_rejects_unsafe_requests(server, score):
+    """! The render server rejects a job that is not JSON, a foreign Host header, a missing, malformed, negative, or too large Content-Length, a file outside of its root, and a non-loopback host to listen on."""
+
+    job = { 'command': 'render-song', 'input': "simple.txt" }
+    assert _post(server, job, { 'Content-Type': 'text/plain' })[0] == 415
+    assert _post(server, job, { 'Content-Type': 'application/json', 'Host': 'example.com' })[0] == 403
+    for length in (None, 'ten', '-1'):
+        headers = { 'Content-Type': 'application/json' }
+        if length is not None:
+            headers['Content-Length'] = length
+        assert _post(server, job, headers)[0] == 400
+    assert _post(server, job, { 'Content-Type': 'application/json', 'Content-Length': str(RenderRequestHandler.max_job_size + 1) })[0] == 413
+    assert _post(server, { 'command': 'render-song', 'input': "../simple.txt" })[0] == 400
+    assert _post(server, { 'command': 'render-song', 'input': "simple.txt", 'output': "/tmp/simple.wav" })[0] == 400
+    for host in ('0.0.0.0', '192.168.1.2', 'example.com'):
+        with pytest.raises(ValueError):
+            RenderServer((host, 0))
+
+@pytest.mark.parametrize('wave_type, freq, name', [(1, 261.63, "sine_c.wav"), (2, 493.88, "square_b.wav"), (3, 392, "sawtooth_g.wav"), (5, 329.63, "string_e.wav")])
+def test_tone_matches_reference(wave_type, freq, name, tmp_path):
+    """! The tones match their reference wave files."""
+
+    output = str(tmp_path / name)
+    write_waveform(wave_type, 44100, freq, output)
+    assert _read(output) == reference_bytes(name)
+
+def test_envelope_and_stereo_match_reference(tmp_path):
+    """! The rise-fall envelope and the stereo mix match their reference wave files."""
+
+    write_envelope(1, join(REFERENCE_DIR, "sine_c.wav"), str(tmp_path / "sine_c_rf.wav"))
+    assert _read(str(tmp_path / "sine_c_rf.wav")) == reference_bytes("sine_c_rf.wav")
+    write_stereo(join(REFERENCE_DIR, "sine_c.wav"), 0.18, str(tmp_path / "sine_c_stereo.wav"))
+    assert _read(str(tmp_path / "sine_c_stereo.wav")) == reference_bytes("sine_c_stereo.wav")
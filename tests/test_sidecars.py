@@ -0,0 +1,229 @@
+"""! @brief The sidecar tests.
+"""
+
+##
+# @file test_sidecars.py
+#
+# @brief This file tests the round trips of the compiled scores, the wave fingerprints, the wave mipmaps, as well as the wave reader and the incremental wave writer.
+#
+# @section description_test_sidecars Description
+# Each sidecar is saved and loaded back, and must hold what was saved. A stale sidecar (its source file changed) is rebuilt, and a sidecar whose source was only touched is restamped. The wave reader must skip the chunks between the fmt and data chunks. The wave writer must back-patch the header of a seekable output and write a streaming header to a non-seekable one.
+#
+# @section libraries_test_sidecars Libraries/Modules
+# - io, hashlib, struct, os, and os.path (from the standard library)
+#   - access to BytesIO, blake2b, error, stat, utime, and isfile
+# - pytest
+#   - access to approx and raises
+# - Song, Wave, and WaveIndex
+#
+# Copyright (c) 2023 Bucknell University. All rights reserved.
+
+from io import BytesIO
+from hashlib import blake2b
+from struct import error as struct_error
+from os import stat, utime
+from os.path import isfile
+import pytest
+from Song import Song, NoteTable, CompiledScore
+from Wave import SineWave, WaveReader, WaveWriter
+from WaveIndex import WaveFingerprint, WaveMipmap
+
+def _read(filename: str) -> bytes:
+    """! Read a file.
+
+    @param filename The filename.
+
+    @return The content of the file.
+    """
+
+    with open(filename, 'rb') as in_file:
+        return in_file.read()
+
+def _write_text(filename: str, text: str) -> None:
+    """! Write a text file.
+
+    @param filename The filename.
+
+    @param text The content of the file.
+    """
+
+    with open(filename, 'w') as out_file:
+        out_file.write(text)
+
+def test_compiled_score_round_trip(score):
+    """! A compiled score maps back to the parsed score."""
+
+    with open(score, 'r') as in_file:
+        num_samples, instrument_info = Song._read_score_header(in_file)
+        notes = NoteTable.read(in_file)
+    CompiledScore.compile(score)
+    loaded, (source_size, source_mtime, source_hash) = CompiledScore.open(CompiledScore.cache_path(score))
+    assert (loaded.num_samples, loaded.instrument_info) == (num_samples, instrument_info)
+    assert list(loaded.notes) == list(notes)
+    assert (source_size, source_mtime) == (stat(score).st_size, stat(score).st_mtime_ns)
+    assert source_hash == blake2b(_read(score), digest_size=16).digest()
+
+def test_compiled_score_restamped_when_touched(score):
+    """! Loading a compiled score whose text score was only touched restamps it."""
+
+    CompiledScore.compile(score)
+    file_stat = stat(score)
+    utime(score, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+    CompiledScore.load(score)
+    _, (_, source_mtime, _) = CompiledScore.open(CompiledScore.cache_path(score))
+    assert source_mtime == stat(score).st_mtime_ns
+
+def test_compiled_score_recompiled_when_changed(score):
+    """! Loading a compiled score whose text score changed recompiles it."""
+
+    CompiledScore.compile(score)
+    with open(score, 'r') as in_file:
+        text = in_file.read()
+    _write_text(score, text.replace("0 45 0.63 0 ", "0 46 0.63 0 ", 1))
+    assert CompiledScore.load(score).notes[0][1] == 46
+    assert CompiledScore.open(CompiledScore.cache_path(score))[0].notes[0][1] == 46
+
+@pytest.mark.parametrize('damage', ['empty', 'magic', 'truncated'])
+def test_compiled_score_recompiled_when_corrupt(damage, score):
+    """! Loading a compiled score that is empty, not a compiled score, or truncated recompiles it."""
+
+    CompiledScore.compile(score)
+    path = CompiledScore.cache_path(score)
+    data = _read(path)
+    damaged = { 'empty': b'', 'magic': b'XXXX' + data[4:], 'truncated': data[:-8] }[damage]
+    with open(path, 'wb') as out_file:
+        out_file.write(damaged)
+    with pytest.raises((ValueError, struct_error)):
+        CompiledScore.open(path)
+    assert list(CompiledScore.load(score).notes) == list(CompiledScore.compile(score).notes)
+    assert _read(path) == data
+
+def test_fingerprint_round_trip(tmp_path):
+    """! A fingerprint saved to its sidecar loads back unchanged, and a stale sidecar is rebuilt."""
+
+    filename = str(tmp_path / "sine.wav")
+    SineWave(20000, 440).write_wave_file(filename)
+    fingerprint = WaveFingerprint.build(filename, 4096)
+    fingerprint.save(WaveFingerprint.sidecar_path(filename))
+    loaded = WaveFingerprint.load(WaveFingerprint.sidecar_path(filename))
+    assert (loaded.num_samples, loaded.block_samples, loaded.step, loaded.source) == (fingerprint.num_samples, fingerprint.block_samples, fingerprint.step, fingerprint.source)
+    assert (loaded.exact, loaded.quantized, loaded.energy) == (fingerprint.exact, fingerprint.quantized, fingerprint.energy)
+    assert WaveFingerprint.of(filename, 4096).differing_blocks(fingerprint) == []
+    SineWave(20000, 440, 0.5).write_wave_file(filename)
+    rebuilt = WaveFingerprint.of(filename, 4096)
+    assert rebuilt.differing_blocks(fingerprint) == list(range(fingerprint.num_blocks()))
+    assert WaveFingerprint.load(WaveFingerprint.sidecar_path(filename)).exact == rebuilt.exact
+
+def _assert_same_mipmap(mipmap: WaveMipmap, other: WaveMipmap) -> None:
+    """! Check that two mipmaps hold the same statistics.
+
+    @param mipmap A mipmap.
+
+    @param other The other mipmap.
+    """
+
+    assert (mipmap.num_channels, mipmap.base_frames, mipmap.num_frames) == (other.num_channels, other.base_frames, other.num_frames)
+    assert mipmap.levels == other.levels
+
+@pytest.mark.parametrize('render', ['stream', 'mapped'])
+def test_mipmap_written_with_wave(render, score, tmp_path):
+    """! The overview built while a song is written matches the mipmap built from the wave file, and is saved as its sidecar."""
+
+    filename = str(tmp_path / "simple.wav")
+    if render == 'stream':
+        Song.stream_wave_file(score, filename, overview=WaveMipmap())
+    else:
+        Song.map_wave_file(score, filename, workers=2, overview=WaveMipmap())
+    sidecar = WaveMipmap.load(WaveMipmap.sidecar_path(filename))
+    _assert_same_mipmap(sidecar, WaveMipmap.build(filename))
+    assert sidecar.source == (stat(filename).st_size, stat(filename).st_mtime_ns)
+    assert WaveMipmap.of(filename) is not None
+
+def test_mipmap_round_trip(tmp_path):
+    """! A mipmap saved to its sidecar loads back unchanged, its statistics match the samples, and a stale sidecar is rebuilt."""
+
+    filename = str(tmp_path / "sine.wav")
+    SineWave(30000, 440, 1).write_wave_file(filename)
+    mipmap = WaveMipmap.of(filename, 100)
+    assert isfile(WaveMipmap.sidecar_path(filename))
+    _assert_same_mipmap(WaveMipmap.load(WaveMipmap.sidecar_path(filename)), mipmap)
+    with WaveReader(filename) as reader:
+        samples = reader.read_frames(150, 20000)
+        assert mipmap.peak(150, 20150, reader) == (min(samples), max(samples))
+        assert mipmap.rms(150, 20150, reader) == pytest.approx((sum(sample * sample for sample in samples) / len(samples)) ** 0.5)
+    assert mipmap.find_clipping(0.99) != []
+    SineWave(30000, 440, 0.5).write_wave_file(filename)
+    rebuilt = WaveMipmap.of(filename, 100)
+    assert rebuilt.find_clipping(0.99) == []
+    _assert_same_mipmap(WaveMipmap.load(WaveMipmap.sidecar_path(filename)), rebuilt)
+
+class _Unseekable(BytesIO):
+    """! A binary stream that cannot seek, like a pipe."""
+
+    def seekable(self) -> bool:
+        """! Whether the stream can seek.
+
+        @return False.
+        """
+
+        return False
+
+def test_wave_writer_back_patches_header(tmp_path):
+    """! A wave written in blocks by a WaveWriter is identical to the wave written at once."""
+
+    wave = SineWave(10001, 440)
+    expected = str(tmp_path / "expected.wav")
+    wave.write_wave_file(expected)
+    filename = str(tmp_path / "blocks.wav")
+    with WaveWriter(filename, 1) as writer:
+        for start in range(0, len(wave._data), 3000):
+            writer.write_frames(list(wave._data)[start:start + 3000])
+    assert _read(filename) == _read(expected)
+
+def test_wave_reader_skips_extra_chunks(tmp_path):
+    """! A WaveReader walks past LIST and fact chunks (including an odd-sized, padded one) between the fmt and data chunks."""
+
+    plain = str(tmp_path / "plain.wav")
+    SineWave(1001, 440).write_wave_file(plain)
+    data = _read(plain)
+    # the fmt chunk ends at byte 36, where the data chunk starts
+    extra = b'LIST' + (5).to_bytes(4, 'little') + b'INFOx' + b'\0' + b'fact' + (4).to_bytes(4, 'little') + (1001).to_bytes(4, 'little')
+    chunked = data[:4] + (int.from_bytes(data[4:8], 'little') + len(extra)).to_bytes(4, 'little') + data[8:36] + extra + data[36:]
+    filename = str(tmp_path / "chunked.wav")
+    with open(filename, 'wb') as out_file:
+        out_file.write(chunked)
+    with WaveReader(plain) as expected, WaveReader(filename) as reader:
+        assert reader.num_frames() == expected.num_frames() == 1001
+        assert reader.read_frames(0, 1001) == expected.read_frames(0, 1001)
+        assert reader.read_frames(500, 10) == expected.read_frames(500, 10)
+
+def test_wave_writer_discards_unfinished_wave(tmp_path):
+    """! A WaveWriter left by an exception removes the wave file it opened and saves no overview, and leaves the placeholder header of a stream."""
+
+    filename = str(tmp_path / "partial.wav")
+    with pytest.raises(KeyboardInterrupt):
+        with WaveWriter(filename, 1, WaveMipmap(1)) as writer:
+            writer.write_frames(SineWave(10001, 440)._data)
+            raise KeyboardInterrupt
+    assert not isfile(filename) and not isfile(WaveMipmap.sidecar_path(filename))
+    stream = BytesIO()
+    with pytest.raises(KeyboardInterrupt):
+        with WaveWriter(stream, 1) as writer:
+            header = stream.getvalue()
+            writer.write_frames(SineWave(10001, 440)._data)
+            raise KeyboardInterrupt
+    assert stream.getvalue()[:44] == header
+
+def test_wave_writer_streams_to_unseekable_output(tmp_path):
+    """! A WaveWriter writes a streaming header to a non-seekable output, followed by the same samples."""
+
+    wave = SineWave(10001, 440)
+    expected = str(tmp_path / "expected.wav")
+    wave.write_wave_file(expected)
+    stream = _Unseekable()
+    with WaveWriter(stream, 1) as writer:
+        writer.write_frames(wave._data)
+    data = stream.getvalue()
+    streaming_size = WaveWriter.streaming_size.to_bytes(4, 'little')
+    assert data[4:8] == streaming_size and data[40:44] == streaming_size
+    assert data[:4] + data[8:40] + data[44:] == _read(expected)[:4] + _read(expected)[8:40] + _read(expected)[44:]